@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Available actions of many rows at once, for list views and serializers:
+
+    products = resolve_available_triggers(Product.objects.all()[:100], 'state')
+    for product in products:
+        product.state_actions.triggers, product.state_actions.states
+
+Rows are grouped by their current state and triggers and reachable states are looked up
+once per distinct state, every row of a state shares the same `AvailableActions`.
+"""
+
+from __future__ import unicode_literals
+
+from django.db.models import QuerySet
+
+from collections import namedtuple
+
+try:
+    from rest_framework import serializers
+except ImportError:
+    serializers = None
+
+
+AvailableActions = namedtuple('AvailableActions', ('triggers', 'states'))
+
+NO_ACTIONS = AvailableActions((), ())
+
+
+def actions_attr(field_name):
+    return '{0}_actions'.format(field_name)
+
+
+def resolve_available_triggers(queryset_or_instances, field_name, to_attr=None, check_conditions=False, **kwargs):
+    """
+    Attach `AvailableActions` (names of the triggers that can be fired and states reachable
+    with one transition) of the `field_name` machine to every instance as `to_attr`, by default
+    `<field>_actions`, and return the instances. A queryset is evaluated, its result cache is used.
+
+    By default conditions are not considered, like in `available_triggers`. With `check_conditions`
+    rows in states with conditional transitions are checked with `conditions.evaluate_triggers`,
+    in one query for all of them, `kwargs` are passed to callable conditions.
+    """
+    instances = list(queryset_or_instances)
+    if not instances:
+        return instances
+    model = queryset_or_instances.model if isinstance(queryset_or_instances, QuerySet) else instances[0].__class__
+    field = model._meta.get_field(field_name)
+    machine = field.handler.machine
+    to_attr = to_attr or actions_attr(field_name)
+
+    groups = {}
+    for instance in instances:
+        groups.setdefault(getattr(instance, field.attname), []).append(instance)
+
+    conditional = []
+    for state_id, group in groups.items():
+        trigger_names = machine.state_triggers.get(state_id)
+        if not trigger_names:
+            actions = NO_ACTIONS
+        elif check_conditions and any(machine.index[state_id, name].conditions for name in trigger_names):
+            conditional.extend(group)
+            continue
+        else:
+            actions = AvailableActions(trigger_names, machine.state_targets[state_id])
+        for instance in group:
+            setattr(instance, to_attr, actions)
+
+    if conditional:
+        from .conditions import evaluate_triggers
+        allowed = evaluate_triggers(
+            model._base_manager.filter(pk__in=[instance.pk for instance in conditional]), field_name, **kwargs)
+        shared = {}
+        for instance in conditional:
+            state_id = getattr(instance, field.attname)
+            row_allowed = allowed.get(instance.pk, ())
+            trigger_names = tuple(name for name in machine.state_triggers[state_id] if name in row_allowed)
+            actions = shared.get((state_id, trigger_names))
+            if actions is None:
+                states = []
+                for name in trigger_names:
+                    end_state = machine.index[state_id, name].end_state
+                    if end_state not in states:
+                        states.append(end_state)
+                actions = shared[state_id, trigger_names] = AvailableActions(trigger_names, tuple(states))
+            setattr(instance, to_attr, actions)
+    return instances
+
+
+if serializers is not None:
+    class AvailableTriggersField(serializers.Field):
+        """
+        Read-only Django REST framework field with names of the triggers of `state_field` the object
+        can fire, with `with_states` also with ids of the reachable states. When the serializer of the
+        field is the child of a `ListSerializer` with an instance (`many=True` at the top level), the
+        actions of all its objects are resolved together, on the first object, with
+        `resolve_available_triggers`. Objects of nested lists are resolved one by one, objects with
+        actions attached already (e.g. by the view) in `to_attr` are used as is. By default it's
+        `<state_field>_actions`, or `<state_field>_checked_actions` with `check_conditions`, so
+        fields with and without conditions don't share the actions.
+        """
+        def __init__(self, state_field='state', with_states=False, check_conditions=False, to_attr=None, **kwargs):
+            kwargs['read_only'] = True
+            kwargs.setdefault('source', '*')
+            super(AvailableTriggersField, self).__init__(**kwargs)
+            self.state_field = state_field
+            self.with_states = with_states
+            self.check_conditions = check_conditions
+            if to_attr is None:
+                to_attr = actions_attr('{0}_checked'.format(state_field) if check_conditions else state_field)
+            self.to_attr = to_attr
+
+        def to_representation(self, instance):
+            to_attr = self.to_attr
+            actions = getattr(instance, to_attr, None)
+            if actions is None:
+                objects = [instance]
+                list_serializer = getattr(self.parent, 'parent', None)
+                if isinstance(list_serializer, serializers.ListSerializer) and \
+                        isinstance(list_serializer.instance, (list, tuple, QuerySet)):
+                    model = instance.__class__
+                    objects = [obj for obj in list_serializer.instance if obj.__class__ is model]
+                resolve_available_triggers(objects, self.state_field, to_attr, self.check_conditions)
+                actions = getattr(instance, to_attr, None)
+                if actions is None:
+                    resolve_available_triggers([instance], self.state_field, to_attr, self.check_conditions)
+                    actions = getattr(instance, to_attr)
+            if self.with_states:
+                return {'triggers': list(actions.triggers), 'states': [state.id for state in actions.states]}
+            return list(actions.triggers)
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from . import instrumentation
+from .data_classes import HandlerMethod
+from .exceptions import StaleStateError
+from .signals import post_transition, pre_transition
+
+from asgiref.sync import sync_to_async
+
+from timeit import default_timer
+
+import asyncio
+import functools
+
+
+class AsyncTransitionProcessMixin(object):
+    """
+    Asynchronous counterpart of `TransitionProcessMixin.process` for ASGI views:
+
+        await product.state_handler.aaccept()
+
+    Coroutine functions (triggers and hooks) are awaited, plain callables are run
+    with `sync_to_async`, in the thread used for Django database access when
+    `async_thread_sensitive` is set (default) or in the default thread pool otherwise.
+    With `concurrent_after_hooks` the `after` functions of a transition are run
+    concurrently with `asyncio.gather`.
+    """
+    __slots__ = ()
+
+    async_thread_sensitive = True
+    concurrent_after_hooks = False
+
+    async def aprocess(self, transition, **kwargs):
+        """
+        Same steps as `process`, see its documentation, but awaited. The steps are shared
+        with `process` (`_guard`, `_persist`, `_succeed`), the ones that may query the database
+        or call signal receivers (conditions, the `atomic` mode, signals and the transition log)
+        are run with `sync_to_async`.
+        """
+        atomic = kwargs.pop('atomic', self.atomic_update)
+        retries = kwargs.pop('retries', self.atomic_retries)
+        collector = instrumentation.collector
+        timed = collector.enabled
+        started = default_timer() if self.log_transitions or timed else None
+        while True:
+            if transition.conditions or pre_transition.enabled:
+                source, phase_started = await sync_to_async(self._guard)(transition, kwargs, collector, timed)
+            else:
+                source, phase_started = self._guard(transition, kwargs, collector, timed)
+            for before_function in transition.before:
+                await self._acall(before_function, kwargs, collector if timed else None)
+            if timed:
+                phase_started = self._record_phase(collector, transition, 'before', phase_started)
+            await self._acall(transition.trigger, kwargs, args=(self,))
+            if timed:
+                phase_started = self._record_phase(collector, transition, 'trigger', phase_started)
+            try:
+                if atomic:
+                    await sync_to_async(self._persist)(transition, atomic)
+                else:
+                    self._persist(transition, atomic)
+            except StaleStateError:
+                if retries <= 0:
+                    raise
+                retries -= 1
+                transition = await sync_to_async(self._refreshed_transition)(transition)
+                continue
+            if timed:
+                phase_started = self._record_phase(collector, transition, 'update', phase_started)
+            if transition.after:
+                await self._acall_after(transition, kwargs, collector if timed else None)
+            if post_transition.enabled or self.log_transitions:
+                await sync_to_async(self._succeed)(
+                    transition, source, kwargs, collector, timed, phase_started, started)
+            elif timed:
+                self._succeed(transition, source, kwargs, collector, timed, phase_started, started)
+            return
+
+    async def _acall_after(self, transition, kwargs, collector=None):
+        """
+        Call every function in `after` attribute, one by one or concurrently
+        when `concurrent_after_hooks` is set.
+        """
+        if self.concurrent_after_hooks:
+            await asyncio.gather(*[
+                self._acall(after_function, kwargs, collector) for after_function in transition.after])
+        else:
+            for after_function in transition.after:
+                await self._acall(after_function, kwargs, collector)
+
+    async def _acall(self, function, kwargs, collector=None, args=()):
+        """
+        Await coroutine function or run plain callable in a thread, return its result.
+        Handler methods, bare or wrapped in `hooks.Hook`, are called with this handler as `self`,
+        like the trigger with `args`.
+        When `collector` is provided the duration of the call is reported to it.
+        """
+        if collector is not None:
+            call_started = default_timer()
+        hook = function
+        if function.__class__ is HandlerMethod:
+            function, args = function.function, (self,)
+        elif getattr(function, 'wraps_handler_method', False):
+            function, args, kwargs = function.call, (self, kwargs), {}
+        if asyncio.iscoroutinefunction(function):
+            result = await function(*args, **kwargs)
+        else:
+            result = await sync_to_async(
+                functools.partial(function, *args, **kwargs), thread_sensitive=self.async_thread_sensitive)()
+            if asyncio.iscoroutine(result):
+                result = await result
+        if collector is not None:
+            collector.record_hook(self, hook, default_timer() - call_started)
+        return result
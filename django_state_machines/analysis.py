@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from collections import deque
+
+from .exceptions import NoSuchStateError
+
+
+class MachineAnalysis(object):
+    """
+    Graph analysis of a `CompiledStateMachine`, available as its `analysis` attribute.
+    It's built on first use and shared by every handler of the machine. States are
+    addressed by positions in `machine.states`:
+     - `reachable` holds for every state a bitset of states reachable with at least
+       one transition (transitive closure), so reachability checks are O(1),
+     - `terminal` are states without outgoing transitions,
+     - `cycles` are groups of states that can be left and entered again.
+    Shortest trigger paths are found with BFS from the source state the first time it's
+    asked for, BFS tree is cached, so the next paths from that state cost O(path).
+    """
+    def __init__(self, machine):
+        self.machine = machine
+        self.id_indexes = dict((state.id, index) for index, state in enumerate(machine.states))
+        self.edges = self._build_edges()
+        self.terminal = tuple(state for index, state in enumerate(machine.states) if not self.edges[index])
+        components = self._strongly_connected()
+        self.cycles = tuple(
+            tuple(machine.states[index] for index in sorted(component)) for component in components
+            if len(component) > 1 or any(target == component[0] for target, _ in self.edges[component[0]]))
+        self.reachable = self._build_closure(components)
+        self._trees = {}
+
+    def _build_edges(self):
+        """For every state position, list of `(target position, transition)` in trigger name order."""
+        machine = self.machine
+        edges = []
+        for state in machine.states:
+            edges.append([
+                (self.id_indexes[machine.index[state.id, trigger_name].end_state.id],
+                 machine.index[state.id, trigger_name])
+                for trigger_name in machine.state_triggers.get(state.id, ())])
+        return edges
+
+    def _strongly_connected(self):
+        """Tarjan's algorithm without recursion, components are returned sinks first."""
+        edges = self.edges
+        indexes = {}
+        lowlinks = {}
+        stack = []
+        on_stack = set()
+        components = []
+        counter = 0
+        for root in range(len(edges)):
+            if root in indexes:
+                continue
+            indexes[root] = lowlinks[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(edges[root]))]
+            while work:
+                node, targets = work[-1]
+                for target, _ in targets:
+                    if target not in indexes:
+                        indexes[target] = lowlinks[target] = counter
+                        counter += 1
+                        stack.append(target)
+                        on_stack.add(target)
+                        work.append((target, iter(edges[target])))
+                        break
+                    elif target in on_stack:
+                        lowlinks[node] = min(lowlinks[node], indexes[target])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        lowlinks[parent] = min(lowlinks[parent], lowlinks[node])
+                    if lowlinks[node] == indexes[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == node:
+                                break
+                        components.append(component)
+        return components
+
+    def _build_closure(self, components):
+        """Reachability bitsets, computed once per component in reverse topological order."""
+        reachable = [0] * len(self.edges)
+        for component in components:
+            members = set(component)
+            bits = 0
+            cyclic = len(component) > 1
+            for node in component:
+                for target, _ in self.edges[node]:
+                    if target in members:
+                        cyclic = True
+                    else:
+                        bits |= (1 << target) | reachable[target]
+            if cyclic:
+                for node in component:
+                    bits |= 1 << node
+            for node in component:
+                reachable[node] = bits
+        return reachable
+
+    def position(self, state):
+        """Return position of a state given by its name or `State` object."""
+        try:
+            return self.machine.state_indexes[getattr(state, 'name', state)]
+        except KeyError:
+            raise NoSuchStateError("'{0}' state not found in map.".format(state))
+
+    def is_reachable(self, source, target):
+        """Check if `target` state can be reached from `source` with at least one transition."""
+        return bool(self.reachable[self.position(source)] >> self.position(target) & 1)
+
+    def reachable_states(self, source):
+        """Return states reachable from `source` with at least one transition."""
+        bits = self.reachable[self.position(source)]
+        return tuple(state for index, state in enumerate(self.machine.states) if bits >> index & 1)
+
+    def unreachable_states(self, initial_states):
+        """Return states that can't be reached from any of the `initial_states`."""
+        bits = 0
+        for state in initial_states:
+            position = self.position(state)
+            bits |= (1 << position) | self.reachable[position]
+        return tuple(state for index, state in enumerate(self.machine.states) if not bits >> index & 1)
+
+    def shortest_path(self, source, target):
+        """
+        Return the shortest list of transitions leading from `source` to `target` state,
+        an empty list when they are the same state or `None` if `target` can't be reached.
+        """
+        source, target = self.position(source), self.position(target)
+        if source == target:
+            return []
+        if not self.reachable[source] >> target & 1:
+            return None
+        tree = self._trees.get(source)
+        if tree is None:
+            tree = self._trees[source] = self._bfs_tree(source)
+        path = []
+        while target != source:
+            target, transition = tree[target]
+            path.append(transition)
+        path.reverse()
+        return path
+
+    def _bfs_tree(self, source):
+        """Map every reachable state position to `(previous position, transition)` of its shortest path."""
+        tree = {source: None}
+        queue = deque([source])
+        while queue:
+            node = queue.popleft()
+            for target, transition in self.edges[node]:
+                if target not in tree:
+                    tree[target] = (node, transition)
+                    queue.append(target)
+        return tree
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from django.apps import AppConfig
+
+
+class StateMachinesConfig(AppConfig):
+    name = 'django_state_machines'
+    verbose_name = 'State machines'
+    default_auto_field = 'django.db.models.AutoField'
+
+    def ready(self):
+        from . import checks  # noqa: F401 registers system checks
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from django.apps import apps
+from django.db import connections, transaction
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from .conditions import transitions_query
+from .exceptions import NoSuchTriggerError, TransitionNotPossibleError
+from .signals import bulk_transitions
+
+import django
+import logging
+import multiprocessing
+import six
+
+
+logger = logging.getLogger('django_state_machines')
+
+THREADS = 'thread'
+PROCESSES = 'process'
+
+
+class BatchResult(object):
+    """
+    Summary of a batch run: numbers of rows moved (`succeeded`), not in a start state
+    or not meeting conditions anymore (`skipped`) and failed, with `errors` of the failed
+    rows as `{pk: error message}`.
+    """
+    def __init__(self, succeeded=0, skipped=0, failed=0, errors=None):
+        self.succeeded = succeeded
+        self.skipped = skipped
+        self.failed = failed
+        self.errors = errors or {}
+
+    def update(self, other):
+        self.succeeded += other.succeeded
+        self.skipped += other.skipped
+        self.failed += other.failed
+        self.errors.update(other.errors)
+
+    def as_dict(self):
+        return {'succeeded': self.succeeded, 'skipped': self.skipped, 'failed': self.failed, 'errors': self.errors}
+
+    def __repr__(self):
+        return "<{0}: succeeded={1}, skipped={2}, failed={3}>".format(
+            self.__class__.__name__, self.succeeded, self.skipped, self.failed)
+
+
+def process_chunk(model, field_name, trigger_name, pks, kwargs, using=None):
+    """
+    Fire `trigger_name` for the rows with `pks` in one transaction, every row with
+    `process` in the atomic mode, so a row changed by someone else since it was
+    streamed is skipped instead of overwritten. Each row runs in a savepoint, a failing
+    hook rolls back only its own row. Bulk receivers of `post_transition` get the moved rows
+    of the chunk once it's committed.
+    """
+    result = BatchResult()
+    property_name = '{0}_handler'.format(field_name)
+    with bulk_transitions(), transaction.atomic(using=using):
+        for instance in model._base_manager.db_manager(using).filter(pk__in=pks).iterator():
+            handler = getattr(instance, property_name)
+            try:
+                with transaction.atomic(using=using):
+                    transition = handler.get_transition(trigger_name)
+                    handler.process(transition, atomic=True, **dict(kwargs, instance=instance))
+            except TransitionNotPossibleError:
+                result.skipped += 1
+            except Exception as error:
+                logger.warning("Transition '%s' of %r failed.", trigger_name, instance, exc_info=True)
+                result.failed += 1
+                result.errors[instance.pk] = '{0}: {1}'.format(error.__class__.__name__, error)
+            else:
+                result.succeeded += 1
+        result.skipped += len(pks) - result.succeeded - result.skipped - result.failed
+    return result
+
+
+def _process_pooled_chunk(model, field_name, trigger_name, pks, kwargs, using):
+    """
+    `process_chunk` run by a pool worker, worker processes get the model by its label.
+    Database connections of the worker are closed after every chunk.
+    """
+    if isinstance(model, six.string_types):
+        model = apps.get_model(model)
+    try:
+        return process_chunk(model, field_name, trigger_name, pks, kwargs, using)
+    finally:
+        connections.close_all()
+
+
+def _init_process():
+    if not apps.ready:
+        django.setup()
+
+
+def _chunks(queryset, chunk_size):
+    """
+    Stream primary keys of the `queryset` in chunks, page by page with `pk > last pk`, so no
+    cursor is kept open while workers write (SQLite readers block writers from committing).
+    """
+    pks = queryset.values_list('pk', flat=True)
+    chunk = list(pks[:chunk_size])
+    while chunk:
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        chunk = list(pks.filter(pk__gt=chunk[-1])[:chunk_size])
+
+
+def run_transitions(queryset, field_name, trigger_name, chunk_size=1000, workers=4, pool=THREADS, **kwargs):
+    """
+    Fire `trigger_name` of the `field_name` machine for the rows of the `queryset` that can
+    fire it, with handler triggers and hooks, and return `BatchResult`. Primary keys are
+    streamed in chunks of `chunk_size` and every chunk is processed by `process_chunk`
+    in a pool of `workers` threads (`THREADS`) or processes (`PROCESSES`), at most twice as
+    many chunks as workers are pending at a time. With `workers=0` chunks are processed
+    in the current thread. Kwargs are passed to the hooks, with processes they have to be
+    picklable. Worker processes are spawned, not forked, so they don't share database connections
+    of the parent, and set Django up from `DJANGO_SETTINGS_MODULE`. SQLite allows one writer at
+    a time, concurrent chunks would fail with "database is locked", so on SQLite chunks are always
+    processed in the current thread.
+    """
+    model = queryset.model
+    field = model._meta.get_field(field_name)
+    moves = field.handler.machine.trigger_index.get(trigger_name)
+    if moves is None:
+        raise NoSuchTriggerError("'{0}' handler has no '{1}' trigger.".format(
+            field.handler.__class__.__name__, trigger_name))
+    using = queryset.db
+    if connections[using].vendor == 'sqlite':
+        workers = 0
+    queryset = queryset.filter(transitions_query(field_name, moves)[0]).order_by('pk')
+    result = BatchResult()
+
+    if not workers:
+        for chunk in _chunks(queryset, chunk_size):
+            result.update(process_chunk(model, field_name, trigger_name, chunk, kwargs, using))
+        return result
+
+    if pool == PROCESSES:
+        executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=_init_process)
+        target = model._meta.label
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers)
+        target = model
+    pending = set()
+    with executor:
+        for chunk in _chunks(queryset, chunk_size):
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result.update(future.result())
+            pending.add(executor.submit(_process_pooled_chunk, target, field_name, trigger_name, chunk, kwargs, using))
+        for future in wait(pending)[0]:
+            result.update(future.result())
+    return result
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from django.apps import apps
+from django.conf import settings
+from django.core import checks
+from django.db.models import NOT_PROVIDED
+
+from .fields import StateMachineMixin
+from .indexes import is_indexed
+
+import six
+
+
+def state_fields(app_configs=None):
+    """Yield `(model, field)` for every state machine field of concrete models of `app_configs`."""
+    if app_configs is None:
+        models = apps.get_models()
+    else:
+        models = [model for app_config in app_configs for model in app_config.get_models()]
+    for model in models:
+        if model._meta.abstract or model._meta.proxy:
+            continue
+        for field in model._meta.local_fields:
+            if isinstance(field, StateMachineMixin):
+                yield model, field
+
+
+def check_machines_enabled():
+    """
+    Checks of the machines themselves compile every handler, which `django.setup()` and other
+    checks avoid, they run only with `STATE_MACHINES_CHECK_MACHINES = True` setting.
+    """
+    return getattr(settings, 'STATE_MACHINES_CHECK_MACHINES', False)
+
+
+@checks.register(checks.Tags.models)
+def check_state_indexes(app_configs=None, **kwargs):
+    """
+    Warn about state columns without index, scans of rows in a given state read the whole table.
+    The check is optional, enable it with `STATE_MACHINES_CHECK_INDEXES = True` setting.
+    """
+    if not getattr(settings, 'STATE_MACHINES_CHECK_INDEXES', False):
+        return []
+    messages = []
+    for model, field in state_fields(app_configs):
+        if not is_indexed(model, field.name):
+            messages.append(checks.Warning(
+                "State machine field '{0}' is not indexed.".format(field.name),
+                hint="Set db_index=True on the field or state_indexes=True for partial indexes "
+                     "of the non-terminal states.",
+                obj=field,
+                id='django_state_machines.W001',
+            ))
+    return messages
+
+
+@checks.register(checks.Tags.models)
+def check_dead_states(app_configs=None, **kwargs):
+    """
+    Warn about states that can't be reached from the initial state, the field default.
+    Fields without a constant default have no known initial state and are skipped.
+    The check compiles the machines, enable it with `STATE_MACHINES_CHECK_MACHINES = True` setting.
+    """
+    if not check_machines_enabled():
+        return []
+    messages = []
+    for model, field in state_fields(app_configs):
+        if field.default is NOT_PROVIDED or callable(field.default):
+            continue
+        machine = field.handler.machine
+        initial_states = [state for state in machine.states if state.id == field.default]
+        if not initial_states:
+            continue
+        dead_states = machine.analysis.unreachable_states(initial_states)
+        if dead_states:
+            messages.append(checks.Warning(
+                "State machine field '{0}' has states unreachable from {1}: {2}.".format(
+                    field.name, ', '.join(state.name for state in initial_states),
+                    ', '.join(state.name for state in dead_states)),
+                hint="Add transitions leading to them or remove them from the handler.",
+                obj=field,
+                id='django_state_machines.W002',
+            ))
+    return messages
+
+
+@checks.register(checks.Tags.models)
+def check_state_codes(app_configs=None, **kwargs):
+    """
+    Check that `state_codes` give every state a distinct code that fits a smallint column.
+    States without a code are looked up in the machine only with `STATE_MACHINES_CHECK_MACHINES = True`.
+    """
+    check_states = check_machines_enabled()
+    messages = []
+    for model, field in state_fields(app_configs):
+        codes = getattr(field, 'state_codes', None)
+        if not codes:
+            continue
+        problems = []
+        missing = check_states and [state.id for state in field.handler.machine.states if state.id not in codes]
+        if missing:
+            problems.append("states without code: {0}".format(', '.join(missing)))
+        invalid = sorted(
+            state_id for state_id, code in codes.items()
+            if not isinstance(code, six.integer_types) or isinstance(code, bool) or not -32768 <= code <= 32767)
+        if invalid:
+            problems.append("codes of {0} are not small integers".format(', '.join(invalid)))
+        if len(set(codes.values())) != len(codes):
+            problems.append("codes are not unique")
+        if problems:
+            messages.append(checks.Error(
+                "State machine field '{0}' has invalid state_codes, {1}.".format(field.name, '; '.join(problems)),
+                hint="Map every state id to its own integer between -32768 and 32767, codes of existing rows "
+                     "must never change.",
+                obj=field,
+                id='django_state_machines.E001',
+            ))
+    return messages
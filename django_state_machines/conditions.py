@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+"""
+Guard conditions of transitions, passed with `conditions` to `add_transition`:
+
+    self.add_transition('accept', 'new', 'accepted', conditions=[Q(amount__lt=1000), is_verified])
+
+A condition is either a Django `Q` object or a callable receiving the same kwargs as
+transition hooks and returning a boolean. All conditions of a transition have to be met.
+
+`process` matches `Q` conditions against the field values of the instance in memory, unsaved
+changes included, when they use only its own fields, and against its row in the database
+when they span relations. Simple lookups of own fields (`exact`, `lt`, `lte`, `gt`, `gte`,
+`in`, `isnull`, also with `F()` of another own field) are evaluated in Python, with the NULL
+handling of SQL, other local lookups with a query that reads no table. Text fields are compared
+like in Python, case sensitive, ordering lookups on them go to the database for its collation.
+Queryset helpers match conditions against the rows in SQL.
+"""
+
+from __future__ import unicode_literals
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import BooleanField, Case, F, Q, Value, When
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.sql import Query
+from django.db.models.sql.constants import SINGLE
+
+import operator
+
+
+COMPARISONS = {
+    'exact': operator.eq,
+    'lt': operator.lt,
+    'lte': operator.le,
+    'gt': operator.gt,
+    'gte': operator.ge,
+}
+TEXT_FIELD_TYPES = ('CharField', 'TextField', 'SlugField', 'EmailField', 'URLField', 'FilePathField')
+
+
+def split_conditions(conditions):
+    """Return `Q` conditions combined into one `Q` (or `None`) and a tuple of callable conditions."""
+    query = None
+    callables = []
+    for condition in conditions:
+        if isinstance(condition, Q):
+            query = condition if query is None else query & condition
+        else:
+            callables.append(condition)
+    return query, tuple(callables)
+
+
+def check_conditions(handler, transition, kwargs):
+    """
+    Check conditions of the `transition` for the handler instance. Callables are called first.
+    `Q` conditions using only fields of the instance model are matched against the instance
+    field values, so unsaved changes count, in Python when `python_predicate` can evaluate them,
+    otherwise with a query that reads no table. `Q` conditions spanning relations cost one
+    `EXISTS` query against the saved row, unsaved instances can't use them. How a `Q` is matched
+    is found once per model and transition.
+    """
+    instance = handler.instance
+    model = instance.__class__
+    key = (model, transition)
+    try:
+        query, callables, local, predicate = handler.machine.guards[key]
+    except KeyError:
+        query, callables = split_conditions(transition.conditions)
+        local = query is not None and is_local_query(model, query)
+        predicate = python_predicate(model, query) if local else None
+        handler.machine.guards[key] = (query, callables, local, predicate)
+    for condition in callables:
+        if not condition(**kwargs):
+            return False
+    if query is None:
+        return True
+    if predicate is not None:
+        try:
+            return predicate(instance) is True
+        except (TypeError, ValidationError):
+            pass
+    using = instance._state.db or 'default'
+    if local:
+        return match_values(instance, query, using)
+    if instance.pk is None or instance._state.adding:
+        raise ValueError("Conditions of transition from '{0}' to '{1}' span relations, the instance has to be saved.".format(
+            transition.start_state or '*', transition.end_state))
+    return model._base_manager.db_manager(using).filter(pk=instance.pk).filter(query).exists()
+
+
+def python_predicate(model, query):
+    """
+    Compile local `query` (see `is_local_query`) into a function evaluating it against the field
+    values of a `model` instance, `None` when it has lookups, transforms or relation fields that
+    can't be evaluated in Python. The function returns True, False or None (unknown, like SQL
+    comparisons with NULL), nullable fields in negated branches are handled like in Django
+    querysets, where a NULL doesn't match the negated lookup. Values that can't be converted
+    to the field type raise `TypeError` or `ValidationError`.
+    """
+    return _compile_node(model, query, False)
+
+
+def _compile_node(model, node, negated):
+    negated = negated != node.negated
+    children = []
+    for child in node.children:
+        if isinstance(child, Q):
+            compiled = _compile_node(model, child, negated)
+        else:
+            compiled = _compile_lookup(model, child[0], child[1], negated)
+        if compiled is None:
+            return None
+        children.append(compiled)
+    if node.connector not in (Q.AND, Q.OR):
+        return None
+    combine = _all_of if node.connector == Q.AND else _any_of
+    if node.negated:
+        return lambda instance: _negate(combine(child(instance) for child in children))
+    return lambda instance: combine(child(instance) for child in children)
+
+
+def _all_of(values):
+    result = True
+    for value in values:
+        if value is False:
+            return False
+        if value is None:
+            result = None
+    return result
+
+
+def _any_of(values):
+    result = False
+    for value in values:
+        if value is True:
+            return True
+        if value is None:
+            result = None
+    return result
+
+
+def _negate(value):
+    return None if value is None else not value
+
+
+def _python_field(model, name):
+    """Return concrete, non relation field `name` (or 'pk') of the `model`, `None` for other fields."""
+    try:
+        field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    if not field.concrete or field.is_relation:
+        return None
+    return field
+
+
+def _compile_lookup(model, path, value, negated):
+    parts = path.split(LOOKUP_SEP)
+    field = _python_field(model, parts[0])
+    if field is None or len(parts) > 2:
+        return None
+    lookup_name = parts[1] if len(parts) == 2 else 'exact'
+    attname = field.attname
+    if lookup_name == 'exact' and value is None:
+        lookup_name, value = 'isnull', True
+    if lookup_name == 'isnull':
+        if isinstance(value, F):
+            return None
+        expected = bool(value)
+        return lambda instance: (getattr(instance, attname) is None) == expected
+    if lookup_name == 'in':
+        if isinstance(value, F) or not isinstance(value, (list, tuple, set, frozenset)):
+            return None
+        try:
+            values = [field.to_python(item) for item in value if item is not None]
+        except (TypeError, ValidationError):
+            return None
+        return _compile_in(field, values, negated)
+    comparison = COMPARISONS.get(lookup_name)
+    if comparison is None or value is None or (lookup_name != 'exact' and field.get_internal_type() in TEXT_FIELD_TYPES):
+        return None
+    if isinstance(value, F):
+        other = _python_field(model, value.name)
+        if other is None:
+            return None
+        return _compile_comparison(field, comparison, other, None, negated)
+    try:
+        value = field.to_python(value)
+    except (TypeError, ValidationError):
+        return None
+    return _compile_comparison(field, comparison, None, value, negated)
+
+
+def _compile_comparison(field, comparison, other, value, negated):
+    """Compare `field` value with the `other` field value or with the constant `value`."""
+    attname = field.attname
+    to_python = field.to_python
+    # In negated branches Django adds `IS NOT NULL` of nullable columns, NULL is a mismatch there.
+    lhs_null = False if negated and field.null else None
+    rhs_null = False if negated and other is not None and other.null else None
+
+    def predicate(instance):
+        lhs = getattr(instance, attname)
+        if lhs is None:
+            return lhs_null
+        rhs = value if other is None else getattr(instance, other.attname)
+        if rhs is None:
+            return rhs_null if other is not None else None
+        if other is not None:
+            rhs = other.to_python(rhs)
+        return comparison(to_python(lhs), rhs)
+    return predicate
+
+
+def _compile_in(field, values, negated):
+    attname = field.attname
+    to_python = field.to_python
+    lhs_null = False if negated and field.null else None
+    if not values:
+        return lambda instance: False
+    values = set(values) if all(_hashable(item) for item in values) else values
+
+    def predicate(instance):
+        lhs = getattr(instance, attname)
+        if lhs is None:
+            return lhs_null
+        return to_python(lhs) in values
+    return predicate
+
+
+def _hashable(value):
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+def is_local_query(model, query):
+    """Check that `query` and `F` expressions in it use only concrete fields of the `model` itself."""
+    for child in query.children:
+        if isinstance(child, Q):
+            if not is_local_query(model, child):
+                return False
+            continue
+        lookup, value = child
+        if not _is_local_path(model, lookup):
+            return False
+        if isinstance(value, F):
+            if not _is_local_path(model, value.name):
+                return False
+        elif hasattr(value, 'resolve_expression'):
+            return False
+    return True
+
+
+def _is_local_path(model, path):
+    parts = path.split(LOOKUP_SEP)
+    if parts[0] == 'pk':
+        field = model._meta.pk
+    else:
+        try:
+            field = model._meta.get_field(parts[0])
+        except FieldDoesNotExist:
+            return False
+    if not field.concrete or field.many_to_many:
+        return False
+    return not field.is_relation or len(parts) == 1 or parts[1] in field.get_lookups()
+
+
+def match_values(instance, query, using):
+    """
+    Match `query` against the field values of the `instance`, with `SELECT 1 WHERE ...` over
+    the values, no table is read. Rows where the query is unknown (NULL) don't match, like in
+    a `WHERE` clause.
+    """
+    sql_query = Query(None)
+    for field in instance.__class__._meta.concrete_fields:
+        value = Value(getattr(instance, field.attname), output_field=field)
+        sql_query.add_annotation(value, field.name, select=False)
+        if field.attname != field.name:
+            sql_query.add_annotation(value, field.attname, select=False)
+    sql_query.add_annotation(Value(instance.pk, output_field=instance._meta.pk), 'pk', select=False)
+    sql_query.add_annotation(Value(1), '_match')
+    sql_query.add_q(query)
+    return sql_query.get_compiler(using=using).execute_sql(SINGLE) is not None
+
+
+def transitions_query(field_name, transitions):
+    """
+    Build `Q` matching rows that can fire a trigger (with SQL conditions) and return it
+    with the `{state id: callable conditions}` of its transitions that need a Python check.
+    """
+    query = None
+    state_ids = []
+    python_checks = {}
+    for state_id, transition in sorted(transitions.items()):
+        conditions, callables = split_conditions(transition.conditions)
+        if conditions is None:
+            state_ids.append(state_id)
+        else:
+            state_query = Q(**{field_name: state_id}) & conditions
+            query = state_query if query is None else query | state_query
+        if callables:
+            python_checks[state_id] = callables
+    if state_ids:
+        state_query = Q(**{'{0}__in'.format(field_name): state_ids})
+        query = state_query if query is None else state_query | query
+    return query, python_checks
+
+
+def evaluate_triggers(queryset, field_name, trigger_names=None, **kwargs):
+    """
+    Return `{pk: set of trigger names}` with the triggers every row of the `queryset` can fire,
+    considering state and conditions of the `field_name` machine, for all triggers or only for
+    `trigger_names`. State and `Q` conditions of every trigger are evaluated in SQL as annotations
+    of a single query, so listing allowed actions costs one query for any number of rows.
+    Instances are loaded only when some transition has callable conditions, they are called
+    for the rows matched by SQL with `kwargs` and the `instance`.
+    """
+    field = queryset.model._meta.get_field(field_name)
+    trigger_index = field.handler.machine.trigger_index
+    if trigger_names is None:
+        trigger_names = sorted(trigger_index)
+    annotations = {}
+    python_checks = {}
+    for trigger_name in trigger_names:
+        query, python_checks[trigger_name] = transitions_query(field_name, trigger_index.get(trigger_name, {}))
+        annotations['_can_{0}'.format(trigger_name)] = Value(False) if query is None else Case(
+            When(query, then=Value(True)), default=Value(False), output_field=BooleanField())
+    queryset = queryset.annotate(**annotations)
+
+    results = {}
+    if not any(python_checks.values()):
+        for row in queryset.values_list('pk', *annotations):
+            results[row[0]] = set(
+                trigger_name for trigger_name, allowed in zip(trigger_names, row[1:]) if allowed)
+        return results
+
+    for instance in queryset:
+        allowed = results[instance.pk] = set()
+        state_id = getattr(instance, field.attname)
+        for trigger_name in trigger_names:
+            if not getattr(instance, '_can_{0}'.format(trigger_name)):
+                continue
+            callables = python_checks[trigger_name].get(state_id, ())
+            hook_kwargs = dict(kwargs, instance=instance)
+            if all(condition(**hook_kwargs) for condition in callables):
+                allowed.add(trigger_name)
+    return results
@@ -7,10 +7,54 @@ from .helpers import make_list
 from six import string_types
 
 
-class State(object):
+class FrozenObject(object):
+    """
+    Base class for immutable, slotted objects, attributes are set once in
+    `__init__` with `_set` and can't be changed afterwards.
+    """
+    __slots__ = ()
+
+    def _set(self, **attributes):
+        for name, value in attributes.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("{0} objects are immutable.".format(self.__class__.__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError("{0} objects are immutable.".format(self.__class__.__name__))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class StateChoices(tuple):
+    """
+    Frozen `state_choices` rows of a field, `(id, value, state name)` tuples. The hash is
+    computed once, so looking up the compiled machine of a handler doesn't depend on the
+    number of states.
+    """
+    def __new__(cls, rows=()):
+        self = super(StateChoices, cls).__new__(cls, (tuple(row) for row in rows))
+        self._hash = tuple.__hash__(self)
+        return self
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        return self.__class__, (tuple(self),)
+
+
+class State(FrozenObject):
     """
     Atomic class for transition class.
     """
+    __slots__ = ('name', 'id', 'value', '_hash')
+
     def __init__(self, name, id=None, value=None):
         """
         :param name: name of the state
@@ -20,15 +64,24 @@ class State(object):
         :type id: integer or string
         :type value: string
         """
-        self.name = name
-        self.id = id
-        self.value = value
+        self._set(name=name, id=id, value=value, _hash=hash(name))
 
     def __eq__(self, other):
         if isinstance(other, string_types):
             return self.name == other
         elif isinstance(other, State):
             return self.name == other.name
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        return self.__class__, (self.name, self.id, self.value)
 
     def __str__(self):
         return self.name
@@ -38,28 +91,93 @@ class State(object):
         return "<{0}: '{1}'>".format(self.__class__.__name__, self.name)
 
 
-class Transition(object):
+class HandlerMethod(FrozenObject):
+    """
+    `before` or `after` hook that is a method of the handler, holds the plain function,
+    which is called with the bound handler of the instance as `self`.
+    """
+    __slots__ = ('function',)
+
+    def __init__(self, function):
+        self._set(function=function)
+
+    @property
+    def __name__(self):
+        return self.function.__name__
+
+    def __eq__(self, other):
+        if isinstance(other, HandlerMethod):
+            return self.function == other.function
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        return hash(self.function)
+
+    def __reduce__(self):
+        return self.__class__, (self.function,)
+
+    def __repr__(self):
+        return "<{0}: {1}>".format(self.__class__.__name__, self.__name__)
+
+
+class Transition(FrozenObject):
     """
     Atomic class for handler, holds data about transition.
     """
-    def __init__(self, trigger, start_state, end_state, before=None, after=None):
+    __slots__ = ('trigger', 'start_state', 'end_state', 'before', 'after', 'conditions', 'timeout', '_hash')
+
+    def __init__(self, trigger, start_state, end_state, before=None, after=None, conditions=None, timeout=None):
         """
-        :param trigger: function that triggers instance state change
-        :param start_state: name of a start state
-        :param end_state: name of a end state
-        :param before: methods that should be fired before trigger function
-        :param after: methods that should be fired after trigger function
+        :param trigger: handler function that triggers instance state change, called with the bound handler
+        :param start_state: start state, `None` for the '*' wildcard
+        :param end_state: end state
+        :param before: functions (or `HandlerMethod`) that should be fired before trigger function
+        :param after: functions (or `HandlerMethod`) that should be fired after trigger function
+        :param conditions: guards checked before any hook, Django `Q` objects or callables
+        :param timeout: time after which the transition fires by itself, see `timeouts` module
         :type trigger: string or handler method
-        :type start_state: string
-        :type end_state: string
+        :type start_state: State or None
+        :type end_state: State
         :type before: single method, function or list of function, methods
         :type after: single method, function or list of function, methods
+        :type conditions: single `Q`, function or list of them
+        :type timeout: timedelta or None
         """
-        self.trigger = trigger
-        self.start_state = start_state
-        self.end_state = end_state
-        self.before = make_list(before) if before else []
-        self.after = make_list(after) if after else []
+        trigger_name = trigger if isinstance(trigger, string_types) else trigger.__name__
+        self._set(
+            trigger=trigger,
+            start_state=start_state,
+            end_state=end_state,
+            before=tuple(make_list(before)) if before else (),
+            after=tuple(make_list(after)) if after else (),
+            conditions=tuple(make_list(conditions)) if conditions else (),
+            timeout=timeout,
+            _hash=hash((trigger_name, start_state, end_state)),
+        )
+
+    def _key(self):
+        trigger_name = self.trigger if isinstance(self.trigger, string_types) else self.trigger.__name__
+        return trigger_name, self.start_state, self.end_state
+
+    def __eq__(self, other):
+        if isinstance(other, Transition):
+            return self._key() == other._key()
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        return self.__class__, (
+            self.trigger, self.start_state, self.end_state, self.before, self.after, self.conditions, self.timeout)
 
     def __str__(self):
         return "From '{0}' -> '{1}', trigger: {2}".format(self.start_state or '*', self.end_state, self.trigger)
@@ -19,5 +19,17 @@ class TransitionNotPossibleError(Exception):
     pass
 
 
+class StaleStateError(TransitionNotPossibleError):
+    pass
+
+
+class ConditionNotMetError(TransitionNotPossibleError):
+    pass
+
+
 class WrongTriggerTypeError(Exception):
     pass
+
+
+class NoSuchTriggerError(Exception):
+    pass
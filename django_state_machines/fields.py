@@ -4,14 +4,40 @@ from __future__ import unicode_literals
 
 from django.db import models
 
-from .decorators import provide_method_name
+from .data_classes import StateChoices
+from .logic import _compile_lock
 
-import copy
+try:
+    from django.utils.choices import normalize_choices
+except ImportError:
+    def normalize_choices(value):
+        return value
 
 
 class StateMachineMixin(object):
+    """
+    Field with a state machine handler, available on model instances as `<name>_handler`.
+    With `state_indexes=True` (or a list of state names) partial indexes of the non-terminal
+    (or the given) states are added to the model indexes, see `indexes.partial_state_indexes`.
+
+    The handler is built, and its machine compiled, the first time `handler` is needed, so
+    defining models costs nothing at startup. Fields without `state_choices` take their
+    choices from the machine, also on first use. `state_indexes` need the machine while the
+    model class is created, fields using them are compiled right away.
+
+    Instances created in a state with `after_timeout` transitions get their timeouts
+    scheduled on `post_save`, as well as saved instances that changed state with triggers
+    in the non-atomic mode, also instances of proxy and multi-table inheritance children. Wrap `save()` in `transaction.atomic` to write the state and
+    the timeouts in one transaction.
+    """
+    _state_handler = None
+    _lazy_choices = False
+
     def __init__(self, handler, *args, **kwargs):
         self.state_choices = kwargs.pop('state_choices', None)
+        if self.state_choices:
+            self.state_choices = StateChoices(self.state_choices)
+        self.state_indexes = kwargs.pop('state_indexes', False)
 
         if self.state_choices:
             choices = []
@@ -22,35 +48,91 @@ class StateMachineMixin(object):
         super(StateMachineMixin, self).__init__(*args, **kwargs)
         self.handler_class = handler
 
+    @property
+    def choices(self):
+        if self._lazy_choices and not self._choices:
+            self._choices = list(self.handler.choices)
+        return self._choices
+
+    @choices.setter
+    def choices(self, value):
+        self._choices = normalize_choices(value)
+
+    @property
+    def handler(self):
+        """Handler of the field, built on first access."""
+        handler = self._state_handler
+        if handler is None:
+            with _compile_lock:
+                handler = self._state_handler
+                if handler is None:
+                    handler = self._state_handler = self.handler_class(
+                        self.name, self._get_field_type(), state_choices=self.state_choices)
+        return handler
+
+    def _check_choices(self):
+        # Choices built from the machine are well formed, checking them would compile the
+        # handler on every `manage.py check`, see `checks.check_machines_enabled`.
+        if self._lazy_choices and not self._choices:
+            from .checks import check_machines_enabled
+            if not check_machines_enabled():
+                return []
+        return super(StateMachineMixin, self)._check_choices()
+
     def deconstruct(self):
         name, path, args, kwargs = super(StateMachineMixin, self).deconstruct()
         kwargs['handler'] = self.handler_class
+        if self._lazy_choices and 'choices' not in kwargs:
+            kwargs['choices'] = self.choices
         return name, path, args, kwargs
 
     def contribute_to_class(self, cls, name, **kwargs):
         super(StateMachineMixin, self).contribute_to_class(cls, name, **kwargs)
-        field_type = self._get_field_type(cls)
-        self.handler = self.handler_class(name, field_type, state_choices=self.state_choices)
-        if not self.choices:
-            self.choices = self.handler.choices
-
-        def property_handler(self, method, instance):
-            handler_name = '_{0}'.format(method)
-            if handler_name not in self.__dict__:
-                field_name, rest = method.split('_')
-                field = self._meta.get_field(field_name)
-                handler_copy = copy.deepcopy(field.handler)
-                handler_copy.instance = instance
-                self.__dict__[handler_name] = handler_copy
-            return self.__dict__[handler_name]
-        property_handler.name = "{0}_handler".format(self.handler.field_name)
-
-        setattr(cls, "{0}_handler".format(self.handler.field_name), property(provide_method_name(property_handler, provide_instance=True)))
-
-    def _get_field_type(self, cls):
-        if isinstance(cls, models.IntegerField):
+        self._lazy_choices = not self._choices
+        if self.state_indexes and not cls._meta.abstract:
+            from .indexes import partial_state_indexes
+            states = None if self.state_indexes is True else self.state_indexes
+            cls._meta.indexes = list(cls._meta.indexes) + partial_state_indexes(cls, self, states)
+        if not cls._meta.abstract:
+            models.signals.post_save.connect(self._schedule_timeouts, sender=cls, weak=False)
+            models.signals.class_prepared.connect(self._connect_subclass, weak=False)
+
+        property_name = "{0}_handler".format(name)
+        cache_name = '_{0}'.format(property_name)
+        field = self
+
+        def property_handler(instance):
+            bound_handler = instance.__dict__.get(cache_name)
+            if bound_handler is None or bound_handler.instance is not instance:
+                bound_handler = instance.__dict__[cache_name] = field.handler.bind(instance)
+            return bound_handler
+
+        setattr(cls, property_name, property(property_handler))
+
+    def _connect_subclass(self, sender, **kwargs):
+        """Schedule timeouts on saves of proxy and multi-table inheritance children of the model too."""
+        if sender is not self.model and issubclass(sender, self.model):
+            models.signals.post_save.connect(self._schedule_timeouts, sender=sender, weak=False)
+
+    def _schedule_timeouts(self, sender, instance, created, raw=False, using=None, update_fields=None, **kwargs):
+        """
+        Schedule timeouts of the initial state of created instances and replace the timeouts
+        of instances whose state was changed by a trigger since they were saved, see `timeouts` module.
+        """
+        if raw or update_fields is not None and self.name not in update_fields:
+            return
+        changed = instance.__dict__.pop('_{0}_timeouts_changed'.format(self.name), False)
+        if created:
+            from .timeouts import schedule_created
+            schedule_created(self, instance, using)
+        elif changed:
+            from .timeouts import schedule_saved
+            schedule_saved(self, instance, using)
+
+    def _get_field_type(self):
+        if isinstance(self, models.IntegerField):
             return 'int'
-        elif isinstance(cls, models.CharField):
+        elif isinstance(self, models.CharField):
             return 'str'
 
 
@@ -59,4 +141,46 @@ class StateMachineIntegerField(StateMachineMixin, models.IntegerField):
 
 
 class StateMachineCharField(StateMachineMixin, models.CharField):
-    pass
+    """
+    State field storing state ids as varchar. With `state_codes`, a `{state id: small int}`
+    mapping of all states, they are stored in a smallint column instead: values are coded
+    when queries are prepared and decoded when rows are loaded, instances, handlers and
+    queryset helpers keep working with the state ids. The mapping is part of `deconstruct`,
+    changing it shows up in migrations, see `state_codes.encode_states` to convert a varchar column.
+    """
+    def __init__(self, handler, *args, **kwargs):
+        self.state_codes = kwargs.pop('state_codes', None)
+        if self.state_codes:
+            self.state_codes = dict(self.state_codes)
+            self._code_states = dict((code, state_id) for state_id, code in self.state_codes.items())
+            kwargs.setdefault('max_length', max(len(state_id) for state_id in self.state_codes))
+        super(StateMachineCharField, self).__init__(handler, *args, **kwargs)
+
+    def get_internal_type(self):
+        if self.state_codes:
+            return 'SmallIntegerField'
+        return super(StateMachineCharField, self).get_internal_type()
+
+    def get_prep_value(self, value):
+        value = super(StateMachineCharField, self).get_prep_value(value)
+        if value is None or not self.state_codes:
+            return value
+        try:
+            return self.state_codes[value]
+        except KeyError:
+            raise ValueError("'{0}' has no code in state_codes of '{1}' field.".format(value, self.name))
+
+    def get_db_converters(self, connection):
+        converters = super(StateMachineCharField, self).get_db_converters(connection)
+        if self.state_codes:
+            converters.append(self._decode_state)
+        return converters
+
+    def _decode_state(self, value, expression, connection):
+        return self._code_states.get(value, value)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super(StateMachineCharField, self).deconstruct()
+        if self.state_codes:
+            kwargs['state_codes'] = self.state_codes
+        return name, path, args, kwargs
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils.module_loading import import_string
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .data_classes import HandlerMethod
+
+import logging
+import threading
+import types
+
+
+logger = logging.getLogger('django_state_machines')
+
+INLINE = 'inline'
+ON_COMMIT = 'on_commit'
+BACKGROUND = 'background'
+
+
+class Hook(object):
+    """
+    Transition hook with an execution policy, use it in `before` and `after` of a transition:
+     - `INLINE` - function is called immediately, like a plain function,
+     - `ON_COMMIT` - function is called after the current transaction commits,
+     - `BACKGROUND` - function is submitted to the hook backend after the current
+       transaction commits.
+    Outside of a transaction deferred hooks are dispatched immediately. All deferred calls
+    scheduled at one level of a transaction (outside of savepoints or in one savepoint) are
+    dispatched together, rolled back savepoints in between don't split them, background ones
+    are submitted to the backend as a single batch. Deferred hooks with `batch=True` are called once per
+    dispatch with `batch` kwarg, a list of kwargs of all their scheduled calls.
+
+    Methods of the handler (`on_commit(self.notify)`) are called with the bound handler
+    of the instance as `self`, batched ones with the bound handler of their first call.
+    """
+    __slots__ = ('function', 'policy', 'using', 'batch')
+
+    def __init__(self, function, policy=INLINE, using=None, batch=False):
+        self.function = function
+        self.policy = policy
+        self.using = using
+        self.batch = batch
+
+    def __call__(self, **kwargs):
+        return self.call(None, kwargs)
+
+    def call(self, handler, kwargs):
+        """Call or schedule the function, a `HandlerMethod` with `handler` as `self`."""
+        function = self.function
+        if function.__class__ is HandlerMethod:
+            function = types.MethodType(function.function, handler)
+        if self.policy == INLINE:
+            return function(**kwargs)
+        dispatcher.schedule(self, function, kwargs)
+
+    @property
+    def wraps_handler_method(self):
+        return self.function.__class__ is HandlerMethod
+
+    def with_function(self, function):
+        """Return hook with the same policy calling `function`."""
+        return self.__class__(function, self.policy, self.using, self.batch)
+
+    @property
+    def __name__(self):
+        return getattr(self.function, '__name__', repr(self.function))
+
+    def __repr__(self):
+        return "<{0}: {1} {2}>".format(self.__class__.__name__, self.policy, self.__name__)
+
+
+def on_commit(function, using=None, batch=False):
+    """Wrap `function` so it is called after the transaction commits."""
+    return Hook(function, ON_COMMIT, using, batch)
+
+
+def in_background(function, using=None, batch=False):
+    """Wrap `function` so it is run by the hook backend after the transaction commits."""
+    return Hook(function, BACKGROUND, using, batch)
+
+
+class HookBackend(object):
+    """
+    Base class of backends running background hooks, subclass it to submit batches
+    to a task queue and point `STATE_MACHINES_HOOK_BACKEND` setting at your class.
+    """
+    def submit(self, calls):
+        """Run `calls`, a list of `(function, kwargs)` tuples, outside of the request."""
+        raise NotImplementedError
+
+    @staticmethod
+    def run(calls):
+        """Call every function of the batch, log failures and close database connections."""
+        try:
+            for function, kwargs in calls:
+                try:
+                    function(**kwargs)
+                except Exception:
+                    logger.exception("Background transition hook %r failed.", function)
+        finally:
+            connections.close_all()
+
+
+class ThreadPoolBackend(HookBackend):
+    """
+    Default backend, runs batches in a thread pool of `STATE_MACHINES_HOOK_WORKERS`
+    (default 4) threads or in the given `executor`.
+    """
+    def __init__(self, executor=None):
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=getattr(settings, 'STATE_MACHINES_HOOK_WORKERS', 4))
+
+    def submit(self, calls):
+        return self.executor.submit(self.run, calls)
+
+
+class HookBatch(object):
+    """Deferred hook calls scheduled at one savepoint level of a transaction."""
+    def __init__(self, dispatcher):
+        self.dispatcher = dispatcher
+        self.calls = []
+        self.callback = self.flush
+
+    def flush(self):
+        calls, self.calls = self.calls, []
+        self.dispatcher.dispatch(calls)
+
+
+class HookDispatcher(object):
+    """
+    Collects deferred hook calls per thread, connection and savepoint level and registers
+    a single `transaction.on_commit` callback for every level. Batches are keyed by the
+    savepoint ids of the level, so rolled back savepoints discard their batches together
+    with Django on commit callbacks. Django replaces the list of the callbacks on commit,
+    rollback and savepoint rollback, then only the batches whose callback is still in it
+    are kept, a new transaction starts with none.
+    """
+    def __init__(self):
+        self._local = threading.local()
+        self._backend = None
+        self._backend_lock = threading.Lock()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    backend_path = getattr(settings, 'STATE_MACHINES_HOOK_BACKEND', None)
+                    self._backend = import_string(backend_path)() if backend_path else ThreadPoolBackend()
+        return self._backend
+
+    @backend.setter
+    def backend(self, backend):
+        self._backend = backend
+
+    def schedule(self, hook, function, kwargs):
+        connection = transaction.get_connection(hook.using)
+        if not connection.in_atomic_block:
+            self.dispatch([(hook, function, kwargs)])
+            return
+        batches = self._get_batches(connection)
+        key = tuple(connection.savepoint_ids)
+        batch = batches.get(key)
+        if batch is None:
+            batch = batches[key] = HookBatch(self)
+            transaction.on_commit(batch.callback, using=connection.alias)
+        batch.calls.append((hook, function, kwargs))
+
+    def _get_batches(self, connection):
+        """Return `{savepoint ids: HookBatch}` of the current transaction of the `connection`."""
+        states = getattr(self._local, 'connections', None)
+        if states is None:
+            states = self._local.connections = {}
+        state = states.get(connection.alias)
+        if state is None or state[0] is not connection.run_on_commit:
+            batches = {}
+            if state is not None:
+                registered = set(id(callback) for _, callback, _ in connection.run_on_commit)
+                batches = dict(
+                    (key, batch) for key, batch in state[1].items() if id(batch.callback) in registered)
+            state = states[connection.alias] = (connection.run_on_commit, batches)
+        return state[1]
+
+    def dispatch(self, calls):
+        """Call `ON_COMMIT` hooks in order and submit `BACKGROUND` ones as one batch."""
+        background = []
+        for hook, function, kwargs in self._group_batched(calls):
+            if hook.policy == BACKGROUND:
+                background.append((function, kwargs))
+            else:
+                function(**kwargs)
+        if background:
+            self.backend.submit(background)
+
+    def _group_batched(self, calls):
+        """Merge calls of `batch` hooks into one call, placed where the first of them was."""
+        grouped = []
+        batches = {}
+        for hook, function, kwargs in calls:
+            if not hook.batch:
+                grouped.append((hook, function, kwargs))
+            elif hook in batches:
+                batches[hook].append(kwargs)
+            else:
+                batches[hook] = [kwargs]
+                grouped.append((hook, function, {'batch': batches[hook]}))
+        return grouped
+
+
+dispatcher = HookDispatcher()
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from django.db import models
+
+import hashlib
+import six
+
+
+def state_index_name(model, field, state_id):
+    """Index name unique for the table, column and state, within the 30 characters Django allows."""
+    digest = hashlib.md5('{0}.{1}.{2}'.format(model._meta.db_table, field.column, state_id).encode('utf-8'))
+    return '{0}_{1}_{2}'.format(model._meta.db_table[:11], field.column[:7], digest.hexdigest()[:8])
+
+
+def partial_state_indexes(model, field, states=None):
+    """
+    Return partial indexes of the state `field` (or field name) column, one per state, `WHERE <field> = <state>`.
+    By default indexes are built for the non-terminal states, the ones that have outgoing
+    transitions, pass state names in `states` to choose them. Pollers looking for rows in one
+    of those states scan only the small index of that state. Partial indexes are skipped by
+    databases which don't support them, like MySQL.
+    """
+    if isinstance(field, six.string_types):
+        field = model._meta.get_field(field)
+    machine = field.handler.machine
+    if states is None:
+        state_ids = sorted(state_id for state_id, triggers in machine.state_triggers.items() if triggers)
+    else:
+        state_ids = [machine.states_map.get_state_info(name).state.id for name in states]
+    return [
+        models.Index(
+            fields=[field.name],
+            condition=models.Q(**{field.name: state_id}),
+            name=state_index_name(model, field, state_id))
+        for state_id in state_ids]
+
+
+def is_indexed(model, field_name):
+    """Check if the `field_name` column is the leading column of some index of the `model`."""
+    field = model._meta.get_field(field_name)
+    if field.db_index or field.unique or field.primary_key:
+        return True
+    options = model._meta
+    leading_fields = [index.fields[0].lstrip('-') for index in options.indexes if index.fields]
+    leading_fields.extend(fields[0] for fields in options.unique_together if fields)
+    leading_fields.extend(fields[0] for fields in getattr(options, 'index_together', ()) if fields)
+    return field_name in leading_fields
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import logging
+import threading
+
+
+logger = logging.getLogger('django_state_machines')
+
+PHASES = ('guard', 'before', 'trigger', 'update', 'after')
+SUCCEEDED = 'succeeded'
+REJECTED = 'rejected'
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+def handler_label(handler):
+    """Return `HandlerClass.field_name` label of a handler or a bound handler."""
+    handler_class = getattr(handler, 'handler', handler).__class__
+    return '{0}.{1}'.format(handler_class.__name__, handler.field_name)
+
+
+class Collector(object):
+    """
+    Collector of transition processing metrics, the base class is a no-op and it's
+    the default one. `process` checks `enabled` once per call, so with a disabled
+    collector no timings are taken at all.
+    """
+    enabled = False
+
+    def record_phase(self, handler, trigger_name, phase, duration):
+        """Record `duration` in seconds of one of `PHASES` of a transition."""
+
+    def record_transition(self, handler, trigger_name, source, target, outcome):
+        """Count transition `outcome` (`SUCCEEDED` or `REJECTED`) from `source` state id."""
+
+    def record_hook(self, handler, hook, duration):
+        """Record `duration` in seconds of a single `before` or `after` function call."""
+
+
+class Histogram(object):
+    """Cumulative histogram with fixed bucket upper bounds, like Prometheus ones."""
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                self.counts[index] += 1
+
+    def __repr__(self):
+        return "<{0}: count={1}, sum={2:.6f}>".format(self.__class__.__name__, self.count, self.sum)
+
+
+class InMemoryCollector(Collector):
+    """
+    Collector keeping metrics in process memory:
+     - `phases` - `{(handler label, trigger name, phase): Histogram}`,
+     - `transitions` - `{(handler label, trigger name, source, target, outcome): count}`,
+     - `hooks` - `{(handler label, hook name): Histogram}`.
+    """
+    enabled = True
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.phases = {}
+            self.transitions = {}
+            self.hooks = {}
+
+    def _observe(self, histograms, key, duration):
+        with self._lock:
+            histogram = histograms.get(key)
+            if histogram is None:
+                histogram = histograms[key] = Histogram(self.buckets)
+            histogram.observe(duration)
+
+    def record_phase(self, handler, trigger_name, phase, duration):
+        self._observe(self.phases, (handler_label(handler), trigger_name, phase), duration)
+
+    def record_transition(self, handler, trigger_name, source, target, outcome):
+        key = (handler_label(handler), trigger_name, source, target, outcome)
+        with self._lock:
+            self.transitions[key] = self.transitions.get(key, 0) + 1
+
+    def record_hook(self, handler, hook, duration):
+        hook_name = getattr(hook, '__name__', repr(hook))
+        self._observe(self.hooks, (handler_label(handler), hook_name), duration)
+
+
+class LoggingCollector(InMemoryCollector):
+    """
+    In memory collector which also logs transitions on DEBUG level, rejected ones
+    on INFO level and hooks slower than `slow_hook_threshold` seconds on WARNING level.
+    """
+    def __init__(self, slow_hook_threshold=0.1, logger=logger, **kwargs):
+        super(LoggingCollector, self).__init__(**kwargs)
+        self.slow_hook_threshold = slow_hook_threshold
+        self.logger = logger
+
+    def record_transition(self, handler, trigger_name, source, target, outcome):
+        super(LoggingCollector, self).record_transition(handler, trigger_name, source, target, outcome)
+        level = logging.INFO if outcome == REJECTED else logging.DEBUG
+        self.logger.log(level, "%s: %s '%s' -> '%s' %s", handler_label(handler), trigger_name, source, target, outcome)
+
+    def record_hook(self, handler, hook, duration):
+        super(LoggingCollector, self).record_hook(handler, hook, duration)
+        if duration >= self.slow_hook_threshold:
+            self.logger.warning("%s: slow transition hook %s took %.3fs",
+                                handler_label(handler), getattr(hook, '__name__', repr(hook)), duration)
+
+
+def _labels(**labels):
+    return ','.join('{0}="{1}"'.format(name, _escape('' if value is None else value))
+                    for name, value in sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _histogram_lines(name, histogram, labels):
+    lines = []
+    for upper_bound, count in zip(histogram.buckets, histogram.counts):
+        lines.append('{0}_bucket{{{1}}} {2}'.format(name, _labels(le=upper_bound, **labels), count))
+    lines.append('{0}_bucket{{{1}}} {2}'.format(name, _labels(le='+Inf', **labels), histogram.count))
+    lines.append('{0}_sum{{{1}}} {2}'.format(name, _labels(**labels), histogram.sum))
+    lines.append('{0}_count{{{1}}} {2}'.format(name, _labels(**labels), histogram.count))
+    return lines
+
+
+def prometheus_text(collector):
+    """Dump metrics of an `InMemoryCollector` in Prometheus text exposition format."""
+    with collector._lock:
+        transitions = sorted(collector.transitions.items(), key=lambda item: [str(part) for part in item[0]])
+        phases = sorted(collector.phases.items())
+        hooks = sorted(collector.hooks.items())
+
+    lines = ['# TYPE state_machine_transitions_total counter']
+    for (handler, trigger, source, target, outcome), count in transitions:
+        labels = _labels(handler=handler, trigger=trigger, source=source, target=target, outcome=outcome)
+        lines.append('state_machine_transitions_total{{{0}}} {1}'.format(labels, count))
+    lines.append('# TYPE state_machine_phase_seconds histogram')
+    for (handler, trigger, phase), histogram in phases:
+        lines.extend(_histogram_lines(
+            'state_machine_phase_seconds', histogram, dict(handler=handler, trigger=trigger, phase=phase)))
+    lines.append('# TYPE state_machine_hook_seconds histogram')
+    for (handler, hook), histogram in hooks:
+        lines.extend(_histogram_lines('state_machine_hook_seconds', histogram, dict(handler=handler, hook=hook)))
+    return '\n'.join(lines) + '\n'
+
+
+collector = Collector()
+
+
+def get_collector():
+    return collector
+
+
+def set_collector(new_collector):
+    """Install `new_collector` for all handlers, `None` restores the no-op collector."""
+    global collector
+    collector = new_collector if new_collector is not None else Collector()
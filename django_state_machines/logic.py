@@ -2,37 +2,60 @@
 
 from __future__ import unicode_literals
 
-from .data_classes import State, Transition
-from .decorators import provide_method_name
-from .exceptions import TransitionNotPossibleError, WrongTriggerTypeError
-from .state_map import StateMachineMap
+from . import instrumentation
+from .aio import AsyncTransitionProcessMixin
+from .data_classes import HandlerMethod, State, StateChoices, Transition
+from .exceptions import (
+    ConditionNotMetError, NoSuchStateError, StaleStateError, TransitionNotPossibleError, WrongTriggerTypeError)
+from .helpers import make_list
+from .signals import post_transition, pre_transition
+from .state_map import CompiledStateMachine, StateMachineMap
 
-from collections import defaultdict
 from six import string_types
 
+from datetime import timedelta
+from timeit import default_timer
+
+import six
+import threading
+import types
+import weakref
+
+
+_compile_lock = threading.RLock()
+
 
 class StateCache(object):
     """
     StateCache class works as a State factory and cache, at the given
-    handler_key which is generated automatically at the init of a handler
-    and by state_name you retrieve the state you want.
+    handler_key, a `(handler class, field name)` tuple set at the init of
+    a handler, and by state_name you retrieve the state you want.
 
     The `type` parameter indicates the type of a field, if there are no
     kwargs provided for state initialization then StateCache inserts
     values basing on `type`.
-    If the type is `int` then it will try to insert item with id + 1,
-    If the type is `str` then it will try to insert item with state_name key
+    If the type is `int` then it will insert item with the next free id,
+    If the type is `str` then it will insert item with state_name key
+
+    Lookups of existing states take no lock, inserts are done under a lock,
+    so handlers can be compiled concurrently by threaded servers. States are
+    kept per handler class in a `WeakKeyDictionary`, they are released together
+    with the class, `clear` releases them earlier, e.g. between tests.
 
     Example:
-    defaultdict(dict, {
-        'TestHandler_state': {
-            'accepted': <State: 'accepted'>,
-            'notaccepted': <State: 'notaccepted'>,
-            'rejected': <State: 'rejected'>
+    {
+        <class 'TestHandler'>: {
+            'state': {
+                'accepted': <State: 'accepted'>,
+                'notaccepted': <State: 'notaccepted'>,
+                'rejected': <State: 'rejected'>
+            }
         }
-    })
+    }
     """
-    _state_objects = defaultdict(dict)
+    _state_objects = weakref.WeakKeyDictionary()
+    _next_ids = weakref.WeakKeyDictionary()
+    _lock = threading.Lock()
 
     @classmethod
     def get_state(cls, handler_key, state_name, field_type=None, **kwargs):
@@ -40,14 +63,29 @@ class StateCache(object):
         Create or get a state basing on the `handler_key` and `state_name`.
         If kwargs are not provided then generate auto values.
         """
-        if state_name in cls._state_objects[handler_key].keys():
-            return cls._state_objects[handler_key][state_name]
-        if not kwargs and field_type:
-            state = cls._create_auto_values(handler_key, state_name, field_type)
-        else:
-            state = State(state_name, **kwargs)
-        cls._state_objects[handler_key][state_name] = state
-        return state
+        handler_class, field_name = handler_key
+        try:
+            return cls._state_objects[handler_class][field_name][state_name]
+        except KeyError:
+            pass
+        with cls._lock:
+            fields = cls._state_objects.get(handler_class)
+            if fields is None:
+                fields = cls._state_objects[handler_class] = {}
+            states = fields.setdefault(field_name, {})
+            if state_name in states:
+                return states[state_name]
+            if not kwargs and field_type:
+                state = cls._create_auto_values(handler_key, state_name, field_type)
+            else:
+                state = State(state_name, **kwargs)
+            if isinstance(state.id, six.integer_types):
+                next_ids = cls._next_ids.get(handler_class)
+                if next_ids is None:
+                    next_ids = cls._next_ids[handler_class] = {}
+                next_ids[field_name] = max(next_ids.get(field_name, 1), state.id + 1)
+            states[state_name] = state
+            return state
 
     @classmethod
     def _create_auto_values(cls, handler_key, state_name, field_type):
@@ -56,17 +94,39 @@ class StateCache(object):
         transitions are provided for handler.
         """
         if field_type == 'int':
-            states = cls._state_objects[handler_key].values()
-            ids = sorted(state.id for state in states) or [1]
-            id = ids[-1]
+            handler_class, field_name = handler_key
+            id = cls._next_ids.get(handler_class, {}).get(field_name, 1)
             value = state_name.lower().title()
             return State(state_name, id=id, value=value)
         elif field_type == 'str':
             value = state_name.lower().title()
             return State(state_name, id=state_name, value=value)
 
+    @classmethod
+    def clear(cls, handler_key=None):
+        """Remove cached states of the `handler_key` or of all handlers if it's not provided."""
+        with cls._lock:
+            if handler_key is None:
+                cls._state_objects.clear()
+                cls._next_ids.clear()
+            else:
+                handler_class, field_name = handler_key
+                cls._state_objects.get(handler_class, {}).pop(field_name, None)
+                cls._next_ids.get(handler_class, {}).pop(field_name, None)
+
+    @classmethod
+    def stats(cls):
+        """Return number of cached handler keys and states."""
+        fields = [states for handler_fields in list(cls._state_objects.values()) for states in handler_fields.values()]
+        return {
+            'handlers': len(fields),
+            'states': sum(len(states) for states in fields),
+        }
+
 
 class TransitionProcessMixin(object):
+    __slots__ = ()
+
     def process(self, transition, **kwargs):
         """
         Transition processing starts with checking if transition can be made:
@@ -77,42 +137,171 @@ class TransitionProcessMixin(object):
             - handler `trigger` is called.
             - handler updates instance state value.
             - every function in transition `after` is called.
+
+        With `atomic=True` kwarg (or `atomic_update` set on the handler class) the state is
+        persisted with a compare-and-swap UPDATE, see `update_state_atomic`. If the row was
+        changed in the meantime, the instance state is refreshed and the whole transition
+        is retried up to `retries` (or handler `atomic_retries`) times, then `StaleStateError`
+        is raised.
+
+        When the machine has transitions with `after_timeout`, pending timeouts of the instance
+        are replaced by the ones of the new state once the state is persisted, in the atomic mode
+        in the transaction of the compare-and-swap UPDATE, otherwise when the instance is saved,
+        see `timeouts` module.
+
+        When `log_transitions` is enabled on the handler, or with `STATE_MACHINES_TRANSITION_LOG`
+        setting, every processed transition is recorded in `TransitionLog`.
+
+        When the collector installed with `instrumentation.set_collector` is enabled, every
+        phase, hook call and the transition outcome are reported to it.
+
+        Receivers of `signals.pre_transition` are called before `before` functions and
+        receivers of `signals.post_transition` after `after` functions.
         """
-        if not self.can_make_transition(transition):
-            raise TransitionNotPossibleError("Can't make transition from '{0}' to '{1}', instance value: '{2}'".format(
-                transition.start_state, transition.end_state, self.get_instance_field_value()
-            ))
-        self._call_before(transition, **kwargs)
-        self._call_trigger(transition, **kwargs)
-        self.update_state(transition)
-        self._call_after(transition, **kwargs)
+        atomic = kwargs.pop('atomic', self.atomic_update)
+        retries = kwargs.pop('retries', self.atomic_retries)
+        collector = instrumentation.collector
+        timed = collector.enabled
+        started = default_timer() if self.log_transitions or timed else None
+        while True:
+            source, phase_started = self._guard(transition, kwargs, collector, timed)
+            if transition.before:
+                if timed:
+                    self._call_hooks_timed(collector, transition.before, kwargs)
+                else:
+                    self._call_before(transition, **kwargs)
+            if timed:
+                phase_started = self._record_phase(collector, transition, 'before', phase_started)
+            transition.trigger(self, **kwargs)
+            if timed:
+                phase_started = self._record_phase(collector, transition, 'trigger', phase_started)
+            try:
+                self._persist(transition, atomic)
+            except StaleStateError:
+                if retries <= 0:
+                    raise
+                retries -= 1
+                transition = self._refreshed_transition(transition)
+                continue
+            if timed:
+                phase_started = self._record_phase(collector, transition, 'update', phase_started)
+            if transition.after:
+                if timed:
+                    self._call_hooks_timed(collector, transition.after, kwargs)
+                else:
+                    self._call_after(transition, **kwargs)
+            if timed or post_transition.enabled or self.log_transitions:
+                self._succeed(transition, source, kwargs, collector, timed, phase_started, started)
+            return
+
+    def _guard(self, transition, kwargs, collector, timed):
+        """
+        First steps of `process` and `aprocess`: check the start state and the conditions
+        of the `transition`, rejected ones are reported to the `collector` and raise, then
+        send `pre_transition`. Return the source state id and the time the next phase starts.
+        """
+        phase_started = default_timer() if timed else None
+        source = self.get_instance_field_value()
+        if transition.start_state is not None and source != transition.start_state.id:
+            self._reject_transition(transition, collector, timed, TransitionNotPossibleError(
+                "Can't make transition from '{0}' to '{1}', instance value: '{2}'".format(
+                    transition.start_state, transition.end_state, source)))
+        if transition.conditions and not self.conditions_met(transition, **kwargs):
+            self._reject_transition(transition, collector, timed, ConditionNotMetError(
+                "Conditions of transition from '{0}' to '{1}' are not met.".format(
+                    transition.start_state or '*', transition.end_state)))
+        if pre_transition.enabled:
+            pre_transition.send(self, transition, source, kwargs)
+        if timed:
+            phase_started = self._record_phase(collector, transition, 'guard', phase_started)
+        return source, phase_started
+
+    def _reject_transition(self, transition, collector, timed, error):
+        """Report the rejected `transition` to the `collector` and raise `error`."""
+        if timed:
+            collector.record_transition(
+                self, transition.trigger.__name__, self.get_instance_field_value(), transition.end_state.id,
+                instrumentation.REJECTED)
+        raise error
+
+    def _persist(self, transition, atomic):
+        """
+        Update the instance state, with a compare-and-swap UPDATE in the atomic mode,
+        otherwise timeouts are replaced when the instance is saved.
+        """
+        if atomic:
+            self.update_state_atomic(transition)
+        else:
+            self.update_state(transition)
+            if transition in self.machine.reschedules:
+                self._defer_timeouts()
+
+    def _refreshed_transition(self, transition):
+        """Reload the instance state after a failed compare-and-swap and return the transition to retry."""
+        self.refresh_state()
+        return self.get_transition(transition.trigger.__name__)
+
+    def _succeed(self, transition, source, kwargs, collector, timed, phase_started, started):
+        """Last steps of `process` and `aprocess`: send `post_transition`, report and log the transition."""
+        if post_transition.enabled:
+            post_transition.send(self, transition, source, kwargs)
+        if timed:
+            self._record_phase(collector, transition, 'after', phase_started)
+            collector.record_transition(
+                self, transition.trigger.__name__, source, transition.end_state.id, instrumentation.SUCCEEDED)
+        if self.log_transitions:
+            self._log_transition(transition, source, started)
+
+    def _record_phase(self, collector, transition, phase, phase_started):
+        """Report phase duration to the `collector` and return the time the next phase starts."""
+        now = default_timer()
+        collector.record_phase(self, transition.trigger.__name__, phase, now - phase_started)
+        return now
+
+    def _call_hooks_timed(self, collector, hooks, kwargs):
+        """Call every function in `hooks` and report the duration of each call to the `collector`."""
+        for hook in hooks:
+            hook_started = default_timer()
+            self._call_hook(hook, kwargs)
+            collector.record_hook(self, hook, default_timer() - hook_started)
+
+    def _call_hook(self, hook, kwargs):
+        """
+        Call `before` or `after` function, handler methods (`HandlerMethod`) and hooks
+        wrapping them (see `hooks.Hook`) with this handler as `self`.
+        """
+        if hook.__class__ is HandlerMethod:
+            hook.function(self, **kwargs)
+        elif getattr(hook, 'wraps_handler_method', False):
+            hook.call(self, kwargs)
+        else:
+            hook(**kwargs)
 
     def _call_before(self, transition, **kwargs):
         """
-        Call every function in `before` attribute. Kwargs are
-        provided from `process` method.
+        Call every function in `before` attribute, handler methods with this
+        handler as `self`. Kwargs are provided from `process` method.
         """
         for before_function in transition.before:
-            before_function(**kwargs)
+            self._call_hook(before_function, kwargs)
 
     def _call_trigger(self, transition, **kwargs):
         """
         Call trigger function from handler class. Because of the
         nature of implementation of handler classes, the trigger
-        function in the runtime is prefixed with '_'. Kwargs are
-        provided from `process` method.
+        function in the runtime is prefixed with '_', transition
+        holds the plain function and it's called with this handler
+        as `self`. Kwargs are provided from `process` method.
         """
-        trigger_name = transition.trigger.__name__
-        handler_trigger = getattr(self, '_' + trigger_name)
-        handler_trigger(**kwargs)
+        transition.trigger(self, **kwargs)
 
     def _call_after(self, transition, **kwargs):
         """
-        Call every function in `after` attribute. Kwargs are
-        provided from `process` method.
+        Call every function in `after` attribute, handler methods with this
+        handler as `self`. Kwargs are provided from `process` method.
         """
         for after_function in transition.after:
-            after_function(**kwargs)
+            self._call_hook(after_function, kwargs)
 
     def can_make_transition(self, transition):
         """
@@ -121,16 +310,192 @@ class TransitionProcessMixin(object):
 
         :return: True or False
         """
-        if transition.start_state == '*':
-            pass
+        if transition.start_state is None:
+            return True
 
         if self.get_instance_field_value() == transition.start_state.id:
             return True
         return False
 
+    def conditions_met(self, transition, **kwargs):
+        """Check transition `conditions` for the instance, see `conditions.check_conditions`."""
+        from .conditions import check_conditions
+        return check_conditions(self, transition, kwargs)
+
     def update_state(self, transition):
         setattr(self.instance, self.field_name, transition.end_state.id)
 
+    def _log_transition(self, transition, source, started):
+        """Record processed transition in the transition log, see `transition_log.record_transition`."""
+        from .transition_log import record_transition
+        record_transition(self, transition, source, default_timer() - started)
+
+    def update_state_atomic(self, transition):
+        """
+        Persist the transition with `UPDATE ... WHERE pk=%s AND <field>=<current value>`, so
+        it is written only if no one else changed the state since the instance was loaded,
+        without locking the row. When no row is updated `StaleStateError` is raised.
+        Instances that are not saved yet have no row to race on, only their value is updated.
+        Pending timeouts of the row are replaced in the same transaction as the UPDATE.
+        """
+        instance = self.instance
+        if transition in self.machine.reschedules and instance.pk is not None:
+            from django.db import transaction
+            with transaction.atomic(using=instance._state.db):
+                self._swap_state(self.get_instance_field_value(), transition.end_state)
+                self._schedule_timeouts(transition.end_state)
+        else:
+            self._swap_state(self.get_instance_field_value(), transition.end_state)
+        self.update_state(transition)
+
+    def _swap_state(self, expected_id, end_state):
+        """Compare-and-swap the state of saved instance row from `expected_id` to `end_state`."""
+        instance = self.instance
+        if instance.pk is not None:
+            manager = instance.__class__._base_manager.db_manager(instance._state.db)
+            updated = manager.filter(**{'pk': instance.pk, self.field_name: expected_id}).update(
+                **{self.field_name: end_state.id})
+            if not updated:
+                raise StaleStateError("State of {0} changed before transition from '{1}' to '{2}' was saved.".format(
+                    instance, expected_id, end_state))
+
+    def _defer_timeouts(self):
+        """Mark the instance, so its timeouts are replaced when it's saved, see `StateMachineMixin`."""
+        self.instance.__dict__['_{0}_timeouts_changed'.format(self.field_name)] = True
+
+    def _schedule_timeouts(self, state):
+        """Replace pending timeouts of saved instance by the timeouts of `state` it entered."""
+        instance = self.instance
+        if instance.pk is not None:
+            from .timeouts import schedule_timeouts
+            schedule_timeouts(
+                instance.__class__, [instance.pk], self.field_name, state.id, self.machine.timeouts.get(state.id, ()),
+                using=instance._state.db)
+
+    def run_path(self, trigger_names, **kwargs):
+        """
+        Fire `trigger_names` one after another and persist only the final state. The whole
+        chain is validated up front, from the current instance state and with the conditions
+        of every step, so an impossible chain fails before any hook runs. Then hooks and triggers
+        of every step are called in order, like in `process`, and the final state is saved with
+        a single compare-and-swap UPDATE. For saved instances all of it runs in one transaction,
+        `StaleStateError` rolls it back and restores the instance state. Like in the atomic mode
+        of `process`, `after` functions run only once the final state is saved, step by step
+        together with `post_transition`, the instance is already in the final state then.
+        """
+        kwargs['instance'] = instance = self.instance
+        source = self.get_instance_field_value()
+        transitions = []
+        state_id = source
+        for trigger_name in trigger_names:
+            transition = self.machine.index.get((state_id, trigger_name))
+            if transition is None:
+                raise TransitionNotPossibleError("Can't fire '{0}' trigger from '{1}' state of the path.".format(
+                    trigger_name, state_id))
+            transitions.append(transition)
+            state_id = transition.end_state.id
+        for transition in transitions:
+            if transition.conditions and not self.conditions_met(transition, **kwargs):
+                raise ConditionNotMetError("Conditions of transition from '{0}' to '{1}' are not met.".format(
+                    transition.start_state or '*', transition.end_state))
+        if not transitions:
+            return
+
+        from django.db import transaction
+        started = default_timer()
+        try:
+            with transaction.atomic(using=instance._state.db):
+                state_id = source
+                for transition in transitions:
+                    if pre_transition.enabled:
+                        pre_transition.send(self, transition, state_id, kwargs)
+                    state_id = transition.end_state.id
+                    self._call_before(transition, **kwargs)
+                    self._call_trigger(transition, **kwargs)
+                    self.update_state(transition)
+                self._swap_state(source, transitions[-1].end_state)
+                if self.machine.reschedules.intersection(transitions):
+                    self._schedule_timeouts(transitions[-1].end_state)
+        except Exception:
+            setattr(instance, self.field_name, source)
+            raise
+        collector = instrumentation.collector
+        for transition in transitions:
+            self._call_after(transition, **kwargs)
+            if collector.enabled:
+                collector.record_transition(
+                    self, transition.trigger.__name__, source, transition.end_state.id, instrumentation.SUCCEEDED)
+            if post_transition.enabled:
+                post_transition.send(self, transition, source, kwargs)
+            if self.log_transitions:
+                self._log_transition(transition, source, started)
+            source = transition.end_state.id
+
+    def advance_to(self, state, **kwargs):
+        """Move the instance to `state` along the shortest trigger path, see `path_to` and `run_path`."""
+        trigger_names = self.path_to(state)
+        if trigger_names is None:
+            raise TransitionNotPossibleError("State '{0}' can't be reached from '{1}'.".format(
+                state, self.get_instance_field_value()))
+        self.run_path(trigger_names, **kwargs)
+
+    def refresh_state(self):
+        """Reload instance state value from the database."""
+        self.instance.refresh_from_db(fields=[self.field_name])
+
+    def get_transition(self, trigger_name):
+        """
+        Return the transition that `trigger_name` fires from the current instance state,
+        if there is none `TransitionNotPossibleError` is raised.
+        """
+        transition = self.machine.index.get((self.get_instance_field_value(), trigger_name))
+        if transition is None:
+            self._reject(trigger_name)
+        return transition
+
+    def _reject(self, trigger_name):
+        """Report rejected trigger to the collector and raise `TransitionNotPossibleError`."""
+        value = self.get_instance_field_value()
+        collector = instrumentation.collector
+        if collector.enabled:
+            collector.record_transition(self, trigger_name, value, None, instrumentation.REJECTED)
+        raise TransitionNotPossibleError("Can't fire '{0}' trigger, instance value: '{1}'".format(
+            trigger_name, value))
+
+    def available_triggers(self):
+        """Return names of the triggers that can be fired from the current instance state."""
+        return self.machine.state_triggers.get(self.get_instance_field_value(), ())
+
+    def allowed_states(self):
+        """Return states that can be reached with one transition from the current instance state."""
+        return self.machine.state_targets.get(self.get_instance_field_value(), ())
+
+    def _current_state(self):
+        value = self.get_instance_field_value()
+        try:
+            return self.machine.states_by_id[value]
+        except KeyError:
+            raise NoSuchStateError("Instance value '{0}' is not a state of the map.".format(value))
+
+    def path_to(self, state):
+        """
+        Return names of the triggers of the shortest path from the current instance state
+        to `state`, an empty list if the instance is in it, `None` if it can't be reached.
+        """
+        path = self.machine.analysis.shortest_path(self._current_state(), state)
+        if path is None:
+            return None
+        return [transition.trigger.__name__ for transition in path]
+
+    def is_reachable(self, source, target=None):
+        """
+        Check if `target` state can be reached from `source` state, with one argument
+        check if it can be reached from the current instance state.
+        """
+        if target is None:
+            source, target = self._current_state(), source
+        return self.machine.analysis.is_reachable(source, target)
+
 
 class TransitionAddingMixin(object):
     def add_transitions(self):
@@ -142,7 +507,8 @@ class TransitionAddingMixin(object):
                 self.add_transition('reject', 'initial', 'rejected')
         """
 
-    def add_transition(self, trigger, start_state, end_state, before=None, after=None):
+    def add_transition(self, trigger, start_state, end_state, before=None, after=None, conditions=None,
+                       after_timeout=None):
         """
         General method for adding transitions to your handler, first it checks if the name
         exists in already defined methods, if yes, throw an error, if not, proceed to
@@ -150,46 +516,269 @@ class TransitionAddingMixin(object):
         assign a template function for this trigger.
         Template function will take the place of the current trigger function, when the one implemented
         on the handler will be moved to the name with underscore.
+
+        `start_state` can be a single state name, a list of state names (one transition is added
+        for every one of them) or '*', which makes the trigger fire from any state that has no
+        transition of its own for this trigger.
+
+        `before` and `after` methods of the handler (`self.notify`) are called with the bound
+        handler of the instance as `self`, like the trigger.
+
+        `conditions` are guards checked before any hook runs, Django `Q` objects matched against
+        the instance field values or callables receiving the same kwargs as hooks, see `conditions` module.
+
+        With `after_timeout` (a `timedelta`) the transition fires by itself once the instance
+        spent that long in the start state, see `timeouts` module. It can still be triggered as usual.
         """
+        if after_timeout is not None and after_timeout <= timedelta(0):
+            raise ValueError("Timeout of '{0}' trigger has to be positive.".format(trigger))
         handler_method = self._check_trigger(trigger)
-        start_state = StateCache.get_state(self.handler_key, start_state, field_type=self.field_type)
+        self._patch_trigger(handler_method)
+        handler_trigger = getattr(self.__class__, '_' + handler_method.__name__)
+        start_states = [
+            None if start_state_name == '*' else
+            StateCache.get_state(self.handler_key, start_state_name, field_type=self.field_type)
+            for start_state_name in make_list(start_state)]
         end_state = StateCache.get_state(self.handler_key, end_state, field_type=self.field_type)
-        transition = Transition(handler_method, start_state, end_state, before, after)
-        self.states_map.add_transition(transition)
+        before = self._handler_methods(before)
+        after = self._handler_methods(after)
+        for start_state in start_states:
+            transition = Transition(handler_trigger, start_state, end_state, before, after, conditions, after_timeout)
+            self.states_map.add_transition(transition)
+
+    def _handler_methods(self, hooks):
+        """
+        Replace methods of this handler in `hooks`, bare or wrapped in `hooks.Hook`,
+        by `HandlerMethod` with their plain functions.
+        """
+        if not hooks:
+            return hooks
+        return [self._handler_method(hook) for hook in make_list(hooks)]
+
+    def _handler_method(self, hook):
+        if getattr(hook, '__self__', None) is self:
+            return HandlerMethod(hook.__func__)
+        function = getattr(hook, 'function', None)
+        if getattr(function, '__self__', None) is self and hasattr(hook, 'with_function'):
+            return hook.with_function(HandlerMethod(function.__func__))
+        return hook
+
+    def _patch_trigger(self, handler_method):
+        """
+        Move the trigger implemented on the handler class to the name with underscore and put
+        the template function in its place. Class is patched only once, the next compilations
+        (other fields or subclasses) see the template function already in place.
+        """
+        trigger_name = handler_method.__name__
+        if getattr(getattr(self.__class__, trigger_name), 'state_trigger', False):
+            return
 
-        def add_trigger(self, method, **kwargs):
-            transition = self.states_map.transitions[method]
+        def template(self, **kwargs):
+            transition = self.get_transition(trigger_name)
             kwargs['instance'] = self.instance
             self.process(transition, **kwargs)
-        add_trigger.__name__ = handler_method.__name__
-
-        setattr(self.__class__, "_" + trigger, handler_method)
-        setattr(self.__class__, trigger, provide_method_name(add_trigger))
+        template.__name__ = str(trigger_name)
+        template.state_trigger = True
+        setattr(self.__class__, "_" + trigger_name, handler_method)
+        setattr(self.__class__, trigger_name, template)
 
     def _check_trigger(self, trigger):
         """
         Checks whether the provided trigger is a method on a handler, if it exists and is a callable.
         trigger: can be a callable or a string that refers to a method implemented on handler
+        If the handler class was already patched, the implemented method is returned from
+        the name with underscore.
         """
-        if isinstance(trigger, string_types):
-            if hasattr(self.__class__, trigger) and callable(getattr(self.__class__, trigger)):
-                return getattr(self.__class__, trigger)
-        elif callable(getattr(self.__class__, trigger.__name__)):
-            return trigger
+        trigger_name = trigger if isinstance(trigger, string_types) else getattr(trigger, '__name__', None)
+        method = getattr(self.__class__, trigger_name, None) if trigger_name else None
+        if getattr(method, 'state_trigger', False):
+            return getattr(self.__class__, '_' + trigger_name)
+        if callable(method):
+            return method
         raise WrongTriggerTypeError("Provided {0} trigger is not a string or a callable".format(trigger))
 
 
-class BaseStateHandler(TransitionProcessMixin, TransitionAddingMixin):
+class StateHandlerMeta(type):
+    """
+    Metaclass of the handlers, gives every handler class its own cache of compiled
+    machines, so subclasses never share (or overwrite) the machines of their parents.
+    """
+    def __init__(cls, name, bases, attrs):
+        super(StateHandlerMeta, cls).__init__(name, bases, attrs)
+        cls._compiled_machines = {}
+
+
+class BoundStateHandler(TransitionProcessMixin, AsyncTransitionProcessMixin):
+    """
+    Lightweight per-instance view of a handler, returned by the `<field>_handler`
+    model property. It holds only the model `instance` and the `field_name`,
+    everything else (states map, choices, trigger functions) is read from the
+    shared `handler`, which is set on the per-handler subclass built by
+    `for_handler`. Handler trigger functions, method hooks and the other methods
+    and properties of the handler class are called with the bound handler as `self`,
+    so `self.instance` is the model instance and other attributes are read from
+    the shared handler.
+    Every trigger has also an awaitable `a<trigger>` version, see `AsyncTransitionProcessMixin`.
+    """
+    __slots__ = ('instance', 'field_name')
+    handler = None
+    machine = None
+
+    def __init__(self, instance, field_name):
+        self.instance = instance
+        self.field_name = field_name
+
+    @classmethod
+    def for_handler(cls, handler, machine):
+        """
+        Create bound view class sharing the given `handler` and its compiled `machine`.
+        Every trigger gets a method with its transitions bound, so firing it costs a single
+        dict lookup by the current instance value.
+        """
+        name = str('Bound{0}'.format(handler.__class__.__name__))
+        attrs = {
+            '__slots__': (),
+            'handler': handler,
+            'machine': machine,
+            'atomic_update': handler.atomic_update,
+            'atomic_retries': handler.atomic_retries,
+            'async_thread_sensitive': handler.async_thread_sensitive,
+            'concurrent_after_hooks': handler.concurrent_after_hooks,
+            'log_transitions': handler.log_transitions,
+        }
+        for trigger_name, transitions in machine.trigger_index.items():
+            attrs['a' + trigger_name] = cls._make_async_trigger(trigger_name, transitions)
+        for trigger_name, transitions in machine.trigger_index.items():
+            attrs[trigger_name] = cls._make_trigger(trigger_name, transitions)
+        return type(name, (cls,), attrs)
+
+    @staticmethod
+    def _make_trigger(trigger_name, transitions):
+        def trigger(self, **kwargs):
+            instance = self.instance
+            transition = transitions.get(getattr(instance, self.field_name))
+            if transition is None:
+                self._reject(trigger_name)
+            kwargs['instance'] = instance
+            self.process(transition, **kwargs)
+        trigger.__name__ = str(trigger_name)
+        return trigger
+
+    @staticmethod
+    def _make_async_trigger(trigger_name, transitions):
+        async def trigger(self, **kwargs):
+            instance = self.instance
+            transition = transitions.get(getattr(instance, self.field_name))
+            if transition is None:
+                self._reject(trigger_name)
+            kwargs['instance'] = instance
+            await self.aprocess(transition, **kwargs)
+        trigger.__name__ = str('a' + trigger_name)
+        return trigger
+
+    def __getattr__(self, name):
+        """
+        Read attribute of the shared handler. Functions and properties of the handler class
+        are bound to this view, so helper methods of triggers see the instance, they are put
+        on the bound class on the first lookup.
+        """
+        handler = self.handler
+        if name not in handler.__dict__:
+            for handler_class in type(handler).__mro__:
+                if name in handler_class.__dict__:
+                    attribute = handler_class.__dict__[name]
+                    if isinstance(attribute, (types.FunctionType, property)):
+                        setattr(type(self), name, attribute)
+                        return attribute.__get__(self, type(self))
+                    break
+        return getattr(handler, name)
+
+    def __reduce__(self):
+        """Bound handler classes are built at runtime, unpickle through the model field handler."""
+        return _rebind, (self.instance, self.field_name)
+
+    def get_instance_field_value(self):
+        """Get value of a instance field value"""
+        return getattr(self.instance, self.field_name)
+
+    def __repr__(self):
+        return "<{0}: {1}.{2}>".format(self.__class__.__name__, self.instance, self.field_name)
+
+
+def _rebind(instance, field_name):
+    """Return the bound handler of the `field_name` model field for the `instance`."""
+    return instance._meta.get_field(field_name).handler.bind(instance)
+
+
+@six.add_metaclass(StateHandlerMeta)
+class BaseStateHandler(TransitionProcessMixin, AsyncTransitionProcessMixin, TransitionAddingMixin):
+    atomic_update = False
+    atomic_retries = 0
+    log_transitions = None
+
     def __init__(self, field_name, field_type, **kwargs):
+        self._setup(field_name, field_type, kwargs.get('state_choices'))
+        self.machine = self._get_machine()
+        self.states_map = self.machine.states_map
+
+    def _setup(self, field_name, field_type, state_choices):
         self.field_name = field_name
         self.field_type = field_type
-        self.handler_key = "{0}_{1}".format(self.__class__, field_name)
-        self.states_map = StateMachineMap()
-        self.state_choices = kwargs.get('state_choices', [])
+        self.handler_key = (self.__class__, field_name)
+        self.state_choices = state_choices if isinstance(state_choices, StateChoices) else \
+            StateChoices(state_choices or ())
         self.instance = None
+        if self.log_transitions is None:
+            self.log_transitions = self._log_transitions_default()
+
+    @property
+    def machine_key(self):
+        """
+        Key of the compiled machine of this handler in the class cache, `state_choices`
+        are frozen once (by the field), so the key costs the same for any number of states.
+        """
+        return self.field_name, self.field_type, self.state_choices
+
+    def _get_machine(self):
+        """
+        Return the `CompiledStateMachine` of this handler class and field configuration,
+        compile it with `add_transitions` the first time it is needed.
+        """
+        key = self.machine_key
+        machine = self._compiled_machines.get(key)
+        if machine is None:
+            with _compile_lock:
+                machine = self._compiled_machines.get(key)
+                if machine is None:
+                    machine = self._compiled_machines[key] = self._compile()
+        return machine
+
+    def _compile(self):
+        self.states_map = StateMachineMap()
         if self.state_choices:
             self._init_state_choices()
         self.add_transitions()
+        return self._install(self.states_map)
+
+    def _install(self, states_map):
+        """Freeze `states_map` into this handler's machine, with its bound handler class."""
+        self.states_map = states_map
+        self.machine = CompiledStateMachine(states_map)
+        self.machine.bound_class = BoundStateHandler.for_handler(self, self.machine)
+        return self.machine
+
+    @staticmethod
+    def _log_transitions_default():
+        """Transition log is enabled with `STATE_MACHINES_TRANSITION_LOG` setting, read once per handler."""
+        try:
+            from .transition_log import is_enabled
+        except ImportError:
+            return False
+        return is_enabled()
+
+    def bind(self, instance):
+        """Return lightweight `BoundStateHandler` view of this handler for the `instance`."""
+        return self.machine.bound_class(instance, self.field_name)
 
     def _init_state_choices(self):
         for state_values_row in self.state_choices:
@@ -203,7 +792,4 @@ class BaseStateHandler(TransitionProcessMixin, TransitionAddingMixin):
 
     @property
     def choices(self):
-        choices = []
-        for node in self.states_map.machine_map.values():
-            choices.append((node.state.id, node.state.value))
-        return choices
+        return list(self.machine.choices)
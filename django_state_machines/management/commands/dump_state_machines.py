@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...serialization import FORMATS, dump_machines, dumps, loads, verify_machines
+
+import sys
+
+
+class Command(BaseCommand):
+    help = "Dump compiled state machines of all models, with their fingerprints."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='json')
+        parser.add_argument('--output', help="File to write the machines to, stdout by default.")
+        parser.add_argument(
+            '--fingerprints', action='store_true', help="Print only model labels and fingerprints.")
+        parser.add_argument(
+            '--verify', metavar='PATH', help="Check that the machines in the dump match the current code.")
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            with open(options['verify'], 'rb') as dump_file:
+                mismatched = verify_machines(loads(dump_file.read(), options['format']))
+            if mismatched:
+                raise CommandError("Machines differ from the dump: {0}.".format(', '.join(mismatched)))
+            self.stdout.write("Machines match the dump.")
+            return
+
+        document = dump_machines()
+        if options['fingerprints']:
+            for data in document['machines']:
+                self.stdout.write('{0} {1}'.format(data['model'], data['fingerprint']))
+            return
+
+        content = dumps(document, options['format'])
+        if options['output']:
+            with open(options['output'], 'wb') as dump_file:
+                dump_file.write(content)
+        else:
+            stdout = getattr(sys.stdout, 'buffer', sys.stdout)
+            stdout.write(content)
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from ...timeouts import CLAIM_TIMEOUT, run_due_timeouts
+
+from datetime import timedelta
+
+import time
+
+
+class Command(BaseCommand):
+    help = "Fire due timeout transitions, claimed in batches, until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--interval', type=float, default=5.0, help="Seconds to wait when there are no due timeouts.")
+        parser.add_argument(
+            '--claim-timeout', type=float, default=CLAIM_TIMEOUT.total_seconds(),
+            help="Seconds after which timeouts claimed by a stopped worker are claimed again.")
+        parser.add_argument('--once', action='store_true', help="Fire the due timeouts and exit.")
+        parser.add_argument('--database', help="Database of the timeouts and the models.")
+
+    def handle(self, *args, **options):
+        claim_timeout = timedelta(seconds=options['claim_timeout'])
+        while True:
+            close_old_connections()
+            result = run_due_timeouts(options['batch_size'], options['database'], claim_timeout=claim_timeout)
+            claimed = result.succeeded + result.skipped + result.failed
+            if claimed:
+                self.stdout.write("Fired {0}, skipped {1}, failed {2} timeouts.".format(
+                    result.succeeded, result.skipped, result.failed))
+            if claimed < options['batch_size']:
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
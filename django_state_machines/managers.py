@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from django.db import models, transaction
+from django.db.models import Case, Value, When
+from django.db.models.functions import Concat, Trim
+
+from .conditions import split_conditions, transitions_query
+from .exceptions import NoSuchTriggerError
+from .signals import post_transition, pre_transition
+from .timeouts import schedule_timeouts
+
+from timeit import default_timer
+
+
+class StateMachineQuerySet(models.QuerySet):
+    """
+    QuerySet with bulk transitions for the models with state machine fields:
+
+        Product.objects.filter(...).transition('state', 'accept')
+    """
+    def transition(self, field_name, trigger_name, run_hooks=False, batch_size=1000, **kwargs):
+        """
+        Fire `trigger_name` of the `field_name` state machine for every row of the queryset
+        that is in one of the trigger start states and return the number of moved rows.
+
+        By default rows are moved with a single conditional UPDATE, without loading them
+        and without calling handler triggers and transition hooks. With `run_hooks` rows
+        are loaded in batches of `batch_size`, for every batch `before` functions and handler
+        triggers are called, the batch is moved with one conditional UPDATE per start state
+        and then `after` functions are called for the rows that were moved. Kwargs are passed
+        to the hooks like in `TransitionProcessMixin.process`. Only transitions with hooks are
+        recorded in the transition log. Bulk receivers of `post_transition` get the moved rows
+        of every batch and start state at once.
+
+        When the trigger enters or leaves states with timeouts (see `timeouts` module) or transition
+        signals have receivers for it, the single UPDATE is replaced by one transaction that locks
+        the rows with `SELECT ... FOR UPDATE`, moves them by primary key in batches of `batch_size`,
+        one UPDATE per start state, and replaces their pending timeouts. Rows are loaded only for
+        the receivers: `pre_transition` ones are called for every row before it's moved, raising
+        aborts the whole transition, `post_transition` ones get all rows moved from a start state
+        in one `send_bulk`. Kwargs are passed to the receivers.
+
+        `Q` conditions of the transitions are added to the WHERE clause, rows not meeting
+        them are skipped. Callable conditions need the rows loaded, they are checked only with
+        `run_hooks`, without it `ValueError` is raised for transitions that have them.
+        """
+        field = self.model._meta.get_field(field_name)
+        moves = self._get_moves(field, trigger_name)
+        query, python_checks = transitions_query(field_name, moves)
+        if python_checks and not run_hooks:
+            raise ValueError("'{0}' trigger has callable conditions, they can be checked only with run_hooks.".format(
+                trigger_name))
+        queryset = self.filter(query)
+        if run_hooks:
+            return queryset._transition_with_hooks(field, trigger_name, moves, batch_size, kwargs)
+        machine = field.handler.machine
+        if machine.reschedules.intersection(moves.values()) or self._has_receivers(machine, moves):
+            return queryset._transition_by_pks(field, moves, batch_size, kwargs)
+        return queryset.update(**{field_name: self._get_update_value(field, moves)})
+
+    def can_fire(self, field_name, trigger_name):
+        """
+        Filter the queryset to the rows that can fire `trigger_name` of the `field_name` machine,
+        `WHERE <field> IN (<start states>)` with `Q` conditions of the transitions added.
+        Callable conditions can't be checked in SQL and are not considered here.
+        """
+        field = self.model._meta.get_field(field_name)
+        return self.filter(transitions_query(field_name, self._get_moves(field, trigger_name))[0])
+
+    def annotate_available_triggers(self, field_name, name=None):
+        """
+        Annotate every row with space separated names of the triggers it can fire, as
+        `<field>_available_triggers` or `name`. Triggers are resolved with `Case/When`
+        over the current state, transitions with `Q` conditions add a `Case` of their own.
+        Callable conditions are not considered, like in `can_fire`.
+        """
+        field = self.model._meta.get_field(field_name)
+        machine = field.handler.machine
+        whens = []
+        for state_id, trigger_names in machine.state_triggers.items():
+            if not trigger_names:
+                continue
+            parts = []
+            for trigger_name in trigger_names:
+                conditions = split_conditions(machine.index[state_id, trigger_name].conditions)[0]
+                if conditions is None:
+                    parts.append(Value(' ' + trigger_name))
+                else:
+                    parts.append(Case(When(conditions, then=Value(' ' + trigger_name)), default=Value('')))
+            if all(isinstance(part, Value) for part in parts):
+                then = Value(''.join(part.value for part in parts).strip())
+            else:
+                then = Trim(Concat(*parts, output_field=models.CharField()) if len(parts) > 1 else parts[0])
+            whens.append(When(**{field_name: state_id, 'then': then}))
+        annotation = Case(*whens, default=Value(''), output_field=models.CharField())
+        return self.annotate(**{name or '{0}_available_triggers'.format(field_name): annotation})
+
+    def _get_moves(self, field, trigger_name):
+        """Map start state ids of the trigger to its transitions."""
+        machine = field.handler.machine
+        if trigger_name not in machine.transitions:
+            raise NoSuchTriggerError("'{0}' handler has no '{1}' trigger.".format(
+                field.handler.__class__.__name__, trigger_name))
+        return machine.trigger_index[trigger_name]
+
+    def _get_update_value(self, field, moves):
+        end_ids = set(transition.end_state.id for transition in moves.values())
+        if len(end_ids) == 1:
+            return Value(end_ids.pop(), output_field=field)
+        return Case(
+            *[When(**{field.name: start_id, 'then': Value(transition.end_state.id, output_field=field)})
+              for start_id, transition in moves.items()],
+            output_field=field)
+
+    @staticmethod
+    def _has_receivers(machine, moves, signals=(pre_transition, post_transition)):
+        return any(
+            signal.enabled and signal.lookup(machine, transition, start_id)
+            for signal in signals for start_id, transition in moves.items())
+
+    def _transition_by_pks(self, field, moves, batch_size, kwargs):
+        """
+        Move locked rows by primary key, replace their timeouts and send transition
+        signals, see `transition`.
+        """
+        handler = field.handler
+        machine = handler.machine
+        manager = self.model._base_manager.db_manager(self.db)
+        load_rows = self._has_receivers(machine, moves)
+        moved_count = 0
+        with transaction.atomic(using=self.db):
+            locked = self.select_for_update().order_by('pk')
+            groups = {}
+            if load_rows:
+                instances = {}
+                for instance in locked:
+                    instances[instance.pk] = instance
+                    groups.setdefault(getattr(instance, field.attname), []).append(instance.pk)
+            else:
+                for pk, start_id in locked.values_list('pk', field.attname):
+                    groups.setdefault(start_id, []).append(pk)
+            for start_id, pks in groups.items():
+                transition = moves[start_id]
+                end_id = transition.end_state.id
+                if pre_transition.enabled and pre_transition.lookup(machine, transition, start_id):
+                    for pk in pks:
+                        instance = instances[pk]
+                        pre_transition.send(
+                            handler.bind(instance), transition, start_id, dict(kwargs, instance=instance))
+                moved = []
+                for index in range(0, len(pks), batch_size):
+                    batch_pks = pks[index:index + batch_size]
+                    updated = manager.filter(**{'pk__in': batch_pks, field.name: start_id}).update(
+                        **{field.name: Value(end_id, output_field=field)})
+                    if updated != len(batch_pks):
+                        batch_pks = list(manager.filter(pk__in=batch_pks, **{field.name: end_id}).values_list(
+                            'pk', flat=True))
+                    moved.extend(batch_pks)
+                moved_count += len(moved)
+                if moved and transition in machine.reschedules:
+                    schedule_timeouts(
+                        self.model, moved, field.name, end_id, machine.timeouts.get(end_id, ()), using=self.db)
+                if moved and post_transition.enabled and post_transition.lookup(machine, transition, start_id):
+                    moved_instances = [instances[pk] for pk in moved]
+                    for instance in moved_instances:
+                        setattr(instance, field.attname, end_id)
+                    post_transition.send_bulk(handler, transition, start_id, moved_instances, kwargs)
+        return moved_count
+
+    def _transition_with_hooks(self, field, trigger_name, moves, batch_size, kwargs):
+        moved_count = 0
+        last_pk = None
+        queryset = self.order_by('pk')
+        while True:
+            batch_queryset = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            batch = list(batch_queryset[:batch_size])
+            if not batch:
+                return moved_count
+            last_pk = batch[-1].pk
+            with transaction.atomic(using=self.db):
+                moved_count += self._process_batch(field, trigger_name, moves, batch, kwargs)
+
+    def _process_batch(self, field, trigger_name, moves, batch, kwargs):
+        property_name = '{0}_handler'.format(field.name)
+        groups = {}
+        for instance in batch:
+            started = default_timer()
+            handler = getattr(instance, property_name)
+            transition = handler.get_transition(trigger_name)
+            hook_kwargs = dict(kwargs, instance=instance)
+            if not all(condition(**hook_kwargs) for condition in split_conditions(transition.conditions)[1]):
+                continue
+            if pre_transition.enabled:
+                pre_transition.send(handler, transition, handler.get_instance_field_value(), hook_kwargs)
+            handler._call_before(transition, **hook_kwargs)
+            handler._call_trigger(transition, **hook_kwargs)
+            groups.setdefault(handler.get_instance_field_value(), []).append((instance, handler, transition, started))
+
+        moved_count = 0
+        machine = field.handler.machine
+        manager = self.model._base_manager.db_manager(self.db)
+        for start_id, rows in groups.items():
+            end_id = moves[start_id].end_state.id
+            pks = [row[0].pk for row in rows]
+            updated = manager.filter(**{'pk__in': pks, field.name: start_id}).update(
+                **{field.name: Value(end_id, output_field=field)})
+            if updated != len(pks):
+                moved_pks = set(manager.filter(pk__in=pks, **{field.name: end_id}).values_list('pk', flat=True))
+                rows = [row for row in rows if row[0].pk in moved_pks]
+            moved_count += updated
+            if rows and moves[start_id] in machine.reschedules:
+                schedule_timeouts(
+                    self.model, [row[0].pk for row in rows], field.name, end_id, machine.timeouts.get(end_id, ()),
+                    using=self.db)
+            for instance, handler, transition, started in rows:
+                handler.update_state(transition)
+                handler._call_after(transition, **dict(kwargs, instance=instance))
+                if handler.log_transitions:
+                    handler._log_transition(transition, start_id, started)
+            if rows and post_transition.enabled:
+                post_transition.send_bulk(rows[0][1], moves[start_id], start_id, [row[0] for row in rows], kwargs)
+        return moved_count
+
+
+class StateMachineManager(models.Manager.from_queryset(StateMachineQuerySet)):
+    pass
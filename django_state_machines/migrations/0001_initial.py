@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 5.2.18 on 2026-10-16 20:44
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransitionLog',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.CharField(max_length=255)),
+                ('field', models.CharField(max_length=100)),
+                ('trigger', models.CharField(max_length=100)),
+                ('source', models.CharField(blank=True, max_length=100)),
+                ('target', models.CharField(max_length=100)),
+                ('timestamp', models.DateTimeField(db_index=True)),
+                ('duration', models.FloatField(help_text='Transition processing time in seconds.')),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['content_type', 'object_id'], name='state_log_instance_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 5.2.18 on 2026-10-16 21:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('django_state_machines', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StateTimeout',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.CharField(max_length=255)),
+                ('field', models.CharField(max_length=100)),
+                ('state', models.CharField(help_text='State the timeout leaves.', max_length=100)),
+                ('trigger', models.CharField(max_length=100)),
+                ('due_at', models.DateTimeField(db_index=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('claimed_by', models.CharField(blank=True, max_length=32)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['content_type', 'object_id', 'field'], name='state_timeout_instance_idx')],
+            },
+        ),
+    ]
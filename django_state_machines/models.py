@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+
+
+class TransitionLog(models.Model):
+    """
+    Record of a single transition, written when `STATE_MACHINES_TRANSITION_LOG`
+    setting (or `log_transitions` of the handler) is enabled.
+    """
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.CharField(max_length=255)
+    instance = GenericForeignKey('content_type', 'object_id')
+    field = models.CharField(max_length=100)
+    trigger = models.CharField(max_length=100)
+    source = models.CharField(max_length=100, blank=True)
+    target = models.CharField(max_length=100)
+    timestamp = models.DateTimeField(db_index=True)
+    duration = models.FloatField(help_text='Transition processing time in seconds.')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['content_type', 'object_id'], name='state_log_instance_idx'),
+        ]
+
+    def __str__(self):
+        return "{0}.{1}: '{2}' -> '{3}' ({4})".format(
+            self.content_type_id, self.object_id, self.source, self.target, self.trigger)
+
+
+class StateTimeout(models.Model):
+    """
+    Pending timeout transition of an instance, due at `due_at`. Rows are replaced whenever
+    the instance changes state and are claimed and fired by `run_state_timeouts` command,
+    see `timeouts` module.
+    """
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.CharField(max_length=255)
+    instance = GenericForeignKey('content_type', 'object_id')
+    field = models.CharField(max_length=100)
+    state = models.CharField(max_length=100, help_text='State the timeout leaves.')
+    trigger = models.CharField(max_length=100)
+    due_at = models.DateTimeField(db_index=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    claimed_by = models.CharField(max_length=32, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['content_type', 'object_id', 'field'], name='state_timeout_instance_idx'),
+        ]
+
+    def __str__(self):
+        return "{0}.{1}: '{2}' at {3}".format(self.content_type_id, self.object_id, self.trigger, self.due_at)
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Offline replay of event streams through a state machine, without Django settings,
+models or per-entity handlers:
+
+    engine = ReplayEngine(ProductHandler('state', 'str'), initial_state='not_accepted')
+    for rejected in engine.replay(events_from_csv(open('events.csv'))):
+        print(rejected)
+    engine.state_of(entity_id)
+
+Hooks, triggers and conditions are not called, only states are tracked.
+"""
+
+from __future__ import unicode_literals
+
+from array import array
+from collections import namedtuple
+
+import csv
+import json
+
+
+RejectedEvent = namedtuple('RejectedEvent', ('entity', 'trigger', 'state'))
+
+
+class ReplayEngine(object):
+    """
+    Replays `(entity, trigger)` events through the machine of a compiled handler (or a
+    `CompiledStateMachine`). States are coded as ints, positions in `machine.states`, and
+    transitions are kept in a flat `array` table indexed with `state code * triggers + trigger
+    code`, so an event costs two lookups. An extra code stands for entities in no known state,
+    all their events are rejected.
+
+    Entity states are kept in a dict, or with `capacity` in an `array` of small ints indexed
+    by entity ids, which have to be ints lower than `capacity`. Entities seen for the first
+    time are in `initial_state` (a state id or name), without it their events are rejected until
+    they are seeded with `load`.
+    """
+    def __init__(self, handler, initial_state=None, capacity=None):
+        machine = getattr(handler, 'machine', handler)
+        self.machine = machine
+        self.state_ids = tuple(state.id for state in machine.states) + (None,)
+        self.unknown = len(machine.states)
+        self.codes = dict((state.id, code) for code, state in enumerate(machine.states))
+        self.triggers = tuple(sorted(machine.transitions))
+        self.trigger_codes = dict((trigger_name, code) for code, trigger_name in enumerate(self.triggers))
+        width = len(self.triggers)
+        self.table = array('i', [-1] * (width * (self.unknown + 1)))
+        for (state_id, trigger_name), transition in machine.index.items():
+            self.table[self.codes[state_id] * width + self.trigger_codes[trigger_name]] = \
+                self.codes[transition.end_state.id]
+        if initial_state is None:
+            self.initial = self.unknown
+        elif initial_state in self.codes:
+            self.initial = self.codes[initial_state]
+        else:
+            self.initial = machine.state_indexes[initial_state]
+        if capacity is None:
+            self.states = {}
+        else:
+            self.states = array('h' if self.unknown < 2 ** 15 else 'i', [self.initial]) * capacity
+
+    def load(self, pairs):
+        """Seed states of entities from `(entity, state id)` pairs, e.g. a current table snapshot."""
+        codes = self.codes
+        states = self.states
+        for entity, state_id in pairs:
+            states[entity] = codes[state_id]
+
+    def replay(self, events):
+        """
+        Apply `(entity, trigger name)` events in order and yield `RejectedEvent` for the ones
+        that can't fire from the entity state, with the state id the entity stays in.
+        """
+        table = self.table
+        width = len(self.triggers)
+        trigger_codes = self.trigger_codes
+        states = self.states
+        initial = self.initial
+        if isinstance(states, dict):
+            get_state = states.get
+            for entity, trigger_name in events:
+                code = get_state(entity, initial)
+                trigger_code = trigger_codes.get(trigger_name)
+                if trigger_code is not None:
+                    target = table[code * width + trigger_code]
+                    if target >= 0:
+                        states[entity] = target
+                        continue
+                yield RejectedEvent(entity, trigger_name, self.state_ids[code])
+        else:
+            for entity, trigger_name in events:
+                code = states[entity]
+                trigger_code = trigger_codes.get(trigger_name)
+                if trigger_code is not None:
+                    target = table[code * width + trigger_code]
+                    if target >= 0:
+                        states[entity] = target
+                        continue
+                yield RejectedEvent(entity, trigger_name, self.state_ids[code])
+
+    def run(self, events):
+        """Replay `events` and return the number of rejected ones."""
+        rejected = 0
+        for _ in self.replay(events):
+            rejected += 1
+        return rejected
+
+    def state_of(self, entity):
+        """Return state id of the entity, `None` if it's in no known state."""
+        if isinstance(self.states, dict):
+            return self.state_ids[self.states.get(entity, self.initial)]
+        return self.state_ids[self.states[entity]]
+
+    def items(self):
+        """Yield `(entity, state id)` of all tracked entities, with `capacity` of all the entity ids."""
+        state_ids = self.state_ids
+        if isinstance(self.states, dict):
+            for entity, code in self.states.items():
+                yield entity, state_ids[code]
+        else:
+            for entity, code in enumerate(self.states):
+                yield entity, state_ids[code]
+
+
+def events_from_csv(lines, entity_column='entity', trigger_column='trigger', entity_type=None):
+    """Yield `(entity, trigger)` events from CSV lines with a header, converting entities with `entity_type`."""
+    for row in csv.DictReader(lines):
+        entity = row[entity_column]
+        yield (entity_type(entity) if entity_type else entity), row[trigger_column]
+
+
+def events_from_jsonl(lines, entity_key='entity', trigger_key='trigger'):
+    """Yield `(entity, trigger)` events from JSON lines."""
+    for line in lines:
+        if line.strip():
+            event = json.loads(line)
+            yield event[entity_key], event[trigger_key]
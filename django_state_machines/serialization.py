@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""
+Serialized form of compiled machines, so processes can load them instead of running
+`add_transitions`. A machine is dumped to a dict of plain data:
+
+    {
+        'version': 1,
+        'handler': 'app.machines.ProductHandler',
+        'field_name': 'state', 'field_type': 'str', 'state_choices': [...],
+        'states': [[name, id, value], ...],
+        'transitions': [{'trigger': 'accept', 'start': 'new', 'end': 'accepted',
+                         'before': [...], 'after': [...], 'conditions': [...], 'timeout': 1800.0}, ...],
+    }
+
+Hooks and callable conditions are stored as references, handler methods by name and
+functions by dotted path, `Q` conditions as their tree, timeouts in seconds (only on
+transitions that have them). The dict is written as JSON or, faster to load, pickled.
+Load pickles only from trusted sources.
+
+Lambdas, closures, `functools.partial` objects and `Q` values that have no plain data form
+(other than `F()`, dates, times, decimals and UUIDs) are stored as `{'opaque': description}`.
+They still take part in fingerprints, but machines with them can't be loaded and are
+compiled from code by `preload_machines`.
+"""
+
+from __future__ import unicode_literals
+
+from django.db.models import F, Q
+
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from importlib import import_module
+
+from .data_classes import HandlerMethod, Transition
+from .hooks import Hook
+from .logic import StateCache, _compile_lock
+from .state_map import StateMachineMap
+
+import functools
+import hashlib
+import json
+import pickle
+import six
+import uuid
+
+
+FORMAT_VERSION = 1
+FORMATS = ('json', 'pickle')
+
+
+def dotted_path(obj):
+    """Return importable dotted path of a module level function or class."""
+    name = getattr(obj, '__qualname__', getattr(obj, '__name__', None))
+    if name is None or '<' in name:
+        raise ValueError("{0!r} is not importable and can't be serialized.".format(obj))
+    return '{0}.{1}'.format(obj.__module__, name)
+
+
+def import_path(path):
+    """Import object from dotted path, attributes of classes included."""
+    parts = path.split('.')
+    for index in range(len(parts) - 1, 0, -1):
+        try:
+            obj = import_module('.'.join(parts[:index]))
+        except ImportError:
+            continue
+        for part in parts[index:]:
+            obj = getattr(obj, part)
+        return obj
+    raise ImportError("Can't import '{0}'.".format(path))
+
+
+def describe(obj):
+    """
+    Return description of an object that can't be stored by reference, stable between
+    processes: dotted name, with hash of the bytecode for functions, or the type name.
+    """
+    if isinstance(obj, functools.partial):
+        return {
+            'partial': describe(obj.func),
+            'args': [_value_to_data(arg) for arg in obj.args],
+            'keywords': dict((name, _value_to_data(value)) for name, value in obj.keywords.items()),
+        }
+    name = getattr(obj, '__qualname__', getattr(obj, '__name__', None))
+    if name is None:
+        return 'instance of {0}.{1}'.format(obj.__class__.__module__, obj.__class__.__name__)
+    description = '{0}.{1}'.format(getattr(obj, '__module__', None), name)
+    code = getattr(obj, '__code__', None)
+    if code is not None:
+        description += ':' + hashlib.sha256(code.co_code).hexdigest()[:12]
+    return description
+
+
+def _reference(function, handler):
+    if isinstance(function, Hook):
+        return {
+            'hook': _reference(function.function, handler),
+            'policy': function.policy, 'using': function.using, 'batch': function.batch,
+        }
+    if isinstance(function, HandlerMethod) or getattr(function, '__self__', None) is handler:
+        return {'method': function.__name__}
+    try:
+        return {'function': dotted_path(function)}
+    except ValueError:
+        return {'opaque': describe(function)}
+
+
+def _refuse(reference):
+    raise ValueError("{0} is not importable, the machine can't be loaded, compile it from code.".format(
+        reference['opaque']))
+
+
+def _resolve(reference, handler):
+    if 'hook' in reference:
+        return Hook(_resolve(reference['hook'], handler), reference['policy'], reference['using'], reference['batch'])
+    if 'method' in reference:
+        return getattr(handler, reference['method'])
+    if 'opaque' in reference:
+        _refuse(reference)
+    return import_path(reference['function'])
+
+
+VALUE_TYPES = (
+    ('datetime', datetime, datetime.isoformat, datetime.fromisoformat),
+    ('date', date, date.isoformat, date.fromisoformat),
+    ('time', time, time.isoformat, time.fromisoformat),
+    ('timedelta', timedelta, timedelta.total_seconds, lambda seconds: timedelta(seconds=seconds)),
+    ('decimal', Decimal, str, Decimal),
+    ('uuid', uuid.UUID, str, uuid.UUID),
+)
+
+
+def _value_to_data(value):
+    """Return plain data of a `Q` value, `{'opaque': description}` when it has none."""
+    if value is None or isinstance(value, (bool, float) + six.integer_types + six.string_types):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_value_to_data(item) for item in value]
+    if isinstance(value, F):
+        return {'f': value.name}
+    for name, value_type, to_data, from_data in VALUE_TYPES:
+        if isinstance(value, value_type):
+            return {'type': name, 'value': to_data(value)}
+    return {'opaque': describe(value)}
+
+
+def _value_from_data(data):
+    if isinstance(data, list):
+        return [_value_from_data(item) for item in data]
+    if not isinstance(data, dict):
+        return data
+    if 'f' in data:
+        return F(data['f'])
+    if 'opaque' in data:
+        _refuse(data)
+    for name, value_type, to_data, from_data in VALUE_TYPES:
+        if data['type'] == name:
+            return from_data(data['value'])
+    raise ValueError("Unknown value type: {0}.".format(data['type']))
+
+
+def _q_to_data(query):
+    children = []
+    for child in query.children:
+        if isinstance(child, Q):
+            children.append(_q_to_data(child))
+        elif isinstance(child, tuple):
+            children.append([child[0], _value_to_data(child[1])])
+        else:
+            children.append({'opaque': describe(child)})
+    return {'connector': query.connector, 'negated': query.negated, 'children': children}
+
+
+def _q_from_data(data):
+    children = []
+    for child in data['children']:
+        if isinstance(child, dict):
+            if 'opaque' in child:
+                _refuse(child)
+            children.append(_q_from_data(child))
+        else:
+            children.append((child[0], _value_from_data(child[1])))
+    return Q(*children, _connector=data['connector'], _negated=data['negated'])
+
+
+def is_loadable(data):
+    """Check that machine `data` has no opaque references, so `load_machine` can build it."""
+    if isinstance(data, dict):
+        return 'opaque' not in data and all(is_loadable(value) for value in data.values())
+    if isinstance(data, list):
+        return all(is_loadable(item) for item in data)
+    return True
+
+
+def dump_machine(handler):
+    """Return plain data of the compiled machine of the `handler`."""
+    machine = handler.machine
+    builder = machine.bound_class.handler
+    transitions = []
+    for trigger_name in sorted(machine.transitions):
+        for transition in machine.transitions[trigger_name]:
+            transitions.append({
+                'trigger': trigger_name,
+                'start': None if transition.start_state is None else transition.start_state.name,
+                'end': transition.end_state.name,
+                'before': [_reference(function, builder) for function in transition.before],
+                'after': [_reference(function, builder) for function in transition.after],
+                'conditions': [
+                    {'q': _q_to_data(condition)} if isinstance(condition, Q) else _reference(condition, builder)
+                    for condition in transition.conditions],
+            })
+            if transition.timeout is not None:
+                transitions[-1]['timeout'] = transition.timeout.total_seconds()
+    return {
+        'version': FORMAT_VERSION,
+        'handler': dotted_path(handler.__class__),
+        'field_name': handler.field_name,
+        'field_type': handler.field_type,
+        'state_choices': [list(row) for row in handler.state_choices],
+        'states': [[state.name, state.id, state.value] for state in machine.states],
+        'transitions': transitions,
+    }
+
+
+def fingerprint(data):
+    """Return sha256 hex digest of the canonical JSON of machine `data`."""
+    data = dict((key, value) for key, value in data.items() if key not in ('fingerprint', 'model'))
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def load_machine(data, handler_class=None):
+    """
+    Build the compiled machine from `data` and put it in the cache of the handler class,
+    handlers created afterwards for the same field configuration use it and never run
+    `add_transitions`. Handler triggers are patched like at compilation, hook references
+    are resolved. If the machine is already compiled in this process it's returned as is.
+    `ValueError` is raised for machines with opaque references, see `is_loadable`.
+    """
+    if data.get('version') != FORMAT_VERSION:
+        raise ValueError("Unsupported machine format version: {0}.".format(data.get('version')))
+    handler_class = handler_class or import_path(data['handler'])
+    handler = handler_class.__new__(handler_class)
+    handler._setup(data['field_name'], data['field_type'], [tuple(row) for row in data['state_choices']])
+    key = handler.machine_key
+    with _compile_lock:
+        machine = handler_class._compiled_machines.get(key)
+        if machine is not None:
+            return machine
+        states_map = StateMachineMap()
+        states = {}
+        for name, state_id, value in data['states']:
+            states[name] = StateCache.get_state(handler.handler_key, name, id=state_id, value=value)
+            states_map.add_state(states[name])
+        for item in data['transitions']:
+            handler._patch_trigger(getattr(handler_class, item['trigger']))
+            states_map.add_transition(Transition(
+                getattr(handler_class, '_' + item['trigger']),
+                states[item['start']] if item['start'] is not None else None,
+                states[item['end']],
+                before=handler._handler_methods([_resolve(reference, handler) for reference in item['before']]),
+                after=handler._handler_methods([_resolve(reference, handler) for reference in item['after']]),
+                conditions=[
+                    _q_from_data(reference['q']) if 'q' in reference else _resolve(reference, handler)
+                    for reference in item['conditions']],
+                timeout=timedelta(seconds=item['timeout']) if 'timeout' in item else None,
+            ))
+        machine = handler_class._compiled_machines[key] = handler._install(states_map)
+    return machine
+
+
+def compile_from_code(handler):
+    """
+    Return a new handler of the `handler` field with its machine compiled by `add_transitions`,
+    also when the cached machine was loaded from a dump. The class cache is left as is.
+    """
+    compiled = handler.__class__(handler.field_name, handler.field_type, state_choices=handler.state_choices)
+    compiled._compile()
+    return compiled
+
+
+def dump_machines(fields=None):
+    """
+    Return a document with machines of all state machine fields of installed models,
+    or of `(model, field)` pairs in `fields`, each with its model label and fingerprint.
+    Machines are compiled from code, never taken from a loaded dump.
+    """
+    from .checks import state_fields
+    machines = []
+    for model, field in (fields if fields is not None else state_fields()):
+        data = dump_machine(compile_from_code(field.handler))
+        data['model'] = '{0}.{1}'.format(model._meta.label, field.name)
+        data['fingerprint'] = fingerprint(data)
+        machines.append(data)
+    return {'version': FORMAT_VERSION, 'machines': machines}
+
+
+def dumps(document, format='json'):
+    if format == 'pickle':
+        return pickle.dumps(document, pickle.HIGHEST_PROTOCOL)
+    return json.dumps(document, sort_keys=True, indent=2).encode('utf-8')
+
+
+def loads(content, format='json'):
+    if format == 'pickle':
+        return pickle.loads(content)
+    return json.loads(content.decode('utf-8'))
+
+
+def verify_machines(document):
+    """
+    Return model labels of the machines in `document` whose fingerprints differ from the code,
+    machines are compiled from code for it, also after `preload_machines` loaded the document.
+    """
+    current = dict((data['model'], data['fingerprint']) for data in dump_machines()['machines'])
+    return [data['model'] for data in document['machines'] if current.get(data['model']) != data['fingerprint']]
+
+
+def preload_machines(document=None):
+    """
+    Load machines of the `document` and compile the remaining machines of all state
+    machine fields (machines that can't be loaded included), then return the number of fields.
+    Call it before workers are forked (e.g. with gunicorn `preload_app`) so they share the
+    compiled machines.
+    """
+    from .checks import state_fields
+    if document is not None:
+        for data in document['machines']:
+            if is_loadable(data):
+                load_machine(data)
+    fields = list(state_fields())
+    for model, field in fields:
+        field.handler
+    return len(fields)
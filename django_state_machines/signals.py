@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Transition events for code that doesn't own the handlers:
+
+    @post_transition.connect(handler=ProductHandler, trigger='accept')
+    def notify(sender, instance, field_name, trigger, source, target, **kwargs):
+        ...
+
+`pre_transition` receivers are called by `process` once the transition passed its guards,
+before `before` functions, raising aborts the transition. `post_transition` receivers are
+called after `after` functions. Receivers get the hook kwargs and can be filtered by handler
+class (subclasses included), trigger, source and target states (names or ids, one or a list).
+
+Receivers matching a transition are looked up once per machine, transition and source state
+and cached, processes check only `enabled` when no receivers are connected. `post_transition`
+receivers connected with `bulk=True` get lists of moved instances (`instances` instead of
+`instance`): one list per start state of queryset transitions (per batch and start state with
+hooks), one per chunk of the batch runner and, within `bulk_transitions` block, one per
+transition and source of all transitions processed in it, otherwise a list of one instance.
+"""
+
+from __future__ import unicode_literals
+
+from contextlib import contextmanager
+
+from .helpers import make_list
+
+import threading
+
+
+_local = threading.local()
+
+
+class Receiver(object):
+    __slots__ = ('function', 'handler', 'triggers', 'sources', 'targets', 'bulk')
+
+    def __init__(self, function, handler=None, trigger=None, source=None, target=None, bulk=False):
+        self.function = function
+        self.handler = tuple(make_list(handler)) if handler is not None else None
+        self.triggers = frozenset(make_list(trigger)) if trigger is not None else None
+        self.sources = frozenset(make_list(source)) if source is not None else None
+        self.targets = frozenset(make_list(target)) if target is not None else None
+        self.bulk = bulk
+
+    @staticmethod
+    def _state_matches(states, state):
+        return states is None or state is not None and (state.name in states or state.id in states)
+
+    def matches(self, handler_class, transition, source):
+        return (
+            (self.handler is None or issubclass(handler_class, self.handler)) and
+            (self.triggers is None or transition.trigger.__name__ in self.triggers) and
+            self._state_matches(self.sources, source) and
+            self._state_matches(self.targets, transition.end_state))
+
+
+class TransitionSignal(object):
+    """Transition event with receivers filtered by handler, trigger and states, see module documentation."""
+    def __init__(self, name, allows_bulk=False):
+        self.name = name
+        self.allows_bulk = allows_bulk
+        self.receivers = []
+        self.enabled = False
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def connect(self, receiver=None, handler=None, trigger=None, source=None, target=None, bulk=False):
+        """Connect `receiver` for the transitions matching the filters, without it return a decorator."""
+        if receiver is None:
+            def decorator(function):
+                self.connect(function, handler, trigger, source, target, bulk)
+                return function
+            return decorator
+        if bulk and not self.allows_bulk:
+            raise ValueError("{0} has no bulk receivers.".format(self.name))
+        with self._lock:
+            self.receivers = self.receivers + [Receiver(receiver, handler, trigger, source, target, bulk)]
+            self._changed()
+        return receiver
+
+    def disconnect(self, receiver):
+        """Disconnect all connections of `receiver`, return whether there were any."""
+        with self._lock:
+            receivers = [item for item in self.receivers if item.function != receiver]
+            disconnected = len(receivers) != len(self.receivers)
+            self.receivers = receivers
+            self._changed()
+        return disconnected
+
+    def _changed(self):
+        self._cache = {}
+        self.enabled = bool(self.receivers)
+
+    def lookup(self, machine, transition, source_id):
+        """
+        Return `(sender, receivers, bulk receivers)` of the `transition` of the `machine` from
+        `source_id` state, or an empty tuple when there are none.
+        """
+        key = (machine, transition, source_id)
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        sender = machine.bound_class.handler.__class__
+        source = machine.states_by_id.get(source_id)
+        matching = [item for item in self.receivers if item.matches(sender, transition, source)]
+        result = ()
+        if matching:
+            result = (
+                sender,
+                tuple(item.function for item in matching if not item.bulk),
+                tuple(item.function for item in matching if item.bulk))
+        self._cache[key] = result
+        return result
+
+    def send(self, handler, transition, source_id, kwargs):
+        """Call receivers of the `transition` of the `handler` instance from `source_id` state."""
+        receivers = self.lookup(handler.machine, transition, source_id)
+        if receivers:
+            self._send(receivers, handler, transition, source_id, [handler.instance], kwargs)
+
+    def send_bulk(self, handler, transition, source_id, instances, kwargs):
+        """
+        Call receivers of the `transition` of `instances` moved together from `source_id` state,
+        `handler` is the handler of any of them.
+        """
+        receivers = self.lookup(handler.machine, transition, source_id)
+        if receivers and instances:
+            self._send(receivers, handler, transition, source_id, instances, kwargs)
+
+    def _send(self, receivers, handler, transition, source_id, instances, kwargs):
+        sender, functions, bulk_functions = receivers
+        kwargs = dict(kwargs)
+        kwargs.pop('instance', None)
+        event = dict(
+            kwargs, sender=sender, field_name=handler.field_name, trigger=transition.trigger.__name__,
+            source=source_id, target=transition.end_state.id)
+        for function in functions:
+            for instance in instances:
+                function(instance=instance, **event)
+        if bulk_functions:
+            buffer = getattr(_local, 'buffer', None)
+            if buffer is not None:
+                key = (bulk_functions, handler.machine, transition, source_id)
+                if key not in buffer:
+                    buffer[key] = (event, [])
+                buffer[key][1].extend(instances)
+                return
+            for function in bulk_functions:
+                function(instances=list(instances), **event)
+
+
+@contextmanager
+def bulk_transitions():
+    """
+    Collect instances of all transitions processed in the block and call bulk receivers
+    once per transition and source state when it exits without error (the outermost block
+    of the nested ones). Receivers of single instances are called right away.
+    """
+    if getattr(_local, 'buffer', None) is not None:
+        yield
+        return
+    _local.buffer = {}
+    try:
+        yield
+        buffer = _local.buffer
+    finally:
+        _local.buffer = None
+    for (bulk_functions, machine, transition, source_id), (event, instances) in buffer.items():
+        for function in bulk_functions:
+            function(instances=instances, **event)
+
+
+pre_transition = TransitionSignal('pre_transition')
+post_transition = TransitionSignal('post_transition', allows_bulk=True)
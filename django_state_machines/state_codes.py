@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Conversion of existing varchar state columns to the `state_codes` storage. A column can't
+be cast in place, the codes are copied to a new smallint column, which replaces the old one:
+
+    CODES = {'accepted': 1, 'not_accepted': 2, 'rejected': 3}
+
+    class Migration(migrations.Migration):
+        atomic = False
+
+        operations = [
+            migrations.AddField('product', 'state_code', models.SmallIntegerField(null=True)),
+            encode_states('fields_tests', 'product', 'state', 'state_code', CODES),
+            migrations.RemoveField('product', 'state'),
+            migrations.RenameField('product', 'state_code', 'state'),
+            migrations.AlterField('product', 'state', StateMachineCharField(
+                handler=ProductHandler, default='not_accepted', state_codes=CODES)),
+        ]
+
+With `atomic = False` every chunk is committed on its own, so big tables aren't rewritten
+in one long transaction. The operation is reversible, codes are copied back as state ids.
+"""
+
+from __future__ import unicode_literals
+
+from django.db import migrations, transaction
+from django.db.models import Case, F, Value, When
+
+
+def convert_states(model, source_field, target_field, mapping, chunk_size=10000, using=None):
+    """
+    Copy values of `source_field` to `target_field` of all `model` rows translated with
+    `mapping`, values without translation are left as they are in the target. Rows are
+    updated in primary key ranges of `chunk_size` rows, one UPDATE per chunk, each in its
+    own transaction. Returns the number of updated rows.
+    """
+    manager = model._base_manager.db_manager(using)
+    target = model._meta.get_field(target_field)
+    translated = Case(
+        *[When(**{source_field: key, 'then': Value(value, output_field=target)}) for key, value in mapping.items()],
+        default=F(target_field), output_field=target)
+    updated = 0
+    last_pk = None
+    while True:
+        remaining = manager.all() if last_pk is None else manager.filter(pk__gt=last_pk)
+        bounds = list(remaining.order_by('pk').values_list('pk', flat=True)[chunk_size - 1:chunk_size])
+        chunk = remaining.filter(pk__lte=bounds[0]) if bounds else remaining
+        with transaction.atomic(using=manager.db):
+            updated += chunk.update(**{target_field: translated})
+        if not bounds:
+            return updated
+        last_pk = bounds[0]
+
+
+def encode_states(app_label, model_name, field_name, code_field_name, codes, chunk_size=10000):
+    """
+    Return a `RunPython` operation copying state ids of `field_name` as `codes` to `code_field_name`,
+    reversed it copies the codes back as state ids, see `convert_states`.
+    """
+    states = dict((code, state_id) for state_id, code in codes.items())
+
+    def forwards(apps, schema_editor):
+        model = apps.get_model(app_label, model_name)
+        convert_states(model, field_name, code_field_name, codes, chunk_size, schema_editor.connection.alias)
+
+    def backwards(apps, schema_editor):
+        model = apps.get_model(app_label, model_name)
+        convert_states(model, code_field_name, field_name, states, chunk_size, schema_editor.connection.alias)
+
+    return migrations.RunPython(forwards, backwards, elidable=False)
@@ -2,73 +2,96 @@
 
 from __future__ import unicode_literals
 
-from .data_classes import State
+from .data_classes import FrozenObject
 from .exceptions import DuplicateTransitionTriggerError, NoSuchStateError
 
 from six import string_types
 
 
-class StateMapNode(object):
+class StateMapNode(FrozenObject):
     """
-    Atomic node class for `StateMachineMapDict` it holds informations about single state and
-    where you can proceed: to which states and with which transitions and from which states and
-    with which transitions you can get to this state.
+    Atomic node class for `StateMachineMap.machine_map` it holds informations about single state
+    and where you can proceed: to which states and with which transitions and from which states
+    and with which transitions you can get to this state. Nodes are immutable, adding an edge
+    returns a new node.
     """
-    def __init__(self, state):
-        self.state = state
-        self.allowed_transitions = []
-        self.allowed_states = []
-        self.from_transitions = []
-        self.from_states = []
+    __slots__ = ('state', 'allowed_transitions', 'allowed_states', 'from_transitions', 'from_states')
+
+    def __init__(self, state, allowed_transitions=(), allowed_states=(), from_transitions=(), from_states=()):
+        self._set(
+            state=state,
+            allowed_transitions=tuple(allowed_transitions),
+            allowed_states=tuple(allowed_states),
+            from_transitions=tuple(from_transitions),
+            from_states=tuple(from_states),
+        )
+
+    def add_allowed_transition(self, transition):
+        return StateMapNode(
+            self.state,
+            self.allowed_transitions + (transition,), self.allowed_states + (transition.end_state,),
+            self.from_transitions, self.from_states)
+
+    def add_from_transition(self, transition):
+        from_states = self.from_states if transition.start_state is None else \
+            self.from_states + (transition.start_state,)
+        return StateMapNode(
+            self.state,
+            self.allowed_transitions, self.allowed_states,
+            self.from_transitions + (transition,), from_states)
+
+    def __eq__(self, other):
+        if isinstance(other, StateMapNode):
+            return (self.state, self.allowed_transitions, self.from_transitions) == \
+                (other.state, other.allowed_transitions, other.from_transitions)
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        return hash((self.state, self.allowed_transitions, self.from_transitions))
+
+    def __reduce__(self):
+        return self.__class__, (
+            self.state, self.allowed_transitions, self.allowed_states, self.from_transitions, self.from_states)
 
     def __repr__(self):
         return "<Node {0}: allowed_states={1}, allowed_transitions={2}, from_states={3}, from_transitions={4}>".format(
             self.state, self.allowed_states, self.allowed_transitions, self.from_states, self.from_transitions)
 
 
-class StateMachineMapDict(dict):
-    """ Dictionary that holds objects of `StateMapNode`."""
-    def alter_key(self, key):
-        if isinstance(key, State):
-            return key.name
-        return key
-
-    def __getitem__(self, key):
-        return super(StateMachineMapDict, self).__getitem__(self.alter_key(key))
-
-    def __contains__(self, key):
-        return super(StateMachineMapDict, self).__contains__(self.alter_key(key))
-
-
 class StateMachineMap(object):
     """
     Instances of this class have two attributes:
-     - Dictionary transitions, which serves as a fast hash-map for getting transitions.
-     - Dictionary machine_map , which is a representation of a `StateMachineMapDict`.
+     - Dictionary transitions, which maps trigger names to lists of their transitions, one
+       for every start state (`None` start state stands for the '*' wildcard).
+     - Dictionary machine_map, which maps states to their `StateMapNode`. `State` hashes
+       and compares like its name, so nodes can be looked up with states or state names.
     Purpose of this class is to hold whole structure of state machine and to give
     nice API to for example: get allowed states for some state value.
     """
     def __init__(self):
         self.transitions = {}
-        self.machine_map = StateMachineMapDict()
+        self.machine_map = {}
 
     def _add_states(self, states):
         for state in states:
-            self.machine_map[state.name] = StateMapNode(state)
+            self.machine_map[state] = StateMapNode(state)
 
     def _update_states(self, transition):
         transition_start = transition.start_state
-        self.machine_map[transition_start.name].allowed_transitions.append(transition)
-        self.machine_map[transition_start.name].allowed_states.append(transition.end_state)
+        if transition_start is not None:
+            self.machine_map[transition_start] = self.machine_map[transition_start].add_allowed_transition(transition)
         transition_end = transition.end_state
-        self.machine_map[transition_end.name].from_transitions.append(transition)
-        self.machine_map[transition_end.name].from_states.append(transition.start_state)
+        self.machine_map[transition_end] = self.machine_map[transition_end].add_from_transition(transition)
 
     def _map_transition(self, transition):
         states = []
-        if transition.start_state not in self.machine_map.keys():
+        if transition.start_state is not None and transition.start_state not in self.machine_map:
             states.append(transition.start_state)
-        if transition.end_state not in self.machine_map.keys():
+        if transition.end_state not in self.machine_map:
             states.append(transition.end_state)
         self._add_states(states)
         self._update_states(transition)
@@ -76,15 +99,18 @@ class StateMachineMap(object):
     def add_transition(self, transition):
         callback_name = transition.trigger if \
             isinstance(transition.trigger, string_types) else transition.trigger.__name__
-        if callback_name in self.transitions.keys():
-            raise DuplicateTransitionTriggerError(
-                "Trigger with name '{0}' already exists.".format(callback_name))
-
-        self.transitions[callback_name] = transition
+        trigger_transitions = self.transitions.setdefault(callback_name, [])
+        for trigger_transition in trigger_transitions:
+            if trigger_transition.start_state == transition.start_state:
+                raise DuplicateTransitionTriggerError(
+                    "Trigger with name '{0}' already exists for '{1}' state.".format(
+                        callback_name, transition.start_state or '*'))
+
+        trigger_transitions.append(transition)
         self._map_transition(transition)
 
     def add_state(self, state):
-        if state not in self.machine_map.keys():
+        if state not in self.machine_map:
             self._add_states([state])
 
     def get_state_info(self, state):
@@ -98,3 +124,96 @@ class StateMachineMap(object):
 
     def get_states_info(self):
         return self.machine_map.values()
+
+
+class CompiledStateMachine(object):
+    """
+    Frozen, indexed form of a `StateMachineMap`. It is built once per handler class and
+    field configuration and shared by every handler and bound handler using it:
+     - `states` is an array-backed state table, `state_indexes` maps state names to
+       positions in it,
+     - `states_by_id` maps field values to states,
+     - `transitions` maps trigger names to tuples of their transitions,
+     - `index` maps `(state_id, trigger_name)` to a `Transition`, wildcard transitions
+       are expanded to every state without explicit transition for the trigger,
+     - `trigger_index` is the same index grouped by trigger names: `{trigger_name: {state_id: Transition}}`,
+     - `state_triggers` and `state_targets` map state ids to the trigger names that can
+       be fired and states that can be reached from them,
+     - `choices` are precomputed field choices,
+     - `timeouts` maps state ids to the transitions with `timeout` leaving them, `reschedules`
+       are the transitions entering or leaving those states, after which pending timeouts
+       of the instance have to be replaced (all wildcard transitions, if there are any timeouts),
+     - `analysis` is the `MachineAnalysis` of the machine graph, built on first use,
+     - `guards` caches split conditions of transitions per model, see `conditions.check_conditions`.
+    The compiled machine and its `states_map` should be treated as read-only.
+    """
+    def __init__(self, states_map, bound_class=None):
+        self.states_map = states_map
+        self.bound_class = bound_class
+        self.states = tuple(node.state for node in states_map.get_states_info())
+        self.state_indexes = dict((state.name, index) for index, state in enumerate(self.states))
+        self.states_by_id = dict((state.id, state) for state in self.states)
+        self.transitions = dict(
+            (trigger_name, tuple(transitions)) for trigger_name, transitions in states_map.transitions.items())
+        self.index = self._build_index()
+        self.trigger_index = dict((trigger_name, {}) for trigger_name in self.transitions)
+        for (state_id, trigger_name), transition in self.index.items():
+            self.trigger_index[trigger_name][state_id] = transition
+        self.state_triggers, self.state_targets = self._build_state_lookups()
+        self.timeouts, self.reschedules = self._build_timeouts()
+        self.choices = tuple((state.id, state.value) for state in self.states)
+        self.guards = {}
+
+    def _build_index(self):
+        index = {}
+        wildcards = []
+        for trigger_name, transitions in self.transitions.items():
+            for transition in transitions:
+                if transition.start_state is None:
+                    wildcards.append((trigger_name, transition))
+                else:
+                    index[(transition.start_state.id, trigger_name)] = transition
+        for trigger_name, transition in wildcards:
+            for state in self.states:
+                index.setdefault((state.id, trigger_name), transition)
+        return index
+
+    def _build_state_lookups(self):
+        state_triggers = dict((state.id, []) for state in self.states)
+        state_targets = dict((state.id, []) for state in self.states)
+        for (state_id, trigger_name), transition in self.index.items():
+            state_triggers[state_id].append(trigger_name)
+            if transition.end_state not in state_targets[state_id]:
+                state_targets[state_id].append(transition.end_state)
+        return (
+            dict((state_id, tuple(sorted(triggers))) for state_id, triggers in state_triggers.items()),
+            dict((state_id, tuple(targets)) for state_id, targets in state_targets.items()),
+        )
+
+    def _build_timeouts(self):
+        timeouts = {}
+        for (state_id, trigger_name), transition in sorted(self.index.items(), key=lambda item: item[0][1]):
+            if transition.timeout is not None:
+                timeouts.setdefault(state_id, []).append(transition)
+        reschedules = frozenset(
+            transition for transition in self.index.values()
+            if transition.start_state is None and timeouts or
+            transition.start_state is not None and transition.start_state.id in timeouts or
+            transition.end_state.id in timeouts)
+        return dict((state_id, tuple(transitions)) for state_id, transitions in timeouts.items()), reschedules
+
+    def get_transition(self, state_id, trigger_name):
+        """Return transition fired by `trigger_name` from the state with `state_id` or None."""
+        return self.index.get((state_id, trigger_name))
+
+    @property
+    def analysis(self):
+        analysis = self.__dict__.get('_analysis')
+        if analysis is None:
+            from .analysis import MachineAnalysis
+            analysis = self._analysis = MachineAnalysis(self)
+        return analysis
+
+    def __repr__(self):
+        return "<{0}: {1} states, {2} transitions>".format(
+            self.__class__.__name__, len(self.states), len(self.index))
@@ -0,0 +1,504 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite of the state machine handlers, run it with:
+
+    $ python -m django_state_machines.tests.benchmarks --json results.json
+
+Sections can be chosen with `--only`, database benchmarks run on in-memory SQLite.
+Results are printed as tables and with `--json` written as JSON, together with the
+versions they were measured on, so releases can be compared. Pass `--min-process-ops`
+to exit with an error when trigger throughput drops.
+"""
+
+from __future__ import print_function, unicode_literals
+
+from ..data_classes import StateChoices
+from ..logic import BaseStateHandler
+
+import argparse
+import copy
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+import tracemalloc
+
+
+MACHINE_SIZES = (10, 100, 1000)
+BULK_SIZES = (10000, 100000, 1000000)
+BULK_HOOKS_MAX_ROWS = 100000
+STATE_CACHE_HANDLERS = (10, 100, 1000)
+STARTUP_MODEL_COUNTS = (10, 100, 500)
+REPLAY_EVENTS = 1000000
+REPLAY_ENTITIES = 100000
+
+STARTUP_SETTINGS = """
+SECRET_KEY = '-'
+INSTALLED_APPS = ['django.contrib.contenttypes', 'django_state_machines', 'startup_app']
+DATABASES = {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}}
+DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
+"""
+
+STARTUP_MODEL = """
+class Handler{index}(BaseStateHandler):
+{triggers}
+    def add_transitions(self):
+{transitions}
+
+
+class Model{index}(models.Model):
+    state = StateMachineCharField(max_length=20, handler=Handler{index}, default='s0')
+"""
+
+STARTUP_SCRIPT = """
+import json, timeit
+started = timeit.default_timer()
+import django
+django.setup()
+setup = timeit.default_timer() - started
+from django.apps import apps
+from django.core.management import call_command
+started = timeit.default_timer()
+call_command('check', verbosity=0)
+check = timeit.default_timer() - started
+started = timeit.default_timer()
+for model in apps.get_app_config('startup_app').get_models():
+    model._meta.get_field('state').handler
+print(json.dumps({'setup': setup, 'check': check, 'first_use': timeit.default_timer() - started}))
+"""
+
+
+class Row(object):
+    """Minimal stand-in for a model instance."""
+    def __init__(self, state):
+        self.state = state
+
+
+def _make_trigger(name):
+    def trigger(self, **kwargs):
+        pass
+    trigger.__name__ = str(name)
+    return trigger
+
+
+def make_handler_class(states_count):
+    """
+    Build a handler class with a linear machine of `states_count` states:
+    s0 -> s1 -> ... -> sN, each step with its own trigger.
+    """
+    triggers = ['t{0}'.format(i) for i in range(states_count - 1)]
+
+    def add_transitions(self):
+        for i, trigger in enumerate(triggers):
+            self.add_transition(trigger, 's{0}'.format(i), 's{0}'.format(i + 1))
+
+    attrs = dict((trigger, _make_trigger(trigger)) for trigger in triggers)
+    attrs['add_transitions'] = add_transitions
+    return type(str('Handler{0}'.format(states_count)), (BaseStateHandler,), attrs)
+
+
+def make_state_choices(states_count):
+    """State choices frozen like fields freeze them."""
+    return StateChoices(('s{0}'.format(i), 'S{0}'.format(i), 's{0}'.format(i)) for i in range(states_count))
+
+
+def make_handler(states_count, field_name='state'):
+    """Build a handler of a new `make_handler_class` class."""
+    return make_handler_class(states_count)(field_name, 'str', state_choices=make_state_choices(states_count))
+
+
+def setup_django():
+    """Configure Django with in-memory SQLite, unless it's already configured."""
+    import django
+    from django.conf import settings
+    if not settings.configured:
+        settings.configure(
+            INSTALLED_APPS=['django.contrib.contenttypes', 'django_state_machines'],
+            DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+            DEFAULT_AUTO_FIELD='django.db.models.AutoField',
+        )
+        django.setup()
+
+
+def make_model(handler_class, name):
+    """Create a model with `state` field of the `handler_class` and its table."""
+    from django.db import connection, models
+    from ..fields import StateMachineCharField
+    from ..managers import StateMachineManager
+
+    attrs = {
+        '__module__': __name__,
+        'state': StateMachineCharField(max_length=20, handler=handler_class, default='s0'),
+        'objects': StateMachineManager(),
+        'Meta': type(str('Meta'), (object,), {'app_label': 'django_state_machines'}),
+    }
+    model = type(str(name), (models.Model,), attrs)
+    with connection.schema_editor() as schema_editor:
+        schema_editor.create_model(model)
+    return model
+
+
+def drop_model(model):
+    from django.apps import apps
+    from django.db import connection
+    with connection.schema_editor() as schema_editor:
+        schema_editor.delete_model(model)
+    del apps.all_models[model._meta.app_label][model._meta.model_name]
+    apps.clear_cache()
+
+
+def bench_construction(states_count, number=1000):
+    """
+    Cost of compiling a machine (first handler of a class), of creating a handler of
+    an already compiled class and of binding it to an instance. Returns seconds.
+    """
+    state_choices = make_state_choices(states_count)
+    compile_number = max(number // states_count, 3)
+    handler_classes = [make_handler_class(states_count) for _ in range(compile_number)]
+    compiled = timeit.timeit(
+        lambda: handler_classes.pop()('state', 'str', state_choices=state_choices), number=compile_number)
+    handler_class = make_handler_class(states_count)
+    handler = handler_class('state', 'str', state_choices=state_choices)
+    constructed = timeit.timeit(lambda: handler_class('state', 'str', state_choices=state_choices), number=number)
+    row = Row('s0')
+    bound = timeit.timeit(lambda: handler.bind(row), number=number)
+    return compiled / compile_number, constructed / number, bound / number
+
+
+def bench_handler_property(number=100000):
+    """
+    Cost of `instance.state_handler` of a model instance, on the first access, which binds
+    the handler, and on the next ones, which read it from the instance. Returns seconds.
+    """
+    setup_django()
+    model = make_model(make_handler_class(10), 'PropertyBenchmark')
+    try:
+        instances = [model() for _ in range(number)]
+        first = timeit.timeit(lambda: [instance.state_handler for instance in instances], number=1)
+        cached = timeit.timeit(lambda: [instance.state_handler for instance in instances], number=1)
+    finally:
+        drop_model(model)
+    return first / number, cached / number
+
+
+def bench_bulk_transition(rows_count):
+    """
+    Throughput of the queryset transition of `rows_count` rows on SQLite, with a single
+    UPDATE and, up to `BULK_HOOKS_MAX_ROWS` rows, with hooks. Returns seconds, hooks
+    seconds is `None` for bigger tables.
+    """
+    from django.db import transaction
+
+    setup_django()
+    model = make_model(make_handler_class(3), 'BulkBenchmark')
+    try:
+        with transaction.atomic():
+            model.objects.bulk_create((model() for _ in range(rows_count)), batch_size=10000)
+        started = timeit.default_timer()
+        moved = model.objects.transition('state', 't0')
+        updated = timeit.default_timer() - started
+        assert moved == rows_count
+        hooks = None
+        if rows_count <= BULK_HOOKS_MAX_ROWS:
+            started = timeit.default_timer()
+            moved = model.objects.transition('state', 't1', run_hooks=True)
+            hooks = timeit.default_timer() - started
+            assert moved == rows_count
+    finally:
+        drop_model(model)
+    return updated, hooks
+
+
+def bench_memory(states_count, number=10000):
+    """Bytes allocated per bound handler and per deep copy of the handler (the previous behaviour)."""
+    handler = make_handler(states_count)
+    rows = [Row('s0') for _ in range(number)]
+    copies = max(number // 100, 1)
+
+    def allocated(function, count):
+        gc.collect()
+        tracemalloc.start()
+        kept = function()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del kept
+        return size / count
+
+    bound = allocated(lambda: [handler.bind(row) for row in rows], number)
+    deepcopied = allocated(lambda: [copy.deepcopy(handler) for _ in range(copies)], copies)
+    return bound, deepcopied
+
+
+def bench_state_cache(handlers_count, states_count=10):
+    """
+    Growth of `StateCache` when `handlers_count` handler classes are compiled. Returns
+    cached handler keys and states, bytes allocated by compiling and handler keys still
+    cached once the classes are dropped, the cache is cleared after.
+    """
+    from ..logic import StateCache
+
+    StateCache.clear()
+    state_choices = make_state_choices(states_count)
+    handler_classes = [make_handler_class(states_count) for _ in range(handlers_count)]
+    gc.collect()
+    tracemalloc.start()
+    handlers = [handler_class('state', 'str', state_choices=state_choices) for handler_class in handler_classes]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    stats = StateCache.stats()
+    del handlers, handler_classes
+    gc.collect()
+    retained = StateCache.stats()['handlers']
+    StateCache.clear()
+    return stats['handlers'], stats['states'], size, retained
+
+
+def bench_bound_handler(states_count, number=1000):
+    """
+    Per-instance cost of getting a handler for a model instance, the
+    bound view against a deep copy of the handler (the previous behaviour).
+    Returns seconds per instance.
+    """
+    handler = make_handler(states_count)
+    row = Row('s0')
+
+    def deepcopy_handler():
+        handler_copy = copy.deepcopy(handler)
+        handler_copy.instance = row
+
+    bound = timeit.timeit(lambda: handler.bind(row), number=number) / number
+    deepcopied = timeit.timeit(deepcopy_handler, number=max(number // 100, 1)) / max(number // 100, 1)
+    return bound, deepcopied
+
+
+def bench_process(states_count, number=100000):
+    """
+    Transition throughput from the middle state of the machine, through the
+    generated trigger method of a bound handler and through a direct `process()`
+    call with a resolved transition. Returns transitions per second.
+    """
+    handler = make_handler(states_count)
+    middle = states_count // 2
+    start_state, trigger_name = 's{0}'.format(middle), 't{0}'.format(middle)
+    row = Row(start_state)
+    bound = handler.bind(row)
+    trigger = getattr(bound, trigger_name)
+    transition = handler.machine.get_transition(start_state, trigger_name)
+
+    def fire_trigger():
+        row.state = start_state
+        trigger()
+
+    def call_process():
+        row.state = start_state
+        bound.process(transition)
+
+    triggered = timeit.timeit(fire_trigger, number=number)
+    processed = timeit.timeit(call_process, number=number)
+    return number / triggered, number / processed
+
+
+def _write_startup_project(directory, models_count, states_count):
+    """Write settings and an app with `models_count` models, each with its own machine of `states_count` states."""
+    app_directory = os.path.join(directory, 'startup_app')
+    os.mkdir(app_directory)
+    with open(os.path.join(directory, 'startup_settings.py'), 'w') as settings_file:
+        settings_file.write(STARTUP_SETTINGS)
+    with open(os.path.join(app_directory, '__init__.py'), 'w'):
+        pass
+    triggers = '\n'.join('    def t{0}(self, **kwargs):\n        pass\n'.format(i) for i in range(states_count - 1))
+    transitions = '\n'.join(
+        "        self.add_transition('t{0}', 's{0}', 's{1}')".format(i, i + 1) for i in range(states_count - 1))
+    with open(os.path.join(app_directory, 'models.py'), 'w') as models_file:
+        models_file.write('from django.db import models\n')
+        models_file.write('from django_state_machines.fields import StateMachineCharField\n')
+        models_file.write('from django_state_machines.logic import BaseStateHandler\n')
+        for index in range(models_count):
+            models_file.write(STARTUP_MODEL.format(index=index, triggers=triggers, transitions=transitions))
+
+
+def bench_startup(models_count, states_count=10):
+    """
+    Cost of `django.setup()` in a fresh interpreter for a project with `models_count` state
+    machine fields, each with its own handler, of the system checks run by `manage.py check`
+    and `runserver` right after it, and of the first use of all their handlers, which compiles
+    the machines. Returns seconds of the three.
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        _write_startup_project(directory, models_count, states_count)
+        package_directory = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        environment = dict(
+            os.environ, DJANGO_SETTINGS_MODULE='startup_settings',
+            PYTHONPATH=os.pathsep.join([directory, package_directory, os.environ.get('PYTHONPATH', '')]))
+        output = subprocess.check_output([sys.executable, '-c', STARTUP_SCRIPT], env=environment)
+    finally:
+        shutil.rmtree(directory)
+    result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+    return result['setup'], result['check'], result['first_use']
+
+
+def bench_replay(states_count, events_count=REPLAY_EVENTS, entities_count=REPLAY_ENTITIES):
+    """
+    Throughput of `ReplayEngine` replaying random events of `entities_count` entities through
+    a linear machine, with entity states in a dict and in an array. Returns events per second.
+    """
+    from ..replay import ReplayEngine
+
+    handler = make_handler(states_count)
+    generator = random.Random(0)
+    triggers = ['t{0}'.format(i) for i in range(states_count - 1)]
+    events = [(generator.randrange(entities_count), generator.choice(triggers)) for _ in range(events_count)]
+    results = []
+    for capacity in (None, entities_count):
+        engine = ReplayEngine(handler, initial_state='s0', capacity=capacity)
+        results.append(events_count / timeit.timeit(lambda: engine.run(events), number=1))
+    return tuple(results)
+
+
+SECTIONS = ('construction', 'property', 'process', 'bulk', 'memory', 'state_cache', 'startup', 'replay')
+
+
+def run_construction(args):
+    rows = []
+    for states_count in MACHINE_SIZES:
+        compiled, constructed, bound = bench_construction(states_count)
+        deepcopied = bench_bound_handler(states_count)[1]
+        rows.append({
+            'states': states_count, 'compile_ms': compiled * 1e3, 'construct_us': constructed * 1e6,
+            'bind_us': bound * 1e6, 'deepcopy_us': deepcopied * 1e6,
+        })
+    return rows
+
+
+def run_property(args):
+    first, cached = bench_handler_property()
+    return [{'first_access_us': first * 1e6, 'cached_access_us': cached * 1e6}]
+
+
+def run_process(args):
+    rows = []
+    for states_count in MACHINE_SIZES:
+        triggered, processed = bench_process(states_count)
+        rows.append({'states': states_count, 'trigger_ops': triggered, 'process_ops': processed})
+    return rows
+
+
+def run_bulk(args):
+    rows = []
+    for rows_count in args.bulk_sizes:
+        updated, hooks = bench_bulk_transition(rows_count)
+        rows.append({
+            'rows': rows_count, 'update_s': updated, 'update_rows_per_s': rows_count / updated,
+            'hooks_s': hooks, 'hooks_rows_per_s': rows_count / hooks if hooks else None,
+        })
+    return rows
+
+
+def run_memory(args):
+    rows = []
+    for states_count in MACHINE_SIZES:
+        bound, deepcopied = bench_memory(states_count)
+        rows.append({'states': states_count, 'bound_bytes': bound, 'deepcopy_bytes': deepcopied})
+    return rows
+
+
+def run_state_cache(args):
+    rows = []
+    for handlers_count in STATE_CACHE_HANDLERS:
+        handlers, states, size, retained = bench_state_cache(handlers_count)
+        rows.append({'handler_classes': handlers_count, 'cached_handlers': handlers, 'cached_states': states,
+                     'compile_bytes': size, 'retained_handlers': retained})
+    return rows
+
+
+def run_startup(args):
+    rows = []
+    for models_count in STARTUP_MODEL_COUNTS:
+        setup, check, first_use = bench_startup(models_count)
+        rows.append({'models': models_count, 'setup_ms': setup * 1e3, 'check_ms': check * 1e3,
+                     'first_use_ms': first_use * 1e3})
+    return rows
+
+
+def run_replay(args):
+    rows = []
+    for states_count in MACHINE_SIZES:
+        in_dict, in_array = bench_replay(states_count)
+        rows.append({'states': states_count, 'dict_events_per_s': in_dict, 'array_events_per_s': in_array})
+    return rows
+
+
+def environment():
+    """Versions the results were measured on."""
+    import django
+    import sqlite3
+    try:
+        from importlib.metadata import version
+        package_version = version('django-state-machines')
+    except Exception:
+        package_version = None
+    return {
+        'package': package_version,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'django': django.get_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+    }
+
+
+def print_table(section, rows):
+    columns = list(rows[0])
+    print(section)
+    print(' '.join('{0:>18}'.format(column) for column in columns))
+    for row in rows:
+        print(' '.join(
+            '{0:>18}'.format('-') if row[column] is None else
+            '{0:>18.3f}'.format(row[column]) if isinstance(row[column], float) else
+            '{0:>18}'.format(row[column]) for column in columns))
+    print('')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--only', nargs='+', choices=SECTIONS, default=SECTIONS, help='sections to run')
+    parser.add_argument('--json', metavar='PATH', help='write results as JSON to the file, "-" for stdout')
+    parser.add_argument('--bulk-sizes', nargs='+', type=int, default=BULK_SIZES, help='table sizes of bulk benchmarks')
+    parser.add_argument(
+        '--min-process-ops', type=float, default=0,
+        help='fail if trigger throughput of any machine size is lower (transitions per second)')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    results = {'environment': environment(), 'results': {}}
+    for section in SECTIONS:
+        if section in args.only:
+            rows = globals()['run_' + section](args)
+            results['results'][section] = rows
+            if args.json != '-':
+                print_table(section, rows)
+
+    if args.json == '-':
+        print(json.dumps(results, indent=2, sort_keys=True))
+    elif args.json:
+        with open(args.json, 'w') as results_file:
+            json.dump(results, results_file, indent=2, sort_keys=True)
+
+    if 'process' in results['results']:
+        slowest = min(row['trigger_ops'] for row in results['results']['process'])
+        if slowest < args.min_process_ops:
+            print('Trigger throughput {0:.0f} ops/s is below {1:.0f} ops/s.'.format(slowest, args.min_process_ops),
+                  file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Time based transitions. A transition added with `after_timeout` fires by itself once an
+instance spent that long in its start state:
+
+    self.add_transition('expire', 'pending_payment', 'cancelled', after_timeout=timedelta(minutes=30))
+
+Due times are kept in the `StateTimeout` side table, indexed by `due_at`. Rows of an instance
+are replaced every time it enters or leaves a state with timeouts, together with the state write:
+by `process` in the atomic mode, `run_path`, queryset transitions and, for triggers fired in the
+default mode, when the instance is saved. They are created when an instance is saved for the
+first time in such a state. `run_state_timeouts` command claims due rows in batches and fires them
+with compare-and-swap updates, so a row that changed state in the meantime is skipped.
+"""
+
+from __future__ import unicode_literals
+
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .batch import BatchResult
+from .exceptions import TransitionNotPossibleError
+
+from datetime import timedelta
+
+import logging
+import uuid
+
+
+logger = logging.getLogger('django_state_machines')
+
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+
+def schedule_timeouts(model, pks, field_name, state_id, transitions, using=None, now=None):
+    """
+    Replace pending timeouts of the `field_name` machine of the `model` rows with `pks` by
+    the timeouts of `transitions`, leaving `state_id` state the rows entered. Timeouts are kept
+    for the model with the state column, rows of proxies and multi-table inheritance children share them.
+    """
+    from django.contrib.contenttypes.models import ContentType
+    from .models import StateTimeout
+
+    using = using or router.db_for_write(StateTimeout)
+    model = model._meta.get_field(field_name).model
+    content_type = ContentType.objects.db_manager(using).get_for_model(model)
+    object_ids = [str(pk) for pk in pks]
+    manager = StateTimeout.objects.db_manager(using)
+    manager.filter(content_type=content_type, object_id__in=object_ids, field=field_name).delete()
+    if transitions:
+        now = now or timezone.now()
+        manager.bulk_create([
+            StateTimeout(
+                content_type=content_type, object_id=object_id, field=field_name, state=str(state_id),
+                trigger=transition.trigger.__name__, due_at=now + transition.timeout)
+            for object_id in object_ids for transition in transitions])
+
+
+def schedule_created(field, instance, using=None):
+    """Schedule timeouts of the state a new `instance` was saved in."""
+    timeouts = field.handler.machine.timeouts
+    if timeouts:
+        state_id = getattr(instance, field.attname)
+        if state_id in timeouts:
+            schedule_timeouts(instance.__class__, [instance.pk], field.name, state_id, timeouts[state_id], using)
+
+
+def schedule_saved(field, instance, using=None):
+    """Replace pending timeouts of a saved `instance` by the timeouts of its current state."""
+    state_id = getattr(instance, field.attname)
+    using = using or router.db_for_write(instance.__class__)
+    with transaction.atomic(using=using):
+        schedule_timeouts(
+            instance.__class__, [instance.pk], field.name, state_id, field.handler.machine.timeouts.get(state_id, ()),
+            using)
+
+
+def claim_due_timeouts(batch_size=100, using=None, now=None, claim_timeout=CLAIM_TIMEOUT):
+    """
+    Claim up to `batch_size` due timeouts, the earliest first, and return them. Rows claimed
+    by a worker that didn't finish them (failed or died) can be claimed again after `claim_timeout`.
+    Where `SELECT ... FOR UPDATE SKIP LOCKED` is supported concurrent workers skip rows locked
+    by each other, elsewhere (SQLite) rows are claimed with a conditional UPDATE and a worker
+    gets only the rows it updated.
+    """
+    from .models import StateTimeout
+
+    using = using or router.db_for_write(StateTimeout)
+    now = now or timezone.now()
+    token = uuid.uuid4().hex
+    manager = StateTimeout.objects.db_manager(using)
+    claimable = manager.filter(Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - claim_timeout), due_at__lte=now)
+    with transaction.atomic(using=using):
+        if connections[using].features.has_select_for_update_skip_locked:
+            pks = list(claimable.select_for_update(skip_locked=True).order_by('due_at').values_list(
+                'pk', flat=True)[:batch_size])
+            manager.filter(pk__in=pks).update(claimed_at=now, claimed_by=token)
+        else:
+            pks = list(claimable.order_by('due_at').values_list('pk', flat=True)[:batch_size])
+            claimable.filter(pk__in=pks).update(claimed_at=now, claimed_by=token)
+    return list(manager.filter(claimed_by=token).order_by('due_at'))
+
+
+def fire_timeouts(timeouts, using=None):
+    """
+    Fire claimed `timeouts` and return `BatchResult`, with `errors` keyed by the timeout ids.
+    Every timeout runs `process` in the atomic mode in its own transaction, rows that are not
+    in the timeout state anymore, were deleted or don't meet the conditions are skipped. Fired
+    and skipped timeouts are deleted, failed ones stay claimed and are retried once the claim expires.
+    """
+    from django.contrib.contenttypes.models import ContentType
+    from .models import StateTimeout
+
+    using = using or router.db_for_write(StateTimeout)
+    result = BatchResult()
+    done = []
+    groups = {}
+    for timeout in timeouts:
+        groups.setdefault((timeout.content_type_id, timeout.field), []).append(timeout)
+    for (content_type_id, field_name), group in groups.items():
+        model = ContentType.objects.db_manager(using).get_for_id(content_type_id).model_class()
+        instances = {}
+        if model is not None:
+            rows = model._base_manager.db_manager(using).in_bulk([timeout.object_id for timeout in group])
+            instances = dict((str(pk), instance) for pk, instance in rows.items())
+        property_name = '{0}_handler'.format(field_name)
+        for timeout in group:
+            instance = instances.get(timeout.object_id)
+            try:
+                if instance is None or str(getattr(instance, field_name)) != timeout.state:
+                    raise TransitionNotPossibleError("Instance left '{0}' state.".format(timeout.state))
+                with transaction.atomic(using=using):
+                    handler = getattr(instance, property_name)
+                    handler.process(handler.get_transition(timeout.trigger), atomic=True, instance=instance)
+            except TransitionNotPossibleError:
+                result.skipped += 1
+            except Exception as error:
+                logger.warning("Timeout '%s' of %r failed.", timeout.trigger, instance, exc_info=True)
+                result.failed += 1
+                result.errors[timeout.pk] = '{0}: {1}'.format(error.__class__.__name__, error)
+                continue
+            else:
+                result.succeeded += 1
+            done.append(timeout.pk)
+    StateTimeout.objects.db_manager(using).filter(pk__in=done).delete()
+    return result
+
+
+def run_due_timeouts(batch_size=100, using=None, now=None, claim_timeout=CLAIM_TIMEOUT):
+    """Claim and fire one batch of due timeouts, see `claim_due_timeouts` and `fire_timeouts`."""
+    return fire_timeouts(claim_due_timeouts(batch_size, using, now, claim_timeout), using)
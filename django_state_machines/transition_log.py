@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .hooks import Hook, ON_COMMIT
+
+from contextlib import contextmanager
+
+import csv
+import functools
+import threading
+
+
+EXPORT_FIELDS = ('id', 'content_type__app_label', 'content_type__model', 'object_id', 'field', 'trigger',
+                 'source', 'target', 'timestamp', 'duration')
+
+_local = threading.local()
+
+
+def is_enabled():
+    """Check `STATE_MACHINES_TRANSITION_LOG` setting, False when settings are not configured."""
+    return settings.configured and getattr(settings, 'STATE_MACHINES_TRANSITION_LOG', False)
+
+
+def record_transition(handler, transition, source, duration):
+    """
+    Add a log entry of the `transition` of the `handler` instance, made from `source`
+    state id in `duration` seconds. Entries are buffered by `transition_log_buffer` when
+    it is active, otherwise until the current transaction commits, and written with
+    a single `bulk_create`. Entries of transitions made in a transaction join the buffer
+    only when it commits, rolled back transitions are not logged.
+    """
+    entry = {
+        'instance': handler.instance,
+        'field': handler.field_name,
+        'trigger': transition.trigger.__name__,
+        'source': source,
+        'target': transition.end_state.id,
+        'timestamp': timezone.now(),
+        'duration': duration,
+    }
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is None:
+        write_entries_hook(**entry)
+    elif transaction.get_connection().in_atomic_block:
+        transaction.on_commit(functools.partial(buffer.append, entry))
+    else:
+        buffer.append(entry)
+
+
+def write_entries(batch):
+    """Write buffered log entries of saved instances with one `bulk_create`."""
+    from django.contrib.contenttypes.models import ContentType
+    from .models import TransitionLog
+
+    logs = []
+    for entry in batch:
+        instance = entry['instance']
+        if instance.pk is None:
+            continue
+        logs.append(TransitionLog(
+            content_type=ContentType.objects.get_for_model(instance),
+            object_id=str(instance.pk),
+            field=entry['field'],
+            trigger=entry['trigger'],
+            source='' if entry['source'] is None else str(entry['source']),
+            target=str(entry['target']),
+            timestamp=entry['timestamp'],
+            duration=entry['duration'],
+        ))
+    if logs:
+        TransitionLog.objects.bulk_create(logs)
+
+
+write_entries_hook = Hook(write_entries, ON_COMMIT, batch=True)
+
+
+@contextmanager
+def transition_log_buffer():
+    """
+    Buffer log entries of all transitions made in the block and write them with one
+    `bulk_create` when it exits without error (entries of the nested blocks are written by
+    the outermost). When the block runs in a transaction the entries are written once the
+    outermost transaction commits, nothing is written if it's rolled back.
+    """
+    if getattr(_local, 'buffer', None) is not None:
+        yield _local.buffer
+        return
+    _local.buffer = []
+    try:
+        yield _local.buffer
+        buffer = _local.buffer
+    finally:
+        _local.buffer = None
+    transaction.on_commit(functools.partial(_write_buffer, buffer))
+
+
+def _write_buffer(buffer):
+    if buffer:
+        write_entries(buffer)
+
+
+class TransitionLogMiddleware(object):
+    """
+    Buffer transition log entries of a request and write them once the response is ready,
+    entries of transactions rolled back during the request are dropped.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with transition_log_buffer():
+            return self.get_response(request)
+
+
+def export_transition_log(queryset=None, chunk_size=2000, fields=EXPORT_FIELDS):
+    """
+    Stream log rows as dictionaries of `fields`, fetched from the database in chunks
+    of `chunk_size`, by default all logs ordered by id.
+    """
+    from .models import TransitionLog
+
+    if queryset is None:
+        queryset = TransitionLog.objects.order_by('id')
+    return queryset.values(*fields).iterator(chunk_size=chunk_size)
+
+
+class _Echo(object):
+    def write(self, value):
+        return value
+
+
+def export_transition_log_csv(queryset=None, chunk_size=2000, fields=EXPORT_FIELDS):
+    """
+    Stream the log as CSV lines, header first, the result can be passed to
+    `StreamingHttpResponse` or written to a file.
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in export_transition_log(queryset, chunk_size, fields):
+        yield writer.writerow([row[field] for field in fields])
@@ -1,4 +1,4 @@
-from setuptools import setup
+from setuptools import find_packages, setup
 
 try:
     long_description = open('README.rst').read()
@@ -13,8 +13,14 @@ setup(
     author_email='sztajerwaldkarol@gmail.com',
     url='https://github.com/Backscratcher/django-state-machines',
     keywords="django",
-    packages=['django_state_machines', ],
+    packages=find_packages(exclude=['test_app', 'test_app.*']),
     include_package_data=True,
+    python_requires='>=3.8',
+    install_requires=[
+        'Django>=4.1',
+        'asgiref>=3.5.2',
+        'six>=1.10.0',
+    ],
     zip_safe=False,
     license='MIT License',
     platforms=['any'],
@@ -23,13 +29,14 @@ setup(
         'Intended Audience :: Developers',
         'Operating System :: OS Independent',
         "Framework :: Django",
-        "Framework :: Django :: 1.8",
-        "Framework :: Django :: 1.9",
-        "Framework :: Django :: 1.10",
+        "Framework :: Django :: 4.1",
+        "Framework :: Django :: 4.2",
+        "Framework :: Django :: 5.0",
+        "Framework :: Django :: 5.1",
+        "Framework :: Django :: 5.2",
         'Programming Language :: Python',
-        'Programming Language :: Python :: 2.6',
-        'Programming Language :: Python :: 2.7',
-        'Framework :: Django',
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
         'Topic :: Software Development :: Libraries :: Python Modules',
     ]
 )
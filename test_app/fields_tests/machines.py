@@ -1,3 +1,6 @@
+from datetime import timedelta
+
+from django.db.models import Q
 from django_state_machines.logic import BaseStateHandler
 
 
@@ -11,3 +14,35 @@ class ProductHandler(BaseStateHandler):
     def add_transitions(self):
         self.add_transition(trigger='accept', start_state='not_accepted', end_state='accepted')
         self.add_transition(trigger='reject', start_state='not_accepted', end_state='rejected')
+
+
+def is_paid(instance, **kwargs):
+    return instance.paid
+
+
+class OrderHandler(BaseStateHandler):
+    def submit(self, **kwargs):
+        pass
+
+    def approve(self, **kwargs):
+        pass
+
+    def reject(self, **kwargs):
+        pass
+
+    def ship(self, **kwargs):
+        pass
+
+    def cancel(self, **kwargs):
+        pass
+
+    def expire(self, **kwargs):
+        pass
+
+    def add_transitions(self):
+        self.add_transition('submit', ['draft', 'rejected'], 'submitted')
+        self.add_transition('approve', 'submitted', 'approved', conditions=Q(amount__lt=1000))
+        self.add_transition('reject', 'submitted', 'rejected')
+        self.add_transition('ship', 'approved', 'shipped', conditions=is_paid)
+        self.add_transition('cancel', '*', 'cancelled')
+        self.add_transition('expire', 'submitted', 'cancelled', after_timeout=timedelta(minutes=30))
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:42
+
+import django_state_machines.fields
+import fields_tests.machines
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fields_tests', '0002_auto_20170616_0833'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', django_state_machines.fields.StateMachineCharField(choices=[('draft', 'Draft'), ('submitted', 'Submitted'), ('rejected', 'Rejected'), ('approved', 'Approved'), ('shipped', 'Shipped'), ('cancelled', 'Cancelled')], db_index=True, default='draft', handler=fields_tests.machines.OrderHandler, max_length=20)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='state',
+            field=django_state_machines.fields.StateMachineCharField(choices=[('accepted', 'Accepted state'), ('not_accepted', 'Not accepted state'), ('rejected', 'Rejected state')], default='not_accepted', handler=fields_tests.machines.ProductHandler, max_length=50),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fields_tests', '0003_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='amount',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='paid',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:42
+
+import django_state_machines.fields
+import fields_tests.machines
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fields_tests', '0004_order_amount_paid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodedOrder',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', django_state_machines.fields.StateMachineCharField(choices=[('draft', 'Draft'), ('submitted', 'Submitted'), ('rejected', 'Rejected'), ('approved', 'Approved'), ('shipped', 'Shipped'), ('cancelled', 'Cancelled')], db_index=True, default='draft', handler=fields_tests.machines.OrderHandler, max_length=9, state_codes={'approved': 3, 'cancelled': 6, 'draft': 1, 'rejected': 4, 'shipped': 5, 'submitted': 2})),
+                ('amount', models.IntegerField(default=0)),
+                ('paid', models.BooleanField(default=False)),
+            ],
+        ),
+    ]
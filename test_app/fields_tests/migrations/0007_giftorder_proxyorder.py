@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fields_tests', '0006_order_discount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GiftOrder',
+            fields=[
+                ('order_ptr', models.OneToOneField(auto_created=True, on_delete=django.db.models.deletion.CASCADE, parent_link=True, primary_key=True, serialize=False, to='fields_tests.order')),
+                ('message', models.CharField(blank=True, max_length=100)),
+            ],
+            bases=('fields_tests.order',),
+        ),
+        migrations.CreateModel(
+            name='ProxyOrder',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('fields_tests.order',),
+        ),
+    ]
@@ -1,7 +1,8 @@
 from django.db import models
 from django_state_machines.fields import StateMachineCharField
+from django_state_machines.managers import StateMachineManager
 
-from .machines import ProductHandler
+from .machines import OrderHandler, ProductHandler
 
 
 class Product(models.Model):
@@ -15,3 +16,36 @@ class Product(models.Model):
             ('rejected', 'Rejected state', 'rejected'),
         )
     )
+
+    objects = StateMachineManager()
+
+
+class Order(models.Model):
+    state = StateMachineCharField(max_length=20, handler=OrderHandler, default='draft', db_index=True)
+    amount = models.IntegerField(default=0)
+    paid = models.BooleanField(default=False)
+    discount = models.IntegerField(null=True, blank=True)
+
+    objects = StateMachineManager()
+
+
+class CodedOrder(models.Model):
+    state = StateMachineCharField(
+        handler=OrderHandler,
+        default='draft',
+        db_index=True,
+        state_codes={'draft': 1, 'submitted': 2, 'approved': 3, 'rejected': 4, 'shipped': 5, 'cancelled': 6},
+    )
+    amount = models.IntegerField(default=0)
+    paid = models.BooleanField(default=False)
+
+    objects = StateMachineManager()
+
+
+class ProxyOrder(Order):
+    class Meta:
+        proxy = True
+
+
+class GiftOrder(Order):
+    message = models.CharField(max_length=100, blank=True)
@@ -0,0 +1,111 @@
+from unittest import skipIf
+
+from django.test import TestCase
+
+from django_state_machines.actions import AvailableActions, resolve_available_triggers
+
+from ..models import Order
+
+try:
+    from rest_framework import serializers
+except ImportError:
+    serializers = None
+
+
+class ResolveAvailableTriggersTests(TestCase):
+    def setUp(self):
+        self.drafts = [Order.objects.create(state='draft') for _ in range(2)]
+        self.cheap = Order.objects.create(state='submitted', amount=10)
+        self.expensive = Order.objects.create(state='submitted', amount=5000)
+        self.paid = Order.objects.create(state='approved', paid=True)
+        self.unpaid = Order.objects.create(state='approved')
+        self.cancelled = Order.objects.create(state='cancelled')
+
+    def test_grouped_by_state(self):
+        orders = list(Order.objects.order_by('pk'))
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_available_triggers(orders, 'state'), orders)
+        draft, other_draft, cheap, expensive, paid, unpaid, cancelled = orders
+        self.assertIs(draft.state_actions, other_draft.state_actions)
+        self.assertIs(cheap.state_actions, expensive.state_actions)
+        self.assertEqual(sorted(draft.state_actions.triggers), ['cancel', 'submit'])
+        self.assertEqual(sorted(cheap.state_actions.triggers), ['approve', 'cancel', 'expire', 'reject'])
+        self.assertEqual(
+            sorted(state.id for state in cheap.state_actions.states), ['approved', 'cancelled', 'rejected'])
+        self.assertEqual(sorted(unpaid.state_actions.triggers), ['cancel', 'ship'])
+        self.assertEqual(list(cancelled.state_actions.triggers), ['cancel'])
+
+    def test_queryset_is_evaluated_once(self):
+        with self.assertNumQueries(1):
+            orders = resolve_available_triggers(Order.objects.filter(state='draft'), 'state', to_attr='actions')
+        self.assertEqual(len(orders), 2)
+        self.assertTrue(all(isinstance(order.actions, AvailableActions) for order in orders))
+        self.assertEqual(resolve_available_triggers(Order.objects.none(), 'state'), [])
+
+    def test_check_conditions(self):
+        orders = list(Order.objects.order_by('pk'))
+        with self.assertNumQueries(1):
+            resolve_available_triggers(orders, 'state', check_conditions=True)
+        draft, other_draft, cheap, expensive, paid, unpaid, cancelled = orders
+        self.assertIs(draft.state_actions, other_draft.state_actions)
+        self.assertIn('approve', cheap.state_actions.triggers)
+        self.assertNotIn('approve', expensive.state_actions.triggers)
+        self.assertNotIn('approved', [state.id for state in expensive.state_actions.states])
+        self.assertIn('ship', paid.state_actions.triggers)
+        self.assertNotIn('ship', unpaid.state_actions.triggers)
+
+    def test_check_conditions_without_conditional_states(self):
+        with self.assertNumQueries(0):
+            resolve_available_triggers(self.drafts, 'state', check_conditions=True)
+        self.assertEqual(sorted(self.drafts[0].state_actions.triggers), ['cancel', 'submit'])
+
+
+if serializers is not None:
+    from django_state_machines.actions import AvailableTriggersField
+
+    class OrderSerializer(serializers.ModelSerializer):
+        actions = AvailableTriggersField()
+        checked_actions = AvailableTriggersField(with_states=True, check_conditions=True)
+
+        class Meta:
+            model = Order
+            fields = ('id', 'actions', 'checked_actions')
+
+    class PageSerializer(serializers.Serializer):
+        orders = OrderSerializer(many=True)
+
+
+@skipIf(serializers is None, "Django REST framework is not installed.")
+class AvailableTriggersFieldTests(TestCase):
+    def setUp(self):
+        self.cheap = Order.objects.create(state='submitted', amount=10)
+        self.expensive = Order.objects.create(state='submitted', amount=5000)
+        self.draft = Order.objects.create(state='draft')
+
+    def test_single_object(self):
+        data = OrderSerializer(self.cheap).data
+        self.assertEqual(sorted(data['actions']), ['approve', 'cancel', 'expire', 'reject'])
+        self.assertEqual(sorted(data['checked_actions']['triggers']), ['approve', 'cancel', 'expire', 'reject'])
+        self.assertEqual(sorted(data['checked_actions']['states']), ['approved', 'cancelled', 'rejected'])
+
+    def test_many_resolves_the_page_at_once(self):
+        queryset = Order.objects.order_by('pk')
+        with self.assertNumQueries(2):
+            data = OrderSerializer(queryset, many=True).data
+        self.assertEqual([sorted(item['actions']) for item in data], [
+            ['approve', 'cancel', 'expire', 'reject'], ['approve', 'cancel', 'expire', 'reject'],
+            ['cancel', 'submit']])
+        self.assertIn('approve', data[0]['checked_actions']['triggers'])
+        self.assertNotIn('approve', data[1]['checked_actions']['triggers'])
+
+    def test_nested_list(self):
+        orders = [self.expensive, self.draft]
+        data = PageSerializer({'orders': orders}).data['orders']
+        self.assertNotIn('approve', data[0]['checked_actions']['triggers'])
+        self.assertEqual(sorted(data[1]['actions']), ['cancel', 'submit'])
+
+    def test_attached_actions_are_used(self):
+        self.draft.state_actions = AvailableActions(('submit',), ())
+        with self.assertNumQueries(0):
+            data = OrderSerializer([self.draft], many=True).data
+        self.assertEqual(data[0]['actions'], ['submit'])
@@ -0,0 +1,99 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+from django.test import TestCase
+
+from django_state_machines import instrumentation
+from django_state_machines.exceptions import ConditionNotMetError, StaleStateError, TransitionNotPossibleError
+from django_state_machines.logic import BaseStateHandler
+from django_state_machines.signals import post_transition
+
+from ..machines import OrderHandler
+from ..models import Order
+
+
+events = []
+
+
+async def notify(instance, **kwargs):
+    await asyncio.sleep(0)
+    events.append(('notify', instance.state))
+
+
+def audit(instance, **kwargs):
+    events.append(('audit', instance.state))
+
+
+class AsyncOrderHandler(BaseStateHandler):
+    concurrent_after_hooks = True
+
+    async def submit(self, **kwargs):
+        events.append(('submit', self.instance.state))
+
+    def add_transitions(self):
+        self.add_transition('submit', 'draft', 'submitted', before=audit, after=[notify, audit])
+
+
+class AsyncTransitionTests(TestCase):
+    def setUp(self):
+        del events[:]
+
+    def test_trigger(self):
+        order = Order.objects.create(state='draft')
+        async_to_sync(order.state_handler.asubmit)()
+        self.assertEqual(order.state, 'submitted')
+        order.save()
+        self.assertEqual(Order.objects.get(pk=order.pk).state, 'submitted')
+
+    def test_coroutine_trigger_and_hooks(self):
+        order = Order(state='draft')
+        async_to_sync(AsyncOrderHandler('state', 'str').bind(order).asubmit)()
+        self.assertEqual(order.state, 'submitted')
+        self.assertEqual(events[:2], [('audit', 'draft'), ('submit', 'draft')])
+        self.assertEqual(sorted(events[2:]), [('audit', 'submitted'), ('notify', 'submitted')])
+
+    def test_rejected(self):
+        with self.assertRaises(TransitionNotPossibleError):
+            async_to_sync(Order(state='approved').state_handler.asubmit)()
+        with self.assertRaises(ConditionNotMetError):
+            async_to_sync(Order(state='submitted', amount=5000).state_handler.aapprove)()
+
+    def test_atomic(self):
+        order = Order.objects.create(state='submitted')
+        stale = Order.objects.get(pk=order.pk)
+        order.state_handler.reject(atomic=True)
+        with self.assertRaises(StaleStateError):
+            async_to_sync(stale.state_handler.aapprove)(atomic=True)
+        async_to_sync(stale.state_handler.acancel)(atomic=True, retries=1)
+        self.assertEqual(stale.state, 'cancelled')
+        self.assertEqual(Order.objects.get(pk=order.pk).state, 'cancelled')
+
+    def test_signals(self):
+        received = []
+
+        def receiver(sender, instance, source, target, **kwargs):
+            received.append((source, target))
+
+        post_transition.connect(receiver, handler=OrderHandler)
+        try:
+            async_to_sync(Order(state='draft').state_handler.asubmit)()
+        finally:
+            post_transition.disconnect(receiver)
+        self.assertEqual(received, [('draft', 'submitted')])
+
+    def test_instrumentation_matches_process(self):
+        collector = instrumentation.InMemoryCollector()
+        instrumentation.set_collector(collector)
+        try:
+            Order(state='draft').state_handler.submit()
+            async_to_sync(Order(state='draft').state_handler.asubmit)()
+            with self.assertRaises(TransitionNotPossibleError):
+                async_to_sync(Order(state='approved').state_handler.areject)()
+        finally:
+            instrumentation.set_collector(None)
+        self.assertEqual(collector.transitions[('OrderHandler.state', 'submit', 'draft', 'submitted', 'succeeded')], 2)
+        self.assertEqual(collector.transitions[('OrderHandler.state', 'reject', 'approved', None, 'rejected')], 1)
+        self.assertEqual(
+            sorted(phase for _, trigger, phase in collector.phases if trigger == 'submit'),
+            ['after', 'before', 'guard', 'trigger', 'update'])
+        self.assertEqual(collector.phases[('OrderHandler.state', 'submit', 'update')].count, 2)
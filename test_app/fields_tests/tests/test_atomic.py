@@ -0,0 +1,58 @@
+from django.test import TestCase
+
+from django_state_machines.exceptions import StaleStateError, TransitionNotPossibleError
+from django_state_machines.signals import pre_transition
+
+from ..machines import OrderHandler
+from ..models import Order
+
+
+class AtomicTransitionTests(TestCase):
+    def setUp(self):
+        self.order = Order.objects.create(state='submitted')
+        self.stale = Order.objects.get(pk=self.order.pk)
+
+    def test_compare_and_swap_persists_state(self):
+        self.order.state_handler.reject(atomic=True)
+        self.assertEqual(self.order.state, 'rejected')
+        self.assertEqual(Order.objects.get(pk=self.order.pk).state, 'rejected')
+
+    def test_stale_state_is_rejected(self):
+        self.order.state_handler.approve(atomic=True)
+        with self.assertRaises(StaleStateError):
+            self.stale.state_handler.reject(atomic=True)
+        self.assertEqual(self.stale.state, 'submitted')
+        self.assertEqual(Order.objects.get(pk=self.order.pk).state, 'approved')
+
+    def test_retry_refreshes_state_and_fires_again(self):
+        self.order.state_handler.reject(atomic=True)
+        self.stale.state_handler.cancel(atomic=True, retries=1)
+        self.assertEqual(self.stale.state, 'cancelled')
+        self.assertEqual(Order.objects.get(pk=self.order.pk).state, 'cancelled')
+
+    def test_retry_fails_when_trigger_is_no_longer_possible(self):
+        self.order.state_handler.approve(atomic=True)
+        with self.assertRaises(TransitionNotPossibleError):
+            self.stale.state_handler.reject(atomic=True, retries=1)
+        self.assertEqual(self.stale.state, 'approved')
+        self.assertEqual(Order.objects.get(pk=self.order.pk).state, 'approved')
+
+    def test_retries_are_limited(self):
+        def move_row(sender, instance, **kwargs):
+            Order.objects.filter(pk=instance.pk).update(state='draft' if instance.state == 'rejected' else 'rejected')
+
+        self.order.state_handler.approve(atomic=True)
+        pre_transition.connect(move_row, handler=OrderHandler, trigger='cancel')
+        try:
+            with self.assertRaises(StaleStateError):
+                self.stale.state_handler.cancel(atomic=True, retries=1)
+        finally:
+            pre_transition.disconnect(move_row)
+        self.assertEqual(self.stale.state, 'rejected')
+        self.assertEqual(Order.objects.get(pk=self.order.pk).state, 'draft')
+
+    def test_unsaved_instance_only_updates_value(self):
+        order = Order(state='draft')
+        with self.assertNumQueries(0):
+            order.state_handler.submit(atomic=True)
+        self.assertEqual(order.state, 'submitted')
@@ -0,0 +1,85 @@
+from django.test import TestCase
+
+from django_state_machines.batch import BatchResult, process_chunk, run_transitions
+from django_state_machines.exceptions import NoSuchTriggerError
+from django_state_machines.signals import post_transition, pre_transition
+
+from ..machines import OrderHandler
+from ..models import Order
+
+
+class RunTransitionsTests(TestCase):
+    def states(self):
+        return list(Order.objects.order_by('pk').values_list('state', flat=True))
+
+    def test_moves_rows_in_start_states(self):
+        for state in ('draft', 'rejected', 'submitted', 'draft', 'shipped'):
+            Order.objects.create(state=state)
+        result = run_transitions(Order.objects.all(), 'state', 'submit', chunk_size=2)
+        self.assertEqual((result.succeeded, result.skipped, result.failed, result.errors), (3, 0, 0, {}))
+        self.assertEqual(self.states(), ['submitted', 'submitted', 'submitted', 'submitted', 'shipped'])
+
+    def test_conditions_filter_rows(self):
+        Order.objects.create(state='submitted', amount=10)
+        Order.objects.create(state='submitted', amount=5000)
+        result = run_transitions(Order.objects.all(), 'state', 'approve', workers=0)
+        self.assertEqual((result.succeeded, result.skipped, result.failed), (1, 0, 0))
+        self.assertEqual(self.states(), ['approved', 'submitted'])
+
+    def test_one_chunk_per_chunk_size(self):
+        chunks = []
+
+        def record(instances, **kwargs):
+            chunks.append(sorted(instance.pk for instance in instances))
+
+        pks = [Order.objects.create(state='draft').pk for _ in range(5)]
+        post_transition.connect(record, handler=OrderHandler, bulk=True)
+        self.addCleanup(post_transition.disconnect, record)
+        self.assertEqual(run_transitions(Order.objects.all(), 'state', 'submit', chunk_size=2).succeeded, 5)
+        self.assertEqual(chunks, [pks[:2], pks[2:4], pks[4:]])
+
+    def test_unknown_trigger(self):
+        with self.assertRaises(NoSuchTriggerError):
+            run_transitions(Order.objects.all(), 'state', 'unknown')
+
+
+class ProcessChunkTests(TestCase):
+    def setUp(self):
+        self.orders = [Order.objects.create(state='draft') for _ in range(3)]
+        self.pks = [order.pk for order in self.orders]
+
+    def test_rows_changed_or_deleted_since_streamed_are_skipped(self):
+        Order.objects.filter(pk=self.pks[0]).update(state='shipped')
+        Order.objects.filter(pk=self.pks[1]).delete()
+        result = process_chunk(Order, 'state', 'submit', self.pks, {})
+        self.assertEqual((result.succeeded, result.skipped, result.failed), (1, 2, 0))
+        self.assertEqual(Order.objects.get(pk=self.pks[2]).state, 'submitted')
+
+    def test_conditions_not_met_are_skipped(self):
+        Order.objects.filter(pk=self.pks[0]).update(state='submitted', amount=5000)
+        Order.objects.filter(pk=self.pks[1]).update(state='submitted')
+        result = process_chunk(Order, 'state', 'approve', self.pks[:2], {})
+        self.assertEqual((result.succeeded, result.skipped, result.failed), (1, 1, 0))
+
+    def test_failed_row_rolls_back_only_its_savepoint(self):
+        failing = self.pks[1]
+
+        def refuse(sender, instance, **kwargs):
+            Order.objects.filter(pk=instance.pk).update(amount=1)
+            if instance.pk == failing:
+                raise RuntimeError('refused')
+
+        pre_transition.connect(refuse, handler=OrderHandler, trigger='submit')
+        self.addCleanup(pre_transition.disconnect, refuse)
+        with self.assertLogs('django_state_machines', 'WARNING'):
+            result = process_chunk(Order, 'state', 'submit', self.pks, {'note': 'x'})
+        self.assertEqual((result.succeeded, result.skipped, result.failed), (2, 0, 1))
+        self.assertEqual(result.errors, {failing: 'RuntimeError: refused'})
+        self.assertEqual(
+            list(Order.objects.order_by('pk').values_list('state', 'amount')),
+            [('submitted', 1), ('draft', 0), ('submitted', 1)])
+
+    def test_results_add_up(self):
+        result = BatchResult(succeeded=1, errors={1: 'a'})
+        result.update(BatchResult(skipped=2, failed=1, errors={2: 'b'}))
+        self.assertEqual(result.as_dict(), {'succeeded': 1, 'skipped': 2, 'failed': 1, 'errors': {1: 'a', 2: 'b'}})
@@ -0,0 +1,63 @@
+from django.test import TestCase
+
+from django_state_machines.exceptions import NoSuchTriggerError
+
+from ..models import Order, Product
+
+
+class BulkTransitionTests(TestCase):
+    def test_single_update_moves_only_rows_in_start_states(self):
+        Product.objects.create(state='not_accepted')
+        Product.objects.create(state='not_accepted')
+        Product.objects.create(state='rejected')
+        with self.assertNumQueries(1):
+            moved = Product.objects.transition('state', 'accept')
+        self.assertEqual(moved, 2)
+        self.assertEqual(Product.objects.filter(state='accepted').count(), 2)
+        self.assertEqual(Product.objects.filter(state='rejected').count(), 1)
+
+    def test_single_update_respects_queryset_filter(self):
+        first = Product.objects.create(state='not_accepted')
+        Product.objects.create(state='not_accepted')
+        self.assertEqual(Product.objects.filter(pk=first.pk).transition('state', 'accept'), 1)
+        self.assertEqual(Product.objects.filter(state='not_accepted').count(), 1)
+
+    def test_q_conditions_skip_rows(self):
+        Order.objects.create(state='submitted', amount=10)
+        Order.objects.create(state='submitted', amount=5000)
+        Order.objects.create(state='draft', amount=10)
+        self.assertEqual(Order.objects.transition('state', 'approve'), 1)
+        self.assertEqual(list(Order.objects.order_by('pk').values_list('state', flat=True)),
+                         ['approved', 'submitted', 'draft'])
+
+    def test_multi_source_and_wildcard_counts(self):
+        Order.objects.create(state='draft')
+        Order.objects.create(state='rejected')
+        Order.objects.create(state='approved')
+        self.assertEqual(Order.objects.transition('state', 'submit', batch_size=1), 2)
+        self.assertEqual(Order.objects.filter(state='submitted').count(), 2)
+        self.assertEqual(Order.objects.transition('state', 'cancel'), 3)
+        self.assertEqual(Order.objects.exclude(state='cancelled').count(), 0)
+
+    def test_no_matching_rows(self):
+        Order.objects.create(state='draft')
+        self.assertEqual(Order.objects.transition('state', 'ship', run_hooks=True), 0)
+        self.assertEqual(Product.objects.transition('state', 'accept'), 0)
+
+    def test_callable_conditions_need_hooks(self):
+        Order.objects.create(state='approved', paid=True)
+        with self.assertRaises(ValueError):
+            Order.objects.transition('state', 'ship')
+        self.assertEqual(Order.objects.filter(state='approved').count(), 1)
+
+    def test_callable_conditions_with_hooks_skip_rows(self):
+        Order.objects.create(state='approved', paid=True)
+        Order.objects.create(state='approved', paid=False)
+        Order.objects.create(state='approved', paid=True)
+        self.assertEqual(Order.objects.transition('state', 'ship', run_hooks=True, batch_size=2), 2)
+        self.assertEqual(list(Order.objects.order_by('pk').values_list('state', flat=True)),
+                         ['shipped', 'approved', 'shipped'])
+
+    def test_unknown_trigger(self):
+        with self.assertRaises(NoSuchTriggerError):
+            Order.objects.transition('state', 'archive')
@@ -0,0 +1,75 @@
+from io import StringIO
+
+from django.apps import apps
+from django.core.management import call_command
+from django.db import models
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import isolate_apps
+
+from django_state_machines.checks import check_dead_states, check_state_codes
+from django_state_machines.fields import StateMachineCharField, StateMachineMixin
+from django_state_machines.logic import BaseStateHandler
+
+
+class SplitHandler(BaseStateHandler):
+    def start(self, **kwargs):
+        pass
+
+    def resume(self, **kwargs):
+        pass
+
+    def add_transitions(self):
+        self.add_transition('start', 'new', 'started')
+        self.add_transition('resume', 'paused', 'started')
+
+
+def state_fields():
+    return [field for model in apps.get_models() for field in model._meta.local_fields
+            if isinstance(field, StateMachineMixin)]
+
+
+class CheckCompilationTests(SimpleTestCase):
+    def test_check_command_builds_no_handler(self):
+        fields = state_fields()
+        saved = [(field._state_handler, field._choices) for field in fields]
+        for field in fields:
+            field._state_handler = None
+            if field._lazy_choices:
+                field._choices = None
+        try:
+            call_command('check', stdout=StringIO(), stderr=StringIO())
+            self.assertEqual([field for field in fields if field._state_handler is not None], [])
+        finally:
+            for field, (handler, choices) in zip(fields, saved):
+                field._state_handler, field._choices = handler, choices
+
+
+@isolate_apps('fields_tests', attr_name='apps')
+class MachineCheckTests(SimpleTestCase):
+    def define_models(self):
+        class Split(models.Model):
+            state = StateMachineCharField(max_length=5, handler=SplitHandler, default='new')
+
+        class CodedSplit(models.Model):
+            state = StateMachineCharField(handler=SplitHandler, default='new', state_codes={'new': 1, 'started': 1})
+
+        return [self.apps.get_app_config('fields_tests')], Split._meta.get_field('state')
+
+    def test_machine_checks_are_off_by_default(self):
+        app_configs, field = self.define_models()
+        self.assertEqual(check_dead_states(app_configs), [])
+        self.assertEqual(field.check(), [])
+        messages = check_state_codes(app_configs)
+        self.assertEqual([message.id for message in messages], ['django_state_machines.E001'])
+        self.assertNotIn('without code', messages[0].msg)
+        self.assertIsNone(field._state_handler)
+
+    @override_settings(STATE_MACHINES_CHECK_MACHINES=True)
+    def test_enabled_machine_checks(self):
+        app_configs, field = self.define_models()
+        messages = check_dead_states(app_configs)
+        self.assertEqual([message.id for message in messages], ['django_state_machines.W002'] * 2)
+        self.assertIn('paused', messages[0].msg)
+        self.assertEqual([message.id for message in field.check()], ['fields.E009'])
+        messages = check_state_codes(app_configs)
+        self.assertIn('states without code: paused', messages[0].msg)
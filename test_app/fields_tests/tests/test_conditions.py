@@ -0,0 +1,147 @@
+from django.db import connection
+from django.db.models import F, Q
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from django_state_machines.conditions import evaluate_triggers, is_local_query, python_predicate
+from django_state_machines.exceptions import ConditionNotMetError
+from django_state_machines.logic import BaseStateHandler
+
+from ..models import Order
+
+
+class RangeHandler(BaseStateHandler):
+    def approve(self, **kwargs):
+        pass
+
+    def add_transitions(self):
+        self.add_transition('approve', 'submitted', 'approved', conditions=Q(amount__range=(0, 999)))
+
+
+class QConditionTests(TestCase):
+    def test_saved_instance(self):
+        order = Order.objects.create(state='submitted', amount=10)
+        order.state_handler.approve()
+        self.assertEqual(order.state, 'approved')
+
+    def test_saved_instance_not_meeting_conditions(self):
+        order = Order.objects.create(state='submitted', amount=5000)
+        with self.assertRaises(ConditionNotMetError):
+            order.state_handler.approve()
+        self.assertEqual(order.state, 'submitted')
+
+    def test_unsaved_changes_of_saved_instance_count(self):
+        order = Order.objects.create(state='submitted', amount=5000)
+        order.amount = 10
+        order.state_handler.approve()
+        self.assertEqual(order.state, 'approved')
+
+        order = Order.objects.create(state='submitted', amount=10)
+        order.amount = 5000
+        with self.assertRaises(ConditionNotMetError):
+            order.state_handler.approve()
+
+    def test_unsaved_instance(self):
+        order = Order(state='submitted', amount=10)
+        order.state_handler.approve()
+        self.assertEqual(order.state, 'approved')
+
+        order = Order(state='submitted', amount=5000)
+        with self.assertRaises(ConditionNotMetError):
+            order.state_handler.approve()
+
+    def test_simple_local_conditions_run_no_query(self):
+        saved = Order.objects.create(state='submitted', amount=10)
+        with self.assertNumQueries(0):
+            saved.state_handler.approve()
+            Order(state='submitted', amount=10).state_handler.approve()
+            with self.assertRaises(ConditionNotMetError):
+                Order(state='submitted', amount=5000).state_handler.approve()
+
+    def test_other_local_conditions_read_no_table(self):
+        order = Order.objects.create(state='submitted', amount=10)
+        bound = RangeHandler('state', 'str').bind(order)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(bound.conditions_met(bound.get_transition('approve')))
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn(Order._meta.db_table, queries[0]['sql'])
+        order.amount = 5000
+        self.assertFalse(bound.conditions_met(bound.get_transition('approve')))
+
+    def test_python_predicate_matches_querysets(self):
+        queries = [
+            Q(amount__lt=1000), ~Q(amount__lt=1000), Q(amount=10), Q(amount__gte='10'),
+            Q(discount__lt=10), ~Q(discount__lt=10), Q(discount__isnull=True), ~Q(discount=None),
+            Q(discount__in=[3, None]), ~Q(discount__in=[3, None]), Q(discount__in=[]), ~Q(discount__in=[]),
+            Q(amount__gt=F('discount')), ~Q(amount__gt=F('discount')), ~Q(discount__lte=F('amount')),
+            Q(discount__lt=10) | Q(paid=True), ~(Q(discount__lt=10) | Q(paid=True)), ~~Q(discount__gte=5),
+            Q(state='draft', amount__lte=5), Q(paid=False) & ~Q(discount=3), Q(pk__in=[1, 2]),
+        ]
+        orders = [
+            Order.objects.create(state='draft', amount=10, discount=None),
+            Order.objects.create(state='draft', amount=10, discount=3, paid=True),
+            Order.objects.create(state='submitted', amount=2000, discount=20),
+            Order.objects.create(state='draft', amount=5, discount=5),
+        ]
+        for query in queries:
+            predicate = python_predicate(Order, query)
+            self.assertIsNotNone(predicate, query)
+            for order in orders:
+                expected = Order.objects.filter(pk=order.pk).filter(query).exists()
+                self.assertEqual(predicate(order) is True, expected, (query, order.amount, order.discount))
+
+    def test_python_predicate_falls_back_to_sql(self):
+        self.assertIsNone(python_predicate(Order, Q(amount__range=(1, 10))))
+        self.assertIsNone(python_predicate(Order, Q(state__lt='m')))
+        self.assertIsNone(python_predicate(Order, Q(amount__lt=F('amount') + 1)))
+        self.assertIsNone(python_predicate(Order, Q(amount=1) ^ Q(paid=True)))
+
+    def test_is_local_query(self):
+        self.assertTrue(is_local_query(Order, Q(amount__lt=10) | Q(paid=True, amount__gt=F('pk'))))
+        self.assertFalse(is_local_query(Order, Q(customer__name='x')))
+        self.assertFalse(is_local_query(Order, Q(amount__lt=10) & Q(amount__lt=F('paid') + 1)))
+        self.assertFalse(is_local_query(Order, Q(amount__lt=F('customer__limit'))))
+
+
+class CallableConditionTests(TestCase):
+    def test_saved_instance(self):
+        order = Order.objects.create(state='approved', paid=True)
+        order.state_handler.ship()
+        self.assertEqual(order.state, 'shipped')
+
+        order = Order.objects.create(state='approved', paid=False)
+        with self.assertRaises(ConditionNotMetError):
+            order.state_handler.ship()
+        self.assertEqual(order.state, 'approved')
+
+    def test_unsaved_instance(self):
+        order = Order(state='approved', paid=True)
+        order.state_handler.ship()
+        self.assertEqual(order.state, 'shipped')
+
+        order = Order(state='approved', paid=False)
+        with self.assertRaises(ConditionNotMetError):
+            order.state_handler.ship()
+
+    def test_unsaved_changes_of_saved_instance_count(self):
+        order = Order.objects.create(state='approved', paid=False)
+        order.paid = True
+        order.state_handler.ship()
+        self.assertEqual(order.state, 'shipped')
+
+
+class EvaluateTriggersTests(TestCase):
+    def test_q_and_callable_conditions(self):
+        cheap = Order.objects.create(state='submitted', amount=10)
+        expensive = Order.objects.create(state='submitted', amount=5000)
+        paid = Order.objects.create(state='approved', paid=True)
+        unpaid = Order.objects.create(state='approved', paid=False)
+        results = evaluate_triggers(Order.objects.all(), 'state', ['approve', 'ship'])
+        self.assertEqual(results, {
+            cheap.pk: {'approve'},
+            expensive.pk: set(),
+            paid.pk: {'ship'},
+            unpaid.pk: set(),
+        })
+        self.assertEqual(set(Order.objects.can_fire('state', 'approve')), {cheap})
+        self.assertEqual(set(Order.objects.can_fire('state', 'ship')), {paid, unpaid})
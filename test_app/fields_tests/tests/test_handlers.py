@@ -0,0 +1,89 @@
+import copy
+import pickle
+
+from asgiref.sync import async_to_sync
+from django.test import TestCase
+
+from django_state_machines import hooks
+from django_state_machines.logic import BaseStateHandler
+
+from ..models import Order
+
+
+calls = []
+
+
+class NotifyingHandler(BaseStateHandler):
+    def submit(self, **kwargs):
+        self.record('submit')
+
+    def record(self, name):
+        calls.append((name, self.instance))
+
+    @property
+    def amount(self):
+        return self.instance.amount
+
+    def notify(self, **kwargs):
+        self.record('notify')
+
+    def add_transitions(self):
+        self.add_transition('submit', 'draft', 'submitted', after=hooks.on_commit(self.notify))
+
+
+class BoundHandlerTests(TestCase):
+    def setUp(self):
+        del calls[:]
+        self.handler = NotifyingHandler('state', 'str')
+        self.order = Order(state='draft', amount=10)
+
+    def test_trigger_helper_methods_see_the_instance(self):
+        self.handler.bind(self.order).submit()
+        self.assertIn(('submit', self.order), calls)
+
+    def test_properties_see_the_instance(self):
+        self.assertEqual(self.handler.bind(self.order).amount, 10)
+        self.assertEqual(self.handler.bind(Order(amount=20)).amount, 20)
+
+    def test_handler_attributes_are_shared(self):
+        bound = self.handler.bind(self.order)
+        self.assertEqual(bound.handler_key, (NotifyingHandler, 'state'))
+        self.assertEqual(bound.choices, self.handler.choices)
+
+    def test_hook_wrapped_methods_see_the_instance(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.handler.bind(self.order).submit()
+            self.assertEqual(calls, [('submit', self.order)])
+        self.assertEqual(calls, [('submit', self.order), ('notify', self.order)])
+
+    def test_async_trigger(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            async_to_sync(self.handler.bind(self.order).asubmit)()
+        self.assertEqual(calls, [('submit', self.order), ('notify', self.order)])
+        self.assertEqual(self.order.state, 'submitted')
+
+
+class PickleTests(TestCase):
+    def test_instance_with_cached_handler(self):
+        order = Order.objects.create(state='draft')
+        order.state_handler.submit()
+        restored = pickle.loads(pickle.dumps(order))
+        self.assertEqual(restored.state, 'submitted')
+        self.assertIs(restored.state_handler.instance, restored)
+        restored.state_handler.reject()
+        self.assertEqual(restored.state, 'rejected')
+
+    def test_bound_handler(self):
+        order = Order.objects.create(state='draft')
+        bound = pickle.loads(pickle.dumps(order.state_handler))
+        self.assertEqual(bound.instance.pk, order.pk)
+        bound.submit()
+        self.assertEqual(bound.instance.state, 'submitted')
+
+    def test_copy(self):
+        order = Order(state='draft')
+        order.state_handler.submit()
+        for copied in (copy.copy(order), copy.deepcopy(order)):
+            copied.state_handler.reject()
+            self.assertEqual(copied.state, 'rejected')
+        self.assertEqual(order.state, 'submitted')
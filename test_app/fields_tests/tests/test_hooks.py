@@ -0,0 +1,137 @@
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+
+from django_state_machines import hooks
+
+
+calls = []
+
+
+def record(**kwargs):
+    calls.append(kwargs)
+
+
+class RecordingBackend(hooks.HookBackend):
+    def __init__(self):
+        self.batches = []
+
+    def submit(self, calls):
+        self.batches.append(calls)
+
+
+class HookTestMixin(object):
+    def setUp(self):
+        del calls[:]
+        self.backend = RecordingBackend()
+        self.original_backend = hooks.dispatcher._backend
+        hooks.dispatcher.backend = self.backend
+
+    def tearDown(self):
+        hooks.dispatcher.backend = self.original_backend
+
+
+class HookDispatchTests(HookTestMixin, TestCase):
+    def test_inline(self):
+        hooks.Hook(record)(value=1)
+        self.assertEqual(calls, [{'value': 1}])
+
+    def test_called_after_commit(self):
+        hook = hooks.on_commit(record)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            hook(value=1)
+            hook(value=2)
+            self.assertEqual(calls, [])
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(calls, [{'value': 1}, {'value': 2}])
+
+    def test_rolled_back_savepoint_discards_its_calls(self):
+        hook = hooks.on_commit(record)
+        with self.captureOnCommitCallbacks(execute=True):
+            hook(value=1)
+            try:
+                with transaction.atomic():
+                    hook(value=2)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            hook(value=3)
+        self.assertEqual(calls, [{'value': 1}, {'value': 3}])
+
+    def test_batch_is_not_split_by_rolled_back_savepoint(self):
+        hook = hooks.on_commit(record, batch=True)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            hook(value=1)
+            try:
+                with transaction.atomic():
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            hook(value=2)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(calls, [{'batch': [{'value': 1}, {'value': 2}]}])
+
+    def test_batch_grouping(self):
+        batched = hooks.on_commit(record, batch=True)
+        single = hooks.on_commit(record)
+        with self.captureOnCommitCallbacks(execute=True):
+            batched(value=1)
+            single(value=2)
+            batched(value=3)
+        self.assertEqual(calls, [{'batch': [{'value': 1}, {'value': 3}]}, {'value': 2}])
+
+    def test_background_calls_are_submitted_as_one_batch(self):
+        hook = hooks.in_background(record)
+        batched = hooks.in_background(record, batch=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            hook(value=1)
+            batched(value=2)
+            hook(value=3)
+            batched(value=4)
+            self.assertEqual(self.backend.batches, [])
+        self.assertEqual(self.backend.batches, [[
+            (record, {'value': 1}),
+            (record, {'batch': [{'value': 2}, {'value': 4}]}),
+            (record, {'value': 3}),
+        ]])
+        self.assertEqual(calls, [])
+
+    def test_run_calls_background_batch(self):
+        hooks.HookBackend.run([(record, {'value': 1}), (record, {'value': 2})])
+        self.assertEqual(calls, [{'value': 1}, {'value': 2}])
+
+
+class HookTransactionTests(HookTestMixin, TransactionTestCase):
+    def test_dispatched_immediately_outside_of_transaction(self):
+        hooks.on_commit(record)(value=1)
+        hooks.in_background(record)(value=2)
+        self.assertEqual(calls, [{'value': 1}])
+        self.assertEqual(self.backend.batches, [[(record, {'value': 2})]])
+
+    def test_commit(self):
+        hook = hooks.on_commit(record, batch=True)
+        with transaction.atomic():
+            hook(value=1)
+            hook(value=2)
+            self.assertEqual(calls, [])
+        self.assertEqual(calls, [{'batch': [{'value': 1}, {'value': 2}]}])
+
+    def test_rollback(self):
+        hook = hooks.on_commit(record)
+        try:
+            with transaction.atomic():
+                hook(value=1)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(calls, [])
+        with transaction.atomic():
+            hook(value=2)
+        self.assertEqual(calls, [{'value': 2}])
+
+    def test_next_transaction_gets_a_new_batch(self):
+        hook = hooks.on_commit(record, batch=True)
+        with transaction.atomic():
+            hook(value=1)
+        with transaction.atomic():
+            hook(value=2)
+        self.assertEqual(calls, [{'batch': [{'value': 1}]}, {'batch': [{'value': 2}]}])
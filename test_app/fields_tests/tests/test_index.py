@@ -0,0 +1,52 @@
+from django.test import SimpleTestCase
+
+from django_state_machines.exceptions import TransitionNotPossibleError
+from django_state_machines.logic import BaseStateHandler
+
+from ..models import Order
+
+
+class ArchiveHandler(BaseStateHandler):
+    def archive(self, **kwargs):
+        pass
+
+    def add_transitions(self):
+        self.add_transition('archive', '*', 'archived')
+        self.add_transition('archive', 'draft', 'deleted')
+
+
+class TransitionIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.machine = Order._meta.get_field('state').handler.machine
+
+    def test_multi_source_transition_is_indexed_for_every_start_state(self):
+        self.assertEqual(self.machine.get_transition('draft', 'submit').end_state.id, 'submitted')
+        self.assertEqual(self.machine.get_transition('rejected', 'submit').end_state.id, 'submitted')
+        self.assertIsNone(self.machine.get_transition('approved', 'submit'))
+        self.assertEqual(sorted(self.machine.trigger_index['submit']), ['draft', 'rejected'])
+
+    def test_wildcard_transition_is_indexed_for_every_state(self):
+        for state in self.machine.states:
+            self.assertEqual(self.machine.get_transition(state.id, 'cancel').end_state.id, 'cancelled')
+
+    def test_explicit_transition_wins_over_wildcard(self):
+        machine = ArchiveHandler('state', 'str').machine
+        self.assertEqual(machine.get_transition('draft', 'archive').end_state.id, 'deleted')
+        self.assertEqual(machine.get_transition('deleted', 'archive').end_state.id, 'archived')
+        self.assertEqual(machine.get_transition('archived', 'archive').end_state.id, 'archived')
+
+    def test_available_triggers_come_from_the_index(self):
+        self.assertEqual(Order(state='draft').state_handler.available_triggers(), ('cancel', 'submit'))
+        self.assertEqual(
+            Order(state='submitted').state_handler.available_triggers(), ('approve', 'cancel', 'expire', 'reject'))
+
+    def test_trigger_fires_from_any_of_its_start_states(self):
+        order = Order(state='rejected')
+        order.state_handler.submit()
+        self.assertEqual(order.state, 'submitted')
+
+    def test_trigger_without_transition_from_current_state_is_rejected(self):
+        order = Order(state='approved')
+        with self.assertRaises(TransitionNotPossibleError):
+            order.state_handler.submit()
+        self.assertEqual(order.state, 'approved')
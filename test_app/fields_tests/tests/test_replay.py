@@ -0,0 +1,75 @@
+from django.test import SimpleTestCase
+
+from django_state_machines.logic import BaseStateHandler
+from django_state_machines.replay import ReplayEngine, RejectedEvent, events_from_csv, events_from_jsonl
+
+from ..machines import OrderHandler
+
+
+class NumberedHandler(BaseStateHandler):
+    def start(self, **kwargs):
+        pass
+
+    def add_transitions(self):
+        self.add_transition('start', 'new', 'started')
+
+
+EVENTS = [
+    (0, 'submit'), (1, 'approve'), (0, 'approve'), (2, 'submit'), (2, 'reject'),
+    (0, 'unknown'), (1, 'cancel'), (0, 'ship'), (2, 'submit'),
+]
+
+
+class ReplayEngineTests(SimpleTestCase):
+    def setUp(self):
+        self.handler = OrderHandler('state', 'str')
+
+    def test_dict_and_array_storage_agree(self):
+        # Conditions are not checked, the unpaid order 0 is shipped.
+        engines = [ReplayEngine(self.handler, 'draft'), ReplayEngine(self.handler, 'draft', capacity=4)]
+        rejected = [list(engine.replay(EVENTS)) for engine in engines]
+        self.assertEqual(rejected[0], [
+            RejectedEvent(1, 'approve', 'draft'), RejectedEvent(0, 'unknown', 'approved')])
+        self.assertEqual(rejected[1], rejected[0])
+        self.assertEqual(
+            sorted(engines[0].items()), [(0, 'shipped'), (1, 'cancelled'), (2, 'submitted')])
+        self.assertEqual(
+            list(engines[1].items()), [(0, 'shipped'), (1, 'cancelled'), (2, 'submitted'), (3, 'draft')])
+        for engine in engines:
+            self.assertEqual(engine.state_of(0), 'shipped')
+            self.assertEqual(engine.state_of(3), 'draft')
+
+    def test_array_states_are_small_ints(self):
+        self.assertEqual(ReplayEngine(self.handler, 'draft', capacity=2).states.typecode, 'h')
+
+    def test_entities_in_no_known_state_are_rejected(self):
+        for capacity in (None, 2):
+            engine = ReplayEngine(self.handler, capacity=capacity)
+            self.assertEqual(
+                list(engine.replay([(0, 'submit'), (0, 'cancel')])),
+                [RejectedEvent(0, 'submit', None), RejectedEvent(0, 'cancel', None)])
+            self.assertIsNone(engine.state_of(0))
+
+    def test_load(self):
+        for capacity in (None, 3):
+            engine = ReplayEngine(self.handler, capacity=capacity)
+            engine.load([(0, 'submitted'), (1, 'shipped')])
+            self.assertEqual(engine.run([(0, 'approve'), (1, 'approve'), (2, 'submit')]), 2)
+            self.assertEqual(
+                (engine.state_of(0), engine.state_of(1), engine.state_of(2)), ('approved', 'shipped', None))
+            with self.assertRaises(KeyError):
+                engine.load([(0, 'lost')])
+
+    def test_initial_state_by_id_or_name(self):
+        handler = NumberedHandler('state', 'int')
+        new = handler.machine.states[handler.machine.state_indexes['new']].id
+        for initial_state in ('new', new):
+            engine = ReplayEngine(handler.machine, initial_state)
+            self.assertEqual(engine.run([(0, 'start'), (0, 'start')]), 1)
+            self.assertEqual(handler.machine.states_by_id[engine.state_of(0)].name, 'started')
+
+    def test_event_readers(self):
+        lines = ['entity,trigger', '1,submit', '2,approve']
+        self.assertEqual(list(events_from_csv(lines, entity_type=int)), [(1, 'submit'), (2, 'approve')])
+        lines = ['{"entity": 1, "trigger": "submit"}', '', '{"entity": 2, "trigger": "approve"}']
+        self.assertEqual(list(events_from_jsonl(lines)), [(1, 'submit'), (2, 'approve')])
@@ -0,0 +1,104 @@
+from django.db.models import Q
+from django.test import TestCase
+
+from django_state_machines.exceptions import ConditionNotMetError, StaleStateError, TransitionNotPossibleError
+from django_state_machines.logic import BaseStateHandler
+from django_state_machines.signals import pre_transition
+
+from ..machines import OrderHandler
+from ..models import Order
+
+
+after_calls = []
+
+
+def audit(instance, **kwargs):
+    after_calls.append(instance.state)
+
+
+class AuditedOrderHandler(BaseStateHandler):
+    def submit(self, **kwargs):
+        pass
+
+    def approve(self, **kwargs):
+        pass
+
+    def add_transitions(self):
+        self.add_transition('submit', 'draft', 'submitted', after=audit)
+        self.add_transition('approve', 'submitted', 'approved', conditions=Q(amount__lt=1000), after=audit)
+
+
+class RunPathTests(TestCase):
+    def test_persists_final_state(self):
+        order = Order.objects.create(state='draft', amount=10, paid=True)
+        order.state_handler.run_path(['submit', 'approve', 'ship'])
+        self.assertEqual(order.state, 'shipped')
+        self.assertEqual(Order.objects.get(pk=order.pk).state, 'shipped')
+
+    def test_impossible_path_fails_before_any_change(self):
+        order = Order.objects.create(state='draft')
+        with self.assertNumQueries(0):
+            with self.assertRaises(TransitionNotPossibleError):
+                order.state_handler.run_path(['submit', 'ship'])
+        self.assertEqual(order.state, 'draft')
+
+    def test_conditions_of_every_step_are_checked_up_front(self):
+        order = Order.objects.create(state='draft', amount=5000)
+        with self.assertRaises(ConditionNotMetError):
+            order.state_handler.run_path(['submit', 'approve'])
+        self.assertEqual(order.state, 'draft')
+        self.assertEqual(Order.objects.get(pk=order.pk).state, 'draft')
+
+    def test_stale_state_restores_instance(self):
+        order = Order.objects.create(state='draft', amount=10)
+        Order.objects.filter(pk=order.pk).update(state='cancelled')
+        with self.assertRaises(StaleStateError):
+            order.state_handler.run_path(['submit', 'approve'])
+        self.assertEqual(order.state, 'draft')
+        self.assertEqual(Order.objects.get(pk=order.pk).state, 'cancelled')
+
+    def test_after_hooks_run_once_the_state_is_saved(self):
+        del after_calls[:]
+        handler = AuditedOrderHandler('state', 'str')
+        order = Order.objects.create(state='draft', amount=10)
+        handler.bind(order).run_path(['submit', 'approve'])
+        self.assertEqual(after_calls, ['approved', 'approved'])
+
+    def test_after_hooks_skipped_on_stale_state(self):
+        del after_calls[:]
+        handler = AuditedOrderHandler('state', 'str')
+        order = Order.objects.create(state='draft', amount=10)
+        Order.objects.filter(pk=order.pk).update(state='cancelled')
+        with self.assertRaises(StaleStateError):
+            handler.bind(order).run_path(['submit', 'approve'])
+        self.assertEqual(after_calls, [])
+        self.assertEqual(order.state, 'draft')
+
+    def test_failing_step_restores_instance_and_rolls_back(self):
+        def refuse(sender, instance, **kwargs):
+            Order.objects.filter(pk=instance.pk).update(amount=0)
+            raise RuntimeError('refused')
+
+        order = Order.objects.create(state='draft', amount=10)
+        pre_transition.connect(refuse, handler=OrderHandler, trigger='approve')
+        try:
+            with self.assertRaises(RuntimeError):
+                order.state_handler.run_path(['submit', 'approve'])
+        finally:
+            pre_transition.disconnect(refuse)
+        self.assertEqual(order.state, 'draft')
+        saved = Order.objects.get(pk=order.pk)
+        self.assertEqual((saved.state, saved.amount), ('draft', 10))
+
+    def test_unsaved_instance(self):
+        order = Order(state='draft', amount=10)
+        order.state_handler.run_path(['submit', 'approve'])
+        self.assertEqual(order.state, 'approved')
+        self.assertFalse(Order.objects.exists())
+
+    def test_advance_to(self):
+        order = Order.objects.create(state='rejected', amount=10)
+        order.state_handler.advance_to('approved')
+        self.assertEqual(Order.objects.get(pk=order.pk).state, 'approved')
+        with self.assertRaises(TransitionNotPossibleError):
+            order.state_handler.advance_to('draft')
@@ -0,0 +1,180 @@
+import json
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db.models import F, Q
+from django.test import TestCase
+
+from django_state_machines import hooks
+from django_state_machines.logic import BaseStateHandler
+from django_state_machines.serialization import (
+    dump_machine, dump_machines, dumps, fingerprint, is_loadable, load_machine, loads, preload_machines,
+    verify_machines,
+)
+
+from ..machines import OrderHandler, is_paid
+from ..models import CodedOrder, Order
+
+
+calls = []
+
+
+class Row(object):
+    loaded_state = 'draft'
+
+
+def audit(batch):
+    calls.append(('audit', [kwargs['instance'] for kwargs in batch]))
+
+
+class SerializedHandler(BaseStateHandler):
+    def submit(self, **kwargs):
+        pass
+
+    def approve(self, **kwargs):
+        pass
+
+    def expire(self, **kwargs):
+        pass
+
+    def notify(self, **kwargs):
+        calls.append(('notify', self.get_instance_field_value()))
+
+    def add_transitions(self):
+        self.add_transition('submit', 'draft', 'submitted', after=[self.notify, hooks.on_commit(audit, batch=True)])
+        self.add_transition(
+            'approve', 'submitted', 'approved', before=hooks.on_commit(self.notify),
+            conditions=[is_paid, Q(amount__lt=F('discount')) | ~Q(amount__in=[1, 2], discount__isnull=True)])
+        self.add_transition('expire', 'submitted', 'draft', after_timeout=timedelta(minutes=30))
+
+
+class LoadedHandler(SerializedHandler):
+    def add_transitions(self):
+        raise AssertionError("Loaded machines don't run add_transitions.")
+
+
+VALUES_CONDITION = Q(created__gte=date(2020, 1, 2), total=Decimal('1.50')) & ~Q(delay=timedelta(seconds=5))
+
+
+class ValuesHandler(BaseStateHandler):
+    def submit(self, **kwargs):
+        pass
+
+    def add_transitions(self):
+        self.add_transition('submit', 'draft', 'submitted', conditions=VALUES_CONDITION)
+
+
+class OpaqueHandler(BaseStateHandler):
+    def submit(self, **kwargs):
+        pass
+
+    def add_transitions(self):
+        self.add_transition('submit', 'draft', 'submitted', after=lambda **kwargs: None)
+
+
+class MachineSerializationTests(TestCase):
+    def setUp(self):
+        del calls[:]
+
+    def round_trip(self, field_name, format):
+        data = dump_machine(SerializedHandler(field_name, 'str'))
+        loaded = loads(dumps(data, format), format)
+        self.assertEqual(fingerprint(loaded), fingerprint(data))
+        machine = load_machine(loaded, LoadedHandler)
+        handler = LoadedHandler(field_name, 'str')
+        self.assertIs(handler.machine, machine)
+        return data, handler
+
+    def assert_same_machine(self, data, handler):
+        loaded = dump_machine(handler)
+        self.assertEqual(loaded.pop('handler'), 'fields_tests.tests.test_serialization.LoadedHandler')
+        data = dict(data)
+        data.pop('handler')
+        self.assertEqual(loaded, data)
+
+    def test_json_round_trip(self):
+        data, handler = self.round_trip('json_state', 'json')
+        self.assert_same_machine(data, handler)
+
+    def test_pickle_round_trip(self):
+        data, handler = self.round_trip('pickle_state', 'pickle')
+        self.assert_same_machine(data, handler)
+
+    def test_loaded_machine(self):
+        data, handler = self.round_trip('loaded_state', 'json')
+        submit, = handler.machine.transitions['submit']
+        notify, audit_hook = submit.after
+        self.assertEqual(notify.__name__, 'notify')
+        self.assertEqual((audit_hook.function, audit_hook.policy, audit_hook.batch), (audit, hooks.ON_COMMIT, True))
+        approve, = handler.machine.transitions['approve']
+        self.assertEqual(approve.before[0].policy, hooks.ON_COMMIT)
+        self.assertIs(approve.conditions[0], is_paid)
+        self.assertEqual(
+            approve.conditions[1], Q(amount__lt=F('discount')) | ~Q(amount__in=[1, 2], discount__isnull=True))
+        expire, = handler.machine.transitions['expire']
+        self.assertEqual(expire.timeout, timedelta(minutes=30))
+
+        row = Row()
+        with self.captureOnCommitCallbacks(execute=True):
+            handler.bind(row).submit()
+            self.assertEqual(calls, [('notify', 'submitted')])
+        self.assertEqual(calls, [('notify', 'submitted'), ('audit', [row])])
+
+    def test_q_values(self):
+        data = dump_machine(ValuesHandler('state', 'str'))
+        loaded = json.loads(json.dumps(data))
+        self.assertTrue(is_loadable(loaded))
+        machine = load_machine(loaded, type(str('LoadedValuesHandler'), (ValuesHandler,), {}))
+        self.assertEqual(list(machine.transitions['submit'][0].conditions), [VALUES_CONDITION])
+
+    def test_opaque_references_are_refused(self):
+        data = dump_machine(OpaqueHandler('state', 'str'))
+        self.assertIn('opaque', data['transitions'][0]['after'][0])
+        self.assertFalse(is_loadable(data))
+        with self.assertRaises(ValueError):
+            load_machine(data, type('OpaqueLoadedHandler', (OpaqueHandler,), {}))
+
+    def test_fingerprint_is_stable(self):
+        first = dump_machine(SerializedHandler('state', 'str'))
+        second = dump_machine(SerializedHandler('state', 'str'))
+        self.assertEqual(fingerprint(first), fingerprint(second))
+        self.assertEqual(fingerprint(first), fingerprint(dict(reversed(list(first.items())), model='other')))
+        first['transitions'][0]['timeout'] = 60.0
+        self.assertNotEqual(fingerprint(first), fingerprint(second))
+
+    def test_unsupported_version(self):
+        data = dump_machine(SerializedHandler('state', 'str'))
+        data['version'] = 0
+        with self.assertRaises(ValueError):
+            load_machine(data)
+
+
+class VerifyMachinesTests(TestCase):
+    def test_matching_dump(self):
+        document = dump_machines()
+        self.assertEqual(verify_machines(document), [])
+        document['machines'][0]['fingerprint'] = '0' * 64
+        self.assertEqual(verify_machines(document), [document['machines'][0]['model']])
+
+    def test_stale_dump_loaded_by_preload(self):
+        document = dump_machines()
+        data = next(data for data in document['machines'] if data['model'] == 'fields_tests.Order.state')
+        data['transitions'] = [item for item in data['transitions'] if item['trigger'] != 'cancel']
+        data['fingerprint'] = fingerprint(data)
+
+        fields = [model._meta.get_field('state') for model in (Order, CodedOrder)]
+        key = fields[0].handler.machine_key
+        saved = OrderHandler._compiled_machines.pop(key)
+        handlers = [field._state_handler for field in fields]
+        for field in fields:
+            field._state_handler = None
+
+        def restore():
+            OrderHandler._compiled_machines[key] = saved
+            for field, handler in zip(fields, handlers):
+                field._state_handler = handler
+        self.addCleanup(restore)
+
+        preload_machines(document)
+        self.assertNotIn('cancel', Order._meta.get_field('state').handler.machine.transitions)
+        self.assertIn('fields_tests.Order.state', verify_machines(document))
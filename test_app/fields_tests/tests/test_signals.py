@@ -0,0 +1,166 @@
+from django.test import SimpleTestCase, TestCase
+
+from django_state_machines.batch import process_chunk
+from django_state_machines.logic import BaseStateHandler
+from django_state_machines.signals import bulk_transitions, post_transition, pre_transition
+
+from ..machines import OrderHandler, ProductHandler
+from ..models import Order
+
+
+class Row(object):
+    def __init__(self, state):
+        self.state = state
+
+
+class CountingHandler(BaseStateHandler):
+    def start(self, **kwargs):
+        pass
+
+    def finish(self, **kwargs):
+        pass
+
+    def add_transitions(self):
+        self.add_transition('start', 'new', 'started')
+        self.add_transition('finish', 'started', 'finished')
+
+
+class Recorder(object):
+    def __init__(self, test, signal, **filters):
+        self.events = []
+        signal.connect(self, **filters)
+        test.addCleanup(signal.disconnect, self)
+
+    def __call__(self, **event):
+        self.events.append(event)
+
+
+class ReceiverFilterTests(SimpleTestCase):
+    def setUp(self):
+        self.handler = CountingHandler('state', 'int')
+        self.states = dict((state.name, state.id) for state in self.handler.machine.states)
+
+    def fire(self, state_name, trigger_name):
+        row = Row(self.states[state_name])
+        bound = self.handler.bind(row)
+        bound.process(bound.get_transition(trigger_name))
+        return row
+
+    def test_filters(self):
+        matching = [
+            Recorder(self, post_transition),
+            Recorder(self, post_transition, handler=BaseStateHandler),
+            Recorder(self, post_transition, handler=[ProductHandler, CountingHandler]),
+            Recorder(self, post_transition, trigger='start'),
+            Recorder(self, post_transition, source='new'),
+            Recorder(self, post_transition, source=self.states['new']),
+            Recorder(self, post_transition, target=['finished', 'started']),
+            Recorder(self, post_transition, target=self.states['started']),
+        ]
+        other = [
+            Recorder(self, post_transition, handler=ProductHandler),
+            Recorder(self, post_transition, trigger='finish'),
+            Recorder(self, post_transition, source='started'),
+            Recorder(self, post_transition, target=self.states['finished']),
+        ]
+        row = self.fire('new', 'start')
+        for recorder in matching:
+            self.assertEqual(len(recorder.events), 1)
+        for recorder in other:
+            self.assertEqual(recorder.events, [])
+        event = matching[0].events[0]
+        self.assertEqual(event['sender'], CountingHandler)
+        self.assertIs(event['instance'], row)
+        self.assertEqual((event['field_name'], event['trigger']), ('state', 'start'))
+        self.assertEqual((event['source'], event['target']), (self.states['new'], self.states['started']))
+
+    def test_pre_transition_is_called_before_the_state_changes(self):
+        states = []
+
+        def record(instance, **kwargs):
+            states.append(instance.state)
+
+        pre_transition.connect(record, trigger='start')
+        self.addCleanup(pre_transition.disconnect, record)
+        self.fire('new', 'start')
+        self.assertEqual(states, [self.states['new']])
+
+    def test_connect_and_disconnect_clear_the_cache(self):
+        self.fire('new', 'start')
+        self.assertFalse(post_transition.enabled)
+        first = Recorder(self, post_transition, trigger='start')
+        self.fire('new', 'start')
+        self.assertTrue(post_transition._cache)
+        second = Recorder(self, post_transition, trigger='start')
+        self.assertEqual(post_transition._cache, {})
+        self.fire('new', 'start')
+        self.assertEqual((len(first.events), len(second.events)), (2, 1))
+        self.assertTrue(post_transition.disconnect(first))
+        self.assertFalse(post_transition.disconnect(first))
+        self.assertEqual(post_transition._cache, {})
+        self.fire('new', 'start')
+        self.assertEqual((len(first.events), len(second.events)), (2, 2))
+        post_transition.disconnect(second)
+        self.assertFalse(post_transition.enabled)
+
+    def test_bulk_receivers_only_on_post_transition(self):
+        with self.assertRaises(ValueError):
+            pre_transition.connect(lambda **kwargs: None, bulk=True)
+
+    def test_bulk_transitions_buffer(self):
+        single = Recorder(self, post_transition)
+        bulk = Recorder(self, post_transition, bulk=True)
+        with bulk_transitions():
+            first = self.fire('new', 'start')
+            with bulk_transitions():
+                second = self.fire('new', 'start')
+            third = self.fire('started', 'finish')
+            self.assertEqual(len(single.events), 3)
+            self.assertEqual(bulk.events, [])
+        self.assertEqual(
+            sorted((event['trigger'], event['instances']) for event in bulk.events),
+            [('finish', [third]), ('start', [first, second])])
+
+    def test_bulk_transitions_buffer_is_dropped_on_error(self):
+        bulk = Recorder(self, post_transition, bulk=True)
+        with self.assertRaises(RuntimeError):
+            with bulk_transitions():
+                self.fire('new', 'start')
+                raise RuntimeError()
+        self.assertEqual(bulk.events, [])
+        row = self.fire('new', 'start')
+        self.assertEqual(bulk.events[0]['instances'], [row])
+
+
+class QuerySetSignalTests(TestCase):
+    def setUp(self):
+        self.drafts = [Order.objects.create(state='draft') for _ in range(3)]
+        self.rejected = Order.objects.create(state='rejected')
+        self.bulk = Recorder(self, post_transition, handler=OrderHandler, bulk=True)
+
+    def moved(self):
+        return [(event['source'], sorted(instance.pk for instance in event['instances']))
+                for event in self.bulk.events]
+
+    def test_one_bulk_call_per_start_state(self):
+        single = Recorder(self, pre_transition, handler=OrderHandler)
+        self.assertEqual(Order.objects.transition('state', 'submit', batch_size=2), 4)
+        self.assertEqual(sorted(self.moved()), [
+            ('draft', [order.pk for order in self.drafts]), ('rejected', [self.rejected.pk])])
+        self.assertEqual(len(single.events), 4)
+        self.assertTrue(all(instance.state == 'submitted'
+                            for event in self.bulk.events for instance in event['instances']))
+
+    def test_one_bulk_call_per_batch_and_start_state_with_hooks(self):
+        self.assertEqual(Order.objects.transition('state', 'submit', run_hooks=True, batch_size=2), 4)
+        self.assertEqual(sorted(self.moved()), [
+            ('draft', [order.pk for order in self.drafts[:2]]),
+            ('draft', [self.drafts[2].pk]),
+            ('rejected', [self.rejected.pk])])
+
+    def test_one_bulk_call_per_chunk(self):
+        pks = [order.pk for order in self.drafts] + [self.rejected.pk]
+        result = process_chunk(Order, 'state', 'submit', pks, {})
+        self.assertEqual(result.succeeded, 4)
+        self.assertEqual(sorted(self.moved()), [
+            ('draft', [order.pk for order in self.drafts]), ('rejected', [self.rejected.pk])])
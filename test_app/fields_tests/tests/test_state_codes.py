@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from django_state_machines.models import StateTimeout
+from django_state_machines.timeouts import run_due_timeouts
+
+from ..models import CodedOrder
+
+
+class StateCodesTests(TestCase):
+    def stored_code(self, order):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT state FROM {0} WHERE id = %s'.format(CodedOrder._meta.db_table), [order.pk])
+            return cursor.fetchone()[0]
+
+    def test_stored_as_code_and_loaded_as_id(self):
+        order = CodedOrder.objects.create(state='submitted')
+        self.assertEqual(self.stored_code(order), 2)
+        self.assertEqual(CodedOrder.objects.get(pk=order.pk).state, 'submitted')
+        self.assertEqual(list(CodedOrder.objects.filter(state='submitted').values_list('state', flat=True)),
+                         ['submitted'])
+
+    def test_unknown_state_is_rejected(self):
+        with self.assertRaises(ValueError):
+            CodedOrder.objects.filter(state='archived').exists()
+
+    def test_handler_transition(self):
+        order = CodedOrder.objects.create(state='draft')
+        order.state_handler.submit(atomic=True)
+        self.assertEqual(order.state, 'submitted')
+        self.assertEqual(self.stored_code(order), 2)
+        order.state_handler.reject()
+        order.save()
+        self.assertEqual(self.stored_code(order), 4)
+
+    def test_queryset_transition(self):
+        draft = CodedOrder.objects.create(state='draft')
+        rejected = CodedOrder.objects.create(state='rejected')
+        approved = CodedOrder.objects.create(state='approved')
+        self.assertEqual(CodedOrder.objects.transition('state', 'submit'), 2)
+        self.assertEqual([self.stored_code(order) for order in (draft, rejected, approved)], [2, 2, 3])
+        self.assertEqual(CodedOrder.objects.transition('state', 'approve'), 2)
+        self.assertEqual(CodedOrder.objects.filter(state='approved').count(), 3)
+
+    def test_can_fire(self):
+        cheap = CodedOrder.objects.create(state='submitted', amount=10)
+        CodedOrder.objects.create(state='submitted', amount=5000)
+        CodedOrder.objects.create(state='draft', amount=10)
+        self.assertEqual(list(CodedOrder.objects.can_fire('state', 'approve')), [cheap])
+        self.assertEqual(CodedOrder.objects.can_fire('state', 'submit').count(), 1)
+        self.assertEqual(CodedOrder.objects.can_fire('state', 'cancel').count(), 3)
+
+    def test_annotate_available_triggers(self):
+        CodedOrder.objects.create(state='draft')
+        CodedOrder.objects.create(state='submitted', amount=10)
+        CodedOrder.objects.create(state='submitted', amount=5000)
+        CodedOrder.objects.create(state='cancelled')
+        triggers = CodedOrder.objects.annotate_available_triggers('state').order_by('pk').values_list(
+            'state_available_triggers', flat=True)
+        self.assertEqual(list(triggers), [
+            'cancel submit',
+            'approve cancel expire reject',
+            'cancel expire reject',
+            'cancel',
+        ])
+
+    def test_timeouts(self):
+        order = CodedOrder.objects.create(state='submitted')
+        self.assertEqual(StateTimeout.objects.get().state, 'submitted')
+        result = run_due_timeouts(now=timezone.now() + timedelta(minutes=31))
+        self.assertEqual(result.succeeded, 1)
+        self.assertEqual(self.stored_code(order), 6)
@@ -0,0 +1,128 @@
+from datetime import timedelta
+
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase
+from django.utils import timezone
+
+from django_state_machines.models import StateTimeout
+from django_state_machines.timeouts import claim_due_timeouts, fire_timeouts, run_due_timeouts
+
+from ..models import GiftOrder, Order, ProxyOrder
+
+
+class TimeoutSchedulingTests(TestCase):
+    def timeouts(self, order):
+        return StateTimeout.objects.filter(
+            content_type=ContentType.objects.get_for_model(Order), object_id=str(order.pk), field='state')
+
+    def test_created_in_timeout_state(self):
+        before = timezone.now()
+        order = Order.objects.create(state='submitted')
+        timeout = self.timeouts(order).get()
+        self.assertEqual((timeout.state, timeout.trigger), ('submitted', 'expire'))
+        self.assertTrue(before + timedelta(minutes=30) <= timeout.due_at <= timezone.now() + timedelta(minutes=30))
+
+    def test_created_in_other_state(self):
+        order = Order.objects.create(state='draft')
+        self.assertFalse(self.timeouts(order).exists())
+
+    def test_atomic_transition_schedules_and_clears(self):
+        order = Order.objects.create(state='draft')
+        order.state_handler.submit(atomic=True)
+        self.assertEqual(self.timeouts(order).count(), 1)
+        order.state_handler.reject(atomic=True)
+        self.assertFalse(self.timeouts(order).exists())
+
+    def test_default_transition_reschedules_on_save(self):
+        order = Order.objects.create(state='submitted')
+        order.state_handler.cancel()
+        self.assertEqual(self.timeouts(order).count(), 1)
+        order.save(update_fields=['amount'])
+        self.assertEqual(self.timeouts(order).count(), 1)
+        order.save()
+        self.assertFalse(self.timeouts(order).exists())
+
+    def test_run_path_schedules(self):
+        order = Order.objects.create(state='rejected')
+        order.state_handler.run_path(['submit'])
+        self.assertEqual(self.timeouts(order).get().state, 'submitted')
+
+    def test_queryset_transition_schedules(self):
+        first = Order.objects.create(state='draft')
+        second = Order.objects.create(state='rejected')
+        self.assertEqual(Order.objects.transition('state', 'submit', batch_size=1), 2)
+        self.assertEqual(self.timeouts(first).count(), 1)
+        self.assertEqual(self.timeouts(second).count(), 1)
+        self.assertEqual(Order.objects.transition('state', 'cancel'), 2)
+        self.assertFalse(StateTimeout.objects.exists())
+
+    def test_proxy_model_schedules(self):
+        order = ProxyOrder.objects.create(state='submitted')
+        self.assertEqual(self.timeouts(order).get().state, 'submitted')
+        order.state_handler.reject()
+        order.save()
+        self.assertFalse(self.timeouts(order).exists())
+
+    def test_child_model_shares_timeouts_with_parent(self):
+        order = GiftOrder.objects.create(state='submitted')
+        self.assertEqual(self.timeouts(order).get().state, 'submitted')
+        Order.objects.get(pk=order.pk).state_handler.reject(atomic=True)
+        self.assertFalse(StateTimeout.objects.exists())
+        GiftOrder.objects.filter(pk=order.pk).transition('state', 'submit')
+        self.assertEqual(self.timeouts(order).count(), 1)
+        result = run_due_timeouts(now=timezone.now() + timedelta(minutes=31))
+        self.assertEqual(result.succeeded, 1)
+        self.assertEqual(GiftOrder.objects.get(pk=order.pk).state, 'cancelled')
+
+
+class TimeoutClaimTests(TestCase):
+    def setUp(self):
+        self.order = Order.objects.create(state='submitted')
+        self.due = timezone.now() + timedelta(minutes=31)
+
+    def test_not_due(self):
+        self.assertEqual(claim_due_timeouts(), [])
+
+    def test_claimed_once(self):
+        claimed = claim_due_timeouts(now=self.due)
+        self.assertEqual(len(claimed), 1)
+        self.assertTrue(claimed[0].claimed_by)
+        self.assertEqual(claim_due_timeouts(now=self.due), [])
+
+    def test_expired_claim_is_claimed_again(self):
+        first = claim_due_timeouts(now=self.due)
+        second = claim_due_timeouts(now=self.due + timedelta(minutes=6))
+        self.assertEqual([timeout.pk for timeout in second], [first[0].pk])
+        self.assertNotEqual(second[0].claimed_by, first[0].claimed_by)
+
+    def test_batch_size(self):
+        Order.objects.create(state='submitted')
+        self.assertEqual(len(claim_due_timeouts(batch_size=1, now=self.due)), 1)
+        self.assertEqual(len(claim_due_timeouts(batch_size=1, now=self.due)), 1)
+        self.assertEqual(claim_due_timeouts(batch_size=1, now=self.due), [])
+
+
+class TimeoutFiringTests(TestCase):
+    def setUp(self):
+        self.order = Order.objects.create(state='submitted')
+        self.due = timezone.now() + timedelta(minutes=31)
+
+    def test_fires_transition(self):
+        result = run_due_timeouts(now=self.due)
+        self.assertEqual((result.succeeded, result.skipped, result.failed), (1, 0, 0))
+        self.assertEqual(Order.objects.get(pk=self.order.pk).state, 'cancelled')
+        self.assertFalse(StateTimeout.objects.exists())
+
+    def test_skips_rows_that_left_the_state(self):
+        claimed = claim_due_timeouts(now=self.due)
+        Order.objects.filter(pk=self.order.pk).update(state='approved')
+        result = fire_timeouts(claimed)
+        self.assertEqual((result.succeeded, result.skipped, result.failed), (0, 1, 0))
+        self.assertEqual(Order.objects.get(pk=self.order.pk).state, 'approved')
+        self.assertFalse(StateTimeout.objects.exists())
+
+    def test_skips_deleted_rows(self):
+        claimed = claim_due_timeouts(now=self.due)
+        Order.objects.filter(pk=self.order.pk).delete()
+        self.assertEqual(fire_timeouts(claimed).skipped, 1)
+        self.assertFalse(StateTimeout.objects.exists())
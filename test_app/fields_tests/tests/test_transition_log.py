@@ -0,0 +1,130 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import TestCase
+
+from django_state_machines.models import TransitionLog
+from django_state_machines.transition_log import (
+    TransitionLogMiddleware, export_transition_log, export_transition_log_csv, transition_log_buffer)
+
+from ..machines import OrderHandler
+from ..models import Order
+
+
+class LoggedOrderHandler(OrderHandler):
+    log_transitions = True
+
+
+class TransitionLogTests(TestCase):
+    def setUp(self):
+        ContentType.objects.get_for_model(Order)
+        self.handler = LoggedOrderHandler('state', 'str')
+        self.first = Order.objects.create(state='draft')
+        self.second = Order.objects.create(state='draft')
+
+    def submit_and_cancel(self, order):
+        bound = self.handler.bind(order)
+        bound.submit()
+        bound.cancel()
+
+    def flush(self, callbacks, queries=1):
+        with self.assertNumQueries(queries):
+            for callback in callbacks:
+                callback()
+
+    def logged(self):
+        return list(TransitionLog.objects.order_by('id').values_list('object_id', 'trigger', 'source', 'target'))
+
+    def test_transaction_is_written_with_one_query(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.submit_and_cancel(self.first)
+            self.submit_and_cancel(self.second)
+            self.assertFalse(TransitionLog.objects.exists())
+        self.flush(callbacks)
+        self.assertEqual(self.logged(), [
+            (str(self.first.pk), 'submit', 'draft', 'submitted'),
+            (str(self.first.pk), 'cancel', 'submitted', 'cancelled'),
+            (str(self.second.pk), 'submit', 'draft', 'submitted'),
+            (str(self.second.pk), 'cancel', 'submitted', 'cancelled'),
+        ])
+
+    def test_rolled_back_transitions_are_not_logged(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.handler.bind(self.first).submit()
+            try:
+                with transaction.atomic():
+                    self.handler.bind(self.second).submit()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.flush(callbacks)
+        self.assertEqual(self.logged(), [(str(self.first.pk), 'submit', 'draft', 'submitted')])
+
+    def test_unsaved_instances_are_not_logged(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.handler.bind(Order(state='draft')).submit()
+        self.flush(callbacks, queries=0)
+        self.assertFalse(TransitionLog.objects.exists())
+
+    def test_buffer_is_written_with_one_query(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            with transition_log_buffer() as buffer:
+                self.submit_and_cancel(self.first)
+                with transition_log_buffer() as nested:
+                    self.submit_and_cancel(self.second)
+                self.assertIs(nested, buffer)
+        self.flush(callbacks)
+        self.assertEqual(len(self.logged()), 4)
+
+    def test_buffer_is_dropped_on_error(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            try:
+                with transition_log_buffer():
+                    self.submit_and_cancel(self.first)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.flush(callbacks, queries=0)
+        self.assertFalse(TransitionLog.objects.exists())
+
+    def test_buffer_drops_rolled_back_transactions(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            with transition_log_buffer():
+                self.handler.bind(self.first).submit()
+                try:
+                    with transaction.atomic():
+                        self.handler.bind(self.second).submit()
+                        raise RuntimeError
+                except RuntimeError:
+                    pass
+        self.flush(callbacks)
+        self.assertEqual(self.logged(), [(str(self.first.pk), 'submit', 'draft', 'submitted')])
+
+    def test_middleware(self):
+        def view(request):
+            self.submit_and_cancel(self.first)
+            return HttpResponse()
+
+        def failing_view(request):
+            self.submit_and_cancel(self.second)
+            raise RuntimeError
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            TransitionLogMiddleware(view)(None)
+            with self.assertRaises(RuntimeError):
+                TransitionLogMiddleware(failing_view)(None)
+        self.flush(callbacks)
+        self.assertEqual([row[0] for row in self.logged()], [str(self.first.pk)] * 2)
+
+    def test_export(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.submit_and_cancel(self.first)
+        rows = list(export_transition_log(chunk_size=1))
+        self.assertEqual([(row['trigger'], row['content_type__model']) for row in rows],
+                         [('submit', 'order'), ('cancel', 'order')])
+        lines = list(export_transition_log_csv(fields=('object_id', 'source', 'target')))
+        self.assertEqual(lines, [
+            'object_id,source,target\r\n',
+            '{0},draft,submitted\r\n'.format(self.first.pk),
+            '{0},submitted,cancelled\r\n'.format(self.first.pk),
+        ])